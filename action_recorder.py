@@ -3,12 +3,19 @@
 Action Recorder
 Records mouse clicks and keyboard presses to a log file for later review.
 Press ESC to stop recording.
+
+With --latency the screen is sampled as well, and the suggested code waits
+as long as TruTops actually took after each input instead of however long
+you paused.
 """
 
+import argparse
 import time
 from datetime import datetime
 from pynput import mouse, keyboard
 
+from ui_latency import SETTLE_TIME
+
 # Output file
 LOG_FILE = "recorded_actions.txt"
 
@@ -33,6 +40,7 @@ def on_click(x, y, button, pressed):
     if pressed:
         action = {
             "time": get_elapsed(),
+            "at": time.perf_counter(),
             "type": "mouse_click",
             "x": x,
             "y": y,
@@ -58,6 +66,7 @@ def on_key_press(key):
 
     action = {
         "time": get_elapsed(),
+        "at": time.perf_counter(),
         "type": "key_press",
         "key": key_name
     }
@@ -65,6 +74,15 @@ def on_key_press(key):
     print("[{}s] Key press: {}".format(action["time"], key_name))
 
 
+def _settled(action):
+    """Suffix with the measured latency, if the screen was sampled."""
+    if "latency" not in action:
+        return ""
+    if action["latency"] is None:
+        return " [no visible change]"
+    return " [settled after {:.2f}s]".format(action["latency"])
+
+
 def save_actions():
     """Save recorded actions to file."""
     with open(LOG_FILE, "w", encoding="utf-8") as f:
@@ -75,19 +93,24 @@ def save_actions():
 
         for i, action in enumerate(actions, 1):
             if action["type"] == "mouse_click":
-                f.write("{}. [{}s] CLICK at ({}, {}) - {}\n".format(
-                    i, action["time"], action["x"], action["y"], action["button"]))
+                f.write("{}. [{}s] CLICK at ({}, {}) - {}{}\n".format(
+                    i, action["time"], action["x"], action["y"], action["button"], _settled(action)))
             elif action["type"] == "key_press":
-                f.write("{}. [{}s] KEY: {}\n".format(i, action["time"], action["key"]))
+                f.write("{}. [{}s] KEY: {}{}\n".format(i, action["time"], action["key"], _settled(action)))
 
         f.write("\n" + "#" + "=" * 60 + "\n")
         f.write("# Suggested pyautogui code:\n")
         f.write("#" + "=" * 60 + "\n\n")
 
         prev_time = 0
+        prev_latency = None
         for action in actions:
             delay = round(action["time"] - prev_time, 2)
-            if delay > 0.1:
+            if prev_latency is not None:
+                # What TruTops needed, not how long the pause was
+                f.write("time.sleep({})  # measured (you waited {}s)\n".format(
+                    round(prev_latency + SETTLE_TIME, 2), delay))
+            elif delay > 0.1:
                 f.write("time.sleep({})\n".format(delay))
 
             if action["type"] == "mouse_click":
@@ -104,6 +127,7 @@ def save_actions():
                     f.write("pyautogui.hotkey({})  # May need adjustment\n".format(key))
 
             prev_time = action["time"]
+            prev_latency = action.get("latency")
 
     print("\nActions saved to: {}".format(LOG_FILE))
 
@@ -111,6 +135,12 @@ def save_actions():
 def main():
     global start_time, running
 
+    parser = argparse.ArgumentParser(description="Record clicks and key presses")
+    parser.add_argument("--latency", action="store_true",
+                        help="Also sample the screen to measure how long TruTops takes after each input")
+    parser.add_argument("--rate", type=float, default=30.0, help="Screen samples per second with --latency")
+    args = parser.parse_args()
+
     print("=" * 50)
     print("       ACTION RECORDER")
     print("=" * 50)
@@ -124,6 +154,12 @@ def main():
     print("RECORDING STARTED!")
     print("-" * 50)
 
+    sampler = None
+    if args.latency:
+        from capture import CaptureHub
+        from ui_latency import ScreenSampler
+        sampler = ScreenSampler(CaptureHub(), rate=args.rate).start()
+
     start_time = time.time()
 
     # Start listeners
@@ -139,6 +175,12 @@ def main():
     running = False
     mouse_listener.stop()
 
+    if sampler is not None:
+        from ui_latency import annotate
+        sampler.stop()
+        annotate(actions, sampler.changes)
+        print("[LATENCY] {} screen changes seen at {:.0f} samples/s".format(len(sampler.changes), sampler.rate))
+
     print("-" * 50)
     print("RECORDING STOPPED!")
     print()
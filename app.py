@@ -11,126 +11,31 @@ import os
 import json
 import threading
 import time
-import copy
 from pathlib import Path
 
 import pyautogui
-from PIL import Image, ImageGrab, ImageDraw, ImageTk
+from PIL import Image, ImageDraw, ImageTk
 from pynput import mouse, keyboard
 
+from settings import Config
+from backends import open_desktop
+from batch import BatchRunner
+from capture import CaptureHub
+from journal import SKIPPED, SUCCEEDED, replay
+from tracing import format_eta
+from scanner import FolderWatcher, scan
+from file_queue import EventQueue, FileQueue
+from bom import BomError, load_bom
+from organizer import FAILED as COPY_FAILED, organize, plan_copies, scan_exclude, summarize, target_root
+from workflow import describe_plan, load_plan, missing_targets
+
 # Safety: Move mouse to top-left corner to abort
 pyautogui.FAILSAFE = True
 
-# Default configuration
-DEFAULT_CONFIG = {
-    "import_delay": 3.0,
-    "save_delay": 2.0,
-    "trutops_window_title": "TruTops",  # Window title to focus
-    "click_locations": {
-        "open_drawing": [549, 114],          # Open Drawing button (not Ctrl+O)
-        "no_save": [3009, 672],              # "No" button - don't save modifications
-        "save_selected": [680, 126],         # Save Selected to GEO button
-        "select_top_left": [75, 209],        # Top-left corner of selection box
-        "select_bottom_right": [3350, 1867], # Bottom-right corner of selection box
-    },
-    "last_processed_index": 0
-}
-
-CONFIG_FILE = "config.json"
 SCREENSHOTS_DIR = "ScreenShots"
 
-
-class Config:
-    """Handles loading and saving configuration."""
-
-    def __init__(self):
-        self.data = copy.deepcopy(DEFAULT_CONFIG)
-        self.load()
-        print("[CONFIG] Loaded. click_locations: {}".format(self.data.get("click_locations")))
-
-    def load(self):
-        """Load configuration from file."""
-        if os.path.exists(CONFIG_FILE):
-            try:
-                with open(CONFIG_FILE, 'r') as f:
-                    saved = json.load(f)
-                    self._deep_update(self.data, saved)
-            except (json.JSONDecodeError, IOError):
-                pass
-
-    def save(self):
-        """Save configuration to file."""
-        full_path = os.path.abspath(CONFIG_FILE)
-        print("[CONFIG] Saving to: {}".format(full_path))
-        with open(CONFIG_FILE, 'w') as f:
-            json.dump(self.data, f, indent=2)
-        print("[CONFIG] Saved! click_locations: {}".format(self.data.get("click_locations")))
-
-    def _deep_update(self, base, update):
-        """Recursively update nested dictionaries."""
-        for key, value in update.items():
-            if key in base and isinstance(base[key], dict) and isinstance(value, dict):
-                self._deep_update(base[key], value)
-            else:
-                base[key] = value
-
-    def get(self, *keys):
-        """Get a nested config value."""
-        value = self.data
-        for key in keys:
-            if value is None:
-                return None
-            value = value.get(key) if isinstance(value, dict) else None
-        return value
-
-    def set(self, *keys_and_value):
-        """Set a nested config value."""
-        keys = keys_and_value[:-1]
-        value = keys_and_value[-1]
-        target = self.data
-        for key in keys[:-1]:
-            target = target.setdefault(key, {})
-        target[keys[-1]] = value
-        self.save()
-
-
-class ButtonDetector:
-    """Handles finding buttons on screen with multiple strategies."""
-
-    @staticmethod
-    def find_button(image_path, fallback_coords=None):
-        """Find a button on screen using image detection."""
-        if not image_path or not os.path.exists(image_path):
-            if fallback_coords:
-                return tuple(fallback_coords), "Saved coordinates (no image)"
-            return None, "Not found (no image file)"
-
-        strategies = [
-            ("High confidence", {"confidence": 0.8}),
-            ("Medium confidence", {"confidence": 0.6}),
-            ("Low confidence", {"confidence": 0.5}),
-        ]
-
-        for name, params in strategies:
-            try:
-                location = pyautogui.locateOnScreen(image_path, **params)
-                if location:
-                    return pyautogui.center(location), name
-            except Exception:
-                continue
-
-        # Try grayscale
-        try:
-            location = pyautogui.locateOnScreen(image_path, confidence=0.6, grayscale=True)
-            if location:
-                return pyautogui.center(location), "Grayscale match"
-        except Exception:
-            pass
-
-        if fallback_coords:
-            return tuple(fallback_coords), "Saved coordinates"
-
-        return None, "Not found"
+# How often the GUI applies progress posted by the worker thread (~30 fps)
+FRAME_MS = 33
 
 
 class ClickIndicator:
@@ -225,8 +130,8 @@ class LocationSetupDialog(tk.Toplevel):
         self.parent = parent
         self.config = config
         self.title("Setup Click Locations")
-        self.geometry("650x580")
-        self.minsize(650, 580)
+        self.geometry("650x720")
+        self.minsize(650, 720)
         self.transient(parent)
         self.grab_set()
 
@@ -242,6 +147,12 @@ class LocationSetupDialog(tk.Toplevel):
             "select_bottom_right": "Selection BOTTOM-RIGHT",
         }
 
+        # Optional dialogs - an image of each lets the run skip steps when they don't appear
+        self.dialogs = {
+            "modifications_prompt": "Save modifications? prompt",
+            "geometry_warning": "Multiple geometry warning",
+        }
+
         self.captured = {}
         self._create_widgets()
         self._update_status()
@@ -300,6 +211,43 @@ class LocationSetupDialog(tk.Toplevel):
             status.pack(side="right", padx=(10, 0))
             self.status_labels[key] = status
 
+        tk.Label(
+            self,
+            text="Dialog images: click CAPTURE, then HOVER over the dialog's button (don't click).",
+            font=("Segoe UI", 10),
+            bg=self.colors["bg"],
+            fg=self.colors["fg"],
+            wraplength=600
+        ).pack(pady=(15, 5))
+
+        self.dialog_labels = {}
+        for key, name in self.dialogs.items():
+            frame = tk.Frame(self, bg=self.colors["bg_light"], padx=10, pady=8)
+            frame.pack(fill="x", padx=15, pady=4)
+
+            tk.Label(
+                frame, text=name, font=("Segoe UI", 10),
+                bg=self.colors["bg_light"], fg=self.colors["fg"], anchor="w"
+            ).pack(side="left")
+
+            btn = tk.Button(
+                frame, text="CAPTURE", font=("Segoe UI", 9),
+                bg=self.colors["accent"], fg=self.colors["fg"],
+                activebackground=self.colors["highlight"],
+                bd=0, padx=10, pady=4,
+                command=lambda k=key: self._start_capture(k, template=True)
+            )
+            btn.pack(side="right", padx=(5, 0))
+            self.capture_buttons[key] = btn
+
+            status = tk.Label(
+                frame, text="Not set", font=("Consolas", 9),
+                bg=self.colors["bg_light"], fg=self.colors["accent"],
+                width=14, anchor="e"
+            )
+            status.pack(side="right", padx=(10, 0))
+            self.dialog_labels[key] = status
+
         # Countdown label
         self.countdown_label = tk.Label(
             self, text="", font=("Segoe UI", 14, "bold"),
@@ -344,7 +292,14 @@ class LocationSetupDialog(tk.Toplevel):
                 )
                 self.captured[key] = False
 
-    def _start_capture(self, location_key):
+        for key in self.dialogs:
+            image = self.config.get("buttons", key, "image")
+            if image and os.path.exists(image):
+                self.dialog_labels[key].config(text="Captured", fg=self.colors["success"])
+            else:
+                self.dialog_labels[key].config(text="Not set", fg=self.colors["accent"])
+
+    def _start_capture(self, location_key, template=False):
         """Start capture countdown."""
         for btn in self.capture_buttons.values():
             btn.config(state="disabled")
@@ -352,11 +307,43 @@ class LocationSetupDialog(tk.Toplevel):
         self.withdraw()
 
         threading.Thread(
-            target=self._capture_countdown,
+            target=self._template_countdown if template else self._capture_countdown,
             args=(location_key,),
             daemon=True
         ).start()
 
+    def _template_countdown(self, button_key):
+        """Countdown, then save an image of the screen around the mouse."""
+        for i in range(5, 0, -1):
+            self.after(0, lambda i=i: self.countdown_label.config(
+                text="Hover in {}...".format(i)
+            ))
+            time.sleep(1)
+
+        x, y = pyautogui.position()
+        width, height = self.config.get("dialogs", "template_size") or [160, 60]
+        region = (max(0, x - width // 2), max(0, y - height // 2))
+        region = region + (region[0] + width, region[1] + height)
+
+        image = self.config.get("buttons", button_key, "image") or os.path.join(
+            SCREENSHOTS_DIR, "{}.png".format(button_key))
+        os.makedirs(os.path.dirname(image) or ".", exist_ok=True)
+        Image.fromarray(self.parent.capture.grab(region).copy()).save(image)
+        self.config.set("buttons", button_key, "image", image)
+        print("[CAPTURE] Saved {} image around ({}, {}) to {}".format(button_key, x, y, image))
+
+        self.after(0, self._template_complete)
+
+    def _template_complete(self):
+        """Handle dialog image capture completion."""
+        self.deiconify()
+        self.countdown_label.config(text="")
+
+        for btn in self.capture_buttons.values():
+            btn.config(state="normal")
+
+        self._update_status()
+
     def _capture_countdown(self, location_key):
         """Countdown and wait for click."""
         for i in range(5, 0, -1):
@@ -436,44 +423,50 @@ class LocationSetupDialog(tk.Toplevel):
         self.destroy()
 
 
-class AutomationRunner:
-    """Handles the automation process."""
+class AutomationRunner(BatchRunner):
+    """Runs batches on a worker thread for the main window, with ESC to abort."""
 
     def __init__(self, app):
+        super().__init__(app.config, app.desktop, app.capture, app.events)
         self.app = app
-        self.config = app.config
-        self.running = False
-        self.current_index = 0
         self.indicator = ClickIndicator(app)
-        self.escape_pressed = False
         self.keyboard_listener = None
-        self.step_by_step = False
-        self.dry_run = False
-
-    def start(self, files, dry_run=False, step_by_step=False):
-        """Start processing files."""
-        self.running = True
-        self.escape_pressed = False
-        self.files = files
-        self.dry_run = dry_run
-        self.step_by_step = step_by_step
-        self.current_index = self.config.get("last_processed_index") or 0
+
+    def start(self, files, dry_run=False, step_by_step=False, calibrate=False, incremental=False):
+        """Start processing files (see BatchRunner.prepare)."""
+        self.prepare(files, dry_run, step_by_step, calibrate, incremental)
 
         # Ask if resuming
-        if self.current_index > 0 and self.current_index < len(files):
-            if not messagebox.askyesno(
-                "Resume?",
-                "Resume from file {}?".format(self.current_index + 1)
-            ):
-                self.current_index = 0
-        else:
-            self.current_index = 0
+        if self.journaling:
+            self._offer_resume()
 
         # Start ESC listener
         self._start_escape_listener()
 
         threading.Thread(target=self._run, daemon=True).start()
 
+    def _offer_resume(self):
+        """Offer to continue the last batch if it left files unfinished."""
+        last = replay(self.journal.path)
+        index = {path: i for i, path in enumerate(self.files)}
+        remaining = [index[path] for path in last.unfinished() if path in index]
+        finished = [path for path in last.with_state(SUCCEEDED, SKIPPED) if path in index]
+        if not remaining or not finished:
+            return
+
+        if not messagebox.askyesno(
+            "Resume?",
+            "The last batch has {} of {} files still to do ({} failed).\n\nResume it?".format(
+                len(remaining), len(last.files), len(last.failed()))
+        ):
+            return
+
+        self.queue = remaining
+        self.resuming = True
+        for path in finished:
+            status = "done" if last.states[path] == SUCCEEDED else "skipped"
+            self.events.post("file", index[path], status)
+
     def stop(self):
         """Stop processing."""
         self.running = False
@@ -498,258 +491,26 @@ class AutomationRunner:
             self.keyboard_listener.stop()
             self.keyboard_listener = None
 
-    def _focus_trutops(self):
-        """Try to focus TrueTops window."""
-        try:
-            title = self.config.get("trutops_window_title")
-            if not title:
-                # No window title configured - skip focusing
-                print("[FOCUS] Skipped (no window configured)")
-                return True
-
-            # Try pyautogui first
-            windows = pyautogui.getWindowsWithTitle(title)
-            if windows:
-                win = windows[0]
-                try:
-                    # Try multiple activation methods
-                    win.minimize()
-                    win.restore()
-                    win.activate()
-                    time.sleep(0.3)
-                    print("[FOCUS] Activated: {}".format(win.title))
-                    return True
-                except Exception as e:
-                    print("[FOCUS] pyautogui activate failed: {}".format(e))
-
-            # Fallback: Try win32gui directly
-            try:
-                import win32gui
-                import win32con
-
-                def find_window(hwnd, windows_list):
-                    if win32gui.IsWindowVisible(hwnd):
-                        window_title = win32gui.GetWindowText(hwnd)
-                        if title.lower() in window_title.lower():
-                            windows_list.append((hwnd, window_title))
-
-                found = []
-                win32gui.EnumWindows(find_window, found)
-
-                if found:
-                    hwnd, win_title = found[0]
-                    # Force to foreground
-                    win32gui.ShowWindow(hwnd, win32con.SW_RESTORE)
-                    win32gui.SetForegroundWindow(hwnd)
-                    time.sleep(0.3)
-                    print("[FOCUS] win32gui activated: {}".format(win_title))
-                    return True
-                else:
-                    # List all windows for debugging
-                    all_windows = []
-                    win32gui.EnumWindows(lambda h, l: l.append(win32gui.GetWindowText(h)) if win32gui.GetWindowText(h) else None, all_windows)
-                    print("[FOCUS] Window '{}' not found!".format(title))
-                    print("[FOCUS] Available windows containing 'tru':")
-                    for w in all_windows:
-                        if 'tru' in w.lower():
-                            print("  - {}".format(w))
-                    return False
-
-            except ImportError:
-                print("[FOCUS] win32gui not available - install pywin32: pip install pywin32")
-                return False
-
-        except Exception as e:
-            print("[FOCUS] Error: {}".format(e))
-            return False
-
-    def _wait_for_confirm(self, action_desc):
-        """In step-by-step mode, wait for user to press Enter."""
-        if self.step_by_step:
-            print("\n  >>> NEXT: {} <<<".format(action_desc))
-            print("  Press ENTER to continue (or 'q' to quit)...")
-            response = input("  > ").strip().lower()
-            if response == 'q':
-                self.running = False
-                return False
-        return True
-
-    def _click(self, x, y, description=""):
-        """Click at position - simple screen click."""
-        print("[CLICK] ({}, {}) - {}".format(x, y, description))
-
-        if not self.dry_run:
-            pyautogui.moveTo(x, y)
-            time.sleep(0.1)
-            pyautogui.click()
-            time.sleep(3.0)
-        else:
-            print("  (dry run)")
-
-    def _press(self, key, description=""):
-        """Press key - simple."""
-        print("[KEY] {} - {}".format(key, description))
-
-        if not self.dry_run:
-            pyautogui.press(key)
-            time.sleep(3.0)
-        else:
-            print("  (dry run)")
-
-    def _hotkey(self, *keys, description=""):
-        """Press hotkey - simple."""
-        key_str = "+".join(keys)
-        print("[HOTKEY] {} - {}".format(key_str, description))
-
-        if not self.dry_run:
-            pyautogui.hotkey(*keys)
-            time.sleep(3.0)
-        else:
-            print("  (dry run)")
-
-    def _click_button_by_image(self, button_key, description):
-        """Find and click a button using image detection."""
-        image_path = self.config.get("buttons", button_key, "image")
-        fallback = self.config.get("buttons", button_key, "fallback_coords")
-
-        pos, strategy = ButtonDetector.find_button(image_path, fallback)
-
-        if pos:
-            print("[IMAGE] Found '{}' via {} at ({}, {})".format(
-                description, strategy, pos[0], pos[1]))
-            self._click(pos[0], pos[1], description)
-            return True
-        else:
-            print("[IMAGE] Could not find '{}'".format(description))
-            return False
-
-    def _copy_to_clipboard(self, text):
-        """Copy text to clipboard."""
-        import subprocess
-        # Use clip.exe on Windows
-        process = subprocess.Popen(['clip'], stdin=subprocess.PIPE)
-        process.communicate(text.encode('utf-8'))
-
     def _run(self):
-        """Main automation loop."""
-        import_delay = self.config.get("import_delay") or 3.0
-        save_delay = self.config.get("save_delay") or 2.0
-
-        # Get all click locations
-        open_drawing_pos = self.config.get("click_locations", "open_drawing")
-        no_save_pos = self.config.get("click_locations", "no_save")
-        save_selected_pos = self.config.get("click_locations", "save_selected")
-        select_tl_pos = self.config.get("click_locations", "select_top_left")
-        select_br_pos = self.config.get("click_locations", "select_bottom_right")
+        """Run the batch, then tell the user how it went."""
+        try:
+            outcome = self.run()
+        finally:
+            self.running = False
+            self._stop_escape_listener()
+            self.app.after(0, self.app.on_automation_stopped)
 
         total = len(self.files)
-
-        # Focus TrueTops first
-        print("\n" + "=" * 50)
-        print("STARTING AUTOMATION - Press ESC to abort")
-        print("=" * 50)
-
-        self._focus_trutops()
-        time.sleep(0.5)
-
-        for i in range(self.current_index, total):
-            if not self.running or self.escape_pressed:
-                break
-
-            file_path = self.files[i]
-            file_name = os.path.basename(file_path)  # Just the filename with extension
-            self.current_index = i
-            self.config.set("last_processed_index", i)
-
-            # Update UI
-            self.app.after(0, lambda i=i: self.app.update_file_status(i, "processing"))
-            self.app.after(0, lambda f=file_name, i=i, t=total: self.app.update_status(
-                "Processing {} ({}/{}) - ESC to abort".format(f, i + 1, t)
-            ))
-            self.app.after(0, lambda i=i, t=total: self.app.update_progress(i, t))
-
-            try:
-                print("\n--- File {}/{}: {} ---".format(i + 1, total, file_name))
-
-                # Step 1: Click Open Drawing button
-                if open_drawing_pos:
-                    self._click(open_drawing_pos[0], open_drawing_pos[1], "Open Drawing")
-                    time.sleep(0.5)
-
-                if not self.running:
-                    break
-
-                # Step 2: Click "No" - don't save modifications
-                if no_save_pos:
-                    self._click(no_save_pos[0], no_save_pos[1], "No (don't save)")
-                    time.sleep(0.5)
-
-                # Step 3: Copy filename (with extension only) to clipboard and paste it
-                # The filename box is already selected after clicking No
-                self._copy_to_clipboard(file_name)  # Just filename, not full path
-                print("[CLIPBOARD] Copied: {}".format(file_name))
-
-                self._hotkey('ctrl', 'v', description="Paste filename")
-                time.sleep(0.3)
-
-                # Step 4: Open drawing
-                self._press('enter', "Open drawing")
-                time.sleep(1.0)
-
-                # Step 5: Confirm import settings
-                self._press('enter', "Confirm import settings")
-                time.sleep(import_delay)
-
-                if not self.running:
-                    break
-
-                # Step 6: Click Save Selected to GEO
-                if save_selected_pos:
-                    self._click(save_selected_pos[0], save_selected_pos[1], "Save Selected to GEO")
-                    time.sleep(0.5)
-
-                # Step 7: Click top-left corner of selection box
-                if select_tl_pos:
-                    self._click(select_tl_pos[0], select_tl_pos[1], "Selection top-left")
-                    time.sleep(0.3)
-
-                # Step 8: Click bottom-right corner of selection box
-                if select_br_pos:
-                    self._click(select_br_pos[0], select_br_pos[1], "Selection bottom-right")
-                    time.sleep(0.5)
-
-                # Step 9: Enter for warning dialog (may not appear, but safe to press)
-                self._press('enter', "Warning dialog (if any)")
-                time.sleep(0.3)
-
-                # Step 10: Enter to save file
-                self._press('enter', "Save file")
-                time.sleep(save_delay)
-
-                # Mark complete
-                self.app.after(0, lambda i=i: self.app.update_file_status(i, "done"))
-                print("Done!")
-
-            except Exception as e:
-                print("ERROR: {}".format(e))
-                self.app.after(0, lambda e=e: self.app.update_status("Error: {}".format(e)))
-                self.running = False
-                break
-
-        # Cleanup
-        self._stop_escape_listener()
-
-        if self.escape_pressed:
-            self.app.after(0, lambda: self.app.update_status("Aborted by user (ESC)"))
+        if outcome == "aborted":
             self.app.after(0, lambda: messagebox.showinfo("Aborted", "Automation stopped by ESC key"))
-        elif self.running:
-            self.config.set("last_processed_index", 0)
-            self.app.after(0, lambda: self.app.update_status("Complete!"))
-            self.app.after(0, lambda: self.app.update_progress(total, total))
-            self.app.after(0, lambda: messagebox.showinfo("Done", "Processed {} files!".format(total)))
-
-        self.running = False
-        self.app.after(0, self.app.on_automation_stopped)
+        elif outcome == "calibrated":
+            self.app.after(0, lambda: messagebox.showinfo(
+                "Calibrated", "Recorded step timings from {} files.".format(total)))
+        elif outcome == "complete":
+            message = "Processed {} files!".format(total)
+            if self.report:
+                message += "\n\n" + "\n".join(self.report[:20])
+            self.app.after(0, lambda: messagebox.showinfo("Done", message))
 
 
 class App(tk.Tk):
@@ -771,6 +532,7 @@ class App(tk.Tk):
             "highlight": "#74b9ff",    # Blue highlight
             "success": "#00b894",      # Green for done
             "processing": "#fdcb6e",   # Yellow for processing
+            "error": "#ff7675",        # Red for failed
         }
 
         self.configure(bg=self.colors["bg"])
@@ -789,11 +551,17 @@ class App(tk.Tk):
         self.style.configure("TProgressbar", background=self.colors["highlight"], troughcolor=self.colors["bg_light"])
 
         self.config = Config()
+        self.desktop = open_desktop(self.config.get("input", "backend") or "direct", self.config)
+        self.capture = CaptureHub(self.desktop.screen)
         self.automation = AutomationRunner(self)
-        self.files = []
-        self.file_status = {}
+        self.files = FileQueue()
+        self.events = EventQueue()
+        self._drawn = {}  # index -> status the listbox row currently shows (absent = pending)
+        self.bom = None
+        self.watcher = None
 
         self._create_widgets()
+        self.after(FRAME_MS, self._drain_events)
 
     def _create_widgets(self):
         """Create main window widgets."""
@@ -816,8 +584,21 @@ class App(tk.Tk):
         btn_row.pack(fill="x", pady=(0, 8))
 
         ttk.Button(btn_row, text="Add Files", command=self._add_files).pack(side="left")
+        ttk.Button(btn_row, text="Scan Folder", command=self._scan_folder).pack(side="left", padx=(5, 0))
         ttk.Button(btn_row, text="Clear", command=self._clear_files).pack(side="left", padx=5)
 
+        ttk.Button(btn_row, text="Load BOM", command=self._load_bom).pack(side="left", padx=(0, 5))
+
+        self.material_var = tk.StringVar(value="")
+        self.material_box = ttk.Combobox(btn_row, textvariable=self.material_var, state="disabled", width=18)
+        self.material_box.bind("<<ComboboxSelected>>", lambda e: self._select_material())
+        self.material_box.pack(side="left")
+        ttk.Button(btn_row, text="Copy to Folders", command=self._copy_to_folders).pack(side="left", padx=(5, 0))
+
+        self.watch_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(btn_row, text="Watch folder", variable=self.watch_var,
+                        command=self._toggle_watch).pack(side="left", padx=5)
+
         self.file_count_label = ttk.Label(btn_row, text="0 files")
         self.file_count_label.pack(side="right")
 
@@ -859,6 +640,9 @@ class App(tk.Tk):
         self.progress_label = ttk.Label(status_frame, text="0/0")
         self.progress_label.pack(anchor="e")
 
+        self.throughput_label = ttk.Label(status_frame, text="")
+        self.throughput_label.pack(anchor="e")
+
         # Control buttons
         btn_frame = ttk.Frame(self)
         btn_frame.pack(fill="x", padx=15, pady=10)
@@ -869,8 +653,17 @@ class App(tk.Tk):
         self.stop_btn = ttk.Button(btn_frame, text="STOP", command=self._stop, state="disabled")
         self.stop_btn.pack(side="left", padx=(0, 8))
 
+        self.calibrate_btn = ttk.Button(btn_frame, text="Calibrate", command=self._calibrate)
+        self.calibrate_btn.pack(side="left", padx=(0, 8))
+
         ttk.Button(btn_frame, text="Setup Locations", command=self._setup_locations).pack(side="left")
 
+        self.incremental_var = tk.BooleanVar(value=bool(self.config.get("incremental")))
+        ttk.Checkbutton(
+            btn_frame, text="Skip unchanged", variable=self.incremental_var,
+            command=lambda: self.config.set("incremental", self.incremental_var.get())
+        ).pack(side="right")
+
         # Info
         info_frame = tk.Frame(self, bg=self.colors["bg_light"], padx=10, pady=8)
         info_frame.pack(fill="x", padx=10, pady=10)
@@ -883,9 +676,16 @@ class App(tk.Tk):
             fg=self.colors["success"]
         ).pack(anchor="w", fill="x")
 
+        try:
+            workflow_text = describe_plan(load_plan(self.config))
+        except (IOError, json.JSONDecodeError):
+            workflow_text = "Invalid workflow_file"
+
         tk.Label(
             info_frame,
-            text="Open > No > Paste > Enter x2 > Save > TL > BR > Enter x2",
+            text=workflow_text,
+            wraplength=760,
+            justify="left",
             font=("Consolas", 9),
             bg=self.colors["bg_light"],
             fg=self.colors["success"]
@@ -898,38 +698,189 @@ class App(tk.Tk):
             filetypes=[("DWG files", "*.dwg"), ("All files", "*.*")]
         )
         if files:
-            for f in files:
-                if f not in self.files:
-                    self.files.append(f)
+            self.add_paths(files)
+
+    def _laser_folder(self):
+        """The configured laser folder, asking for one if it isn't set or doesn't exist."""
+        folder = self.config.get("laser_folder")
+        if folder and os.path.isdir(folder):
+            return folder
+        folder = filedialog.askdirectory(title="Select Laser Folder")
+        if folder:
+            self.config.set("laser_folder", folder)
+        return folder or None
+
+    def _scan_options(self, folder):
+        exclude = list(self.config.get("scan", "exclude") or [])
+        # Copies made by Copy to Folders are not new exports
+        organized = scan_exclude(folder, self.config.get("organizer", "target_folder") or None)
+        if organized:
+            exclude.append(organized)
+        return {
+            "include": self.config.get("scan", "include") or ["*.dwg"],
+            "exclude": exclude,
+            "recursive": self.config.get("scan", "recursive") is not False,
+        }
+
+    def _scan_folder(self):
+        """Add every DWG under the laser folder."""
+        folder = self._laser_folder()
+        if not folder:
+            return
+        start = time.perf_counter()
+        paths = scan(folder, **self._scan_options(folder))
+        added = self.add_paths(paths)
+        print("[SCAN] {} DWGs in {} ({} new) in {:.2f}s".format(
+            len(paths), folder, added, time.perf_counter() - start))
+        self.update_status("Found {} DWGs ({} new) in {}".format(len(paths), added, folder))
+
+    def _toggle_watch(self):
+        """Start or stop watching the laser folder for new exports."""
+        if not self.watch_var.get():
+            if self.watcher is not None:
+                self.watcher.stop()
+                self.watcher = None
+            self.automation.watching = False
+            return
+
+        folder = self._laser_folder()
+        if not folder:
+            self.watch_var.set(False)
+            return
+        self._scan_folder()
+        self.watcher = FolderWatcher(
+            folder,
+            lambda paths: self.after(0, self.add_paths, paths),
+            interval=self.config.get("scan", "watch_interval") or 1.0,
+            stable_time=self.config.get("scan", "stable_time") or 2.0,
+            known=self.files,
+            **self._scan_options(folder)
+        )
+        self.watcher.start()
+        self.automation.watching = True
+
+    def _load_bom(self):
+        """Load a SolidWorks BOM and offer its materials."""
+        path = filedialog.askopenfilename(
+            title="Select BOM",
+            initialfile=os.path.basename(self.config.get("bom", "file") or ""),
+            filetypes=[("BOM", "*.xlsx *.csv"), ("All files", "*.*")]
+        )
+        if not path:
+            return
+        try:
+            self.bom = load_bom(path, self.config.get("bom"))
+        except (BomError, IOError, ValueError) as e:
+            messagebox.showerror("BOM", "Could not load BOM:\n{}".format(e))
+            return
+        self.config.set("bom", "file", path)
+        self.material_box.config(values=["All materials"] + self.bom.materials(), state="readonly")
+        self.material_var.set("All materials")
+        self.update_status("BOM: {} parts in {} materials".format(len(self.bom.rows), len(self.bom.materials())))
+        self._update_file_list()
+
+    def _select_material(self):
+        """Replace the list with the laser folder's DWGs of the chosen material."""
+        if self.bom is None or self.automation.running:
+            return
+        folder = self._laser_folder()
+        if not folder:
+            return
+        material = self.material_var.get()
+        paths = self.bom.select(scan(folder, **self._scan_options(folder)),
+                                None if material == "All materials" else material)
+        self.files = FileQueue()
+        self._update_file_list()
+        self.add_paths(paths)
+        self.update_status("{} DWGs for {}".format(len(paths), material))
+
+    def _copy_to_folders(self):
+        """Copy the chosen material's DWGs into per-material folders in the background."""
+        if self.bom is None:
+            messagebox.showwarning("No BOM", "Load a BOM first.")
+            return
+        folder = self._laser_folder()
+        if not folder:
+            return
+        material = self.material_var.get()
+        material = None if material in ("", "All materials") else material
+        try:
+            target = target_root(folder, self.config.get("organizer", "target_folder") or None)
+        except ValueError as e:
+            messagebox.showwarning("Copy to Folders", str(e))
+            return
+        copies = plan_copies(self.bom, scan(folder, **self._scan_options(folder)), target, material)
+        if not copies:
+            self.update_status("Nothing to copy")
+            return
 
-            self._update_file_list()
+        done = [0]
+        lock = threading.Lock()
+
+        def on_result(result):
+            with lock:
+                done[0] += 1
+                self.events.post("progress", done[0], len(copies))
+            if result.status == COPY_FAILED:
+                print("[COPY] ERROR: {} - {}".format(os.path.basename(result.source), result.error))
+
+        def run():
+            start = time.perf_counter()
+            results = organize(
+                copies,
+                workers=self.config.get("organizer", "workers") or 8,
+                verify_hash=bool(self.config.get("organizer", "verify_hash")),
+                overwrite=self.config.get("organizer", "overwrite") is not False,
+                on_result=on_result,
+            )
+            summary = summarize(results, time.perf_counter() - start)
+            print("[COPY] {}".format(summary))
+            self.events.post("status", "Copy: {}".format(summary))
+
+        self.update_status("Copying {} DWGs to {}...".format(len(copies), target))
+        threading.Thread(target=run, daemon=True).start()
+
+    def add_paths(self, paths):
+        """Append new files to the list (and to a running batch). Returns how many were new."""
+        new_indices = self.files.add(paths)
+        if new_indices:
+            # One insert call for all rows; Tk handles 10,000 of them at once easily
+            self.file_listbox.insert(tk.END, *[self._row_text(i, "pending") for i in new_indices])
+            self.file_count_label.config(text="{} files".format(len(self.files)))
+            if self.automation.running:
+                self.automation.enqueue(new_indices)
+        return len(new_indices)
 
     def _clear_files(self):
         """Clear file list."""
-        self.files = []
-        self.file_status = {}
+        if self.automation.running:
+            return
+        self.files = FileQueue()
         self._update_file_list()
 
     def _update_file_list(self):
-        """Update the file listbox."""
+        """Rebuild the file listbox; rows get their status colours once they are on screen."""
         self.file_listbox.delete(0, tk.END)
-        for i, f in enumerate(self.files):
-            name = os.path.basename(f)
-            self.file_listbox.insert(tk.END, "  {}".format(name))
-            self.file_status[i] = "pending"
+        self._drawn = {}
+        if len(self.files):
+            self.file_listbox.insert(tk.END, *[self._row_text(i, "pending") for i in range(len(self.files))])
+        self._draw_visible_rows()
 
         self.file_count_label.config(text="{} files".format(len(self.files)))
         self.update_progress(0, len(self.files) or 1)
 
-    def _start(self):
+    def _start(self, calibrate=False):
         """Start automation."""
         if not self.files:
             messagebox.showwarning("No Files", "Add DWG files first.")
             return
 
-        # Check locations
-        required = ["open_drawing", "no_save", "save_selected", "select_top_left", "select_bottom_right"]
-        missing = [loc for loc in required if not self.config.get("click_locations", loc)]
+        # Check locations used by the workflow
+        try:
+            missing = missing_targets(load_plan(self.config), self.config)
+        except (IOError, json.JSONDecodeError) as e:
+            messagebox.showerror("Workflow", "Could not load workflow_file:\n{}".format(e))
+            return
 
         if missing:
             if messagebox.askyesno(
@@ -940,12 +891,24 @@ class App(tk.Tk):
                 return
 
         self.start_btn.config(state="disabled")
+        self.calibrate_btn.config(state="disabled")
         self.stop_btn.config(state="normal")
 
-        for i in range(len(self.files)):
-            self.update_file_status(i, "pending")
+        self.files.reset()
+        self._draw_visible_rows()
 
-        self.automation.start(self.files)
+        self.automation.start(self.files, calibrate=calibrate, incremental=self.incremental_var.get())
+
+    def _calibrate(self):
+        """Run the first few files to learn this workstation's step timings."""
+        count = min(len(self.files), self.config.get("timing", "calibration_files") or 5)
+        if self.files and not messagebox.askyesno(
+            "Calibrate",
+            "Process the first {} files with the default timeouts to learn\n"
+            "how long each step takes on this workstation?".format(count)
+        ):
+            return
+        self._start(calibrate=True)
 
     def _stop(self):
         """Stop automation."""
@@ -1005,35 +968,81 @@ class App(tk.Tk):
             self.progress_var.set((current / total) * 100)
             self.progress_label.config(text="{}/{}".format(current, total))
 
-    def update_file_status(self, index, status):
-        """Update file status in listbox."""
-        if index >= len(self.files):
-            return
+    def update_throughput(self, rate, eta):
+        """Show the rolling files/hour and time left."""
+        if rate is None:
+            self.throughput_label.config(text="")
+        else:
+            self.throughput_label.config(text="{:.0f} files/h - ETA {}".format(rate, format_eta(eta)))
 
-        self.file_status[index] = status
+    def _drain_events(self):
+        """Apply everything the worker posted since the last frame, then schedule the next."""
+        try:
+            files, latest = self.events.drain()
+            follow = None
+            for index, status in files.items():
+                if index < len(self.files):
+                    self.files.set_status(index, status)
+                    if status == "processing":
+                        follow = index
+            if "status" in latest:
+                self.update_status(*latest["status"])
+            if "progress" in latest:
+                self.update_progress(*latest["progress"])
+            if "throughput" in latest:
+                self.update_throughput(*latest["throughput"])
+            if follow is not None:
+                self.file_listbox.see(follow)
+            # Also picks up rows scrolled into view since the last frame
+            self._draw_visible_rows()
+        finally:
+            self.after(FRAME_MS, self._drain_events)
+
+    def _row_text(self, index, status):
+        prefix = {"pending": "  ", "processing": "> ", "checking": "? ", "uploading": "^ ", "done": "  ",
+                  "failed": "! ", "quarantined": "! ", "invalid": "x "}.get(status, "  ")
+        suffix = {"pending": "", "processing": " ...", "checking": " [Checking]", "uploading": " [Uploading]",
+                  "done": " [Done]", "failed": " [Failed]", "quarantined": " [Quarantined]",
+                  "skipped": " [Unchanged]", "invalid": " [Bad DWG]"}.get(status, "")
         name = os.path.basename(self.files[index])
-
-        prefix = {"pending": "  ", "processing": "> ", "done": "  "}.get(status, "  ")
-        suffix = {"pending": "", "processing": " ...", "done": " [Done]"}.get(status, "")
-
-        text = "{}{}{}".format(prefix, name, suffix)
-
-        self.file_listbox.delete(index)
-        self.file_listbox.insert(index, text)
-
+        row = self.bom.find(name) if self.bom is not None else None
+        if row is not None:
+            name = "{}  x{}".format(name, row.quantity)
+        return "{}{}{}".format(prefix, name, suffix)
+
+    def _draw_visible_rows(self):
+        """Redraw the on-screen rows whose status changed since they were last drawn."""
+        if not len(self.files):
+            return
+        first = self.file_listbox.nearest(0)
+        last = self.file_listbox.nearest(self.file_listbox.winfo_height())
         colors = {
             "done": self.colors["success"],
             "processing": self.colors["processing"],
-            "pending": self.colors["fg"]
+            "checking": self.colors["processing"],
+            "uploading": self.colors["processing"],
+            "pending": self.colors["fg"],
+            "failed": self.colors["error"],
+            "quarantined": self.colors["error"],
+            "invalid": self.colors["error"],
+            "skipped": self.colors["accent"]
         }
-        self.file_listbox.itemconfig(index, foreground=colors.get(status, self.colors["fg"]))
-
-        if status == "processing":
-            self.file_listbox.see(index)
+        for index in range(first, min(last, len(self.files) - 1) + 1):
+            status = self.files.get_status(index)
+            if self._drawn.get(index, "pending") == status:
+                continue
+            self.file_listbox.delete(index)
+            self.file_listbox.insert(index, self._row_text(index, status))
+            self.file_listbox.itemconfig(index, foreground=colors.get(status, self.colors["fg"]))
+            if status == "pending":
+                self._drawn.pop(index, None)
+            else:
+                self._drawn[index] = status
 
     def on_automation_stopped(self):
         """Called when automation stops."""
         self.start_btn.config(state="normal")
+        self.calibrate_btn.config(state="normal")
         self.stop_btn.config(state="disabled")
 
 
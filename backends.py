@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+"""
+Desktop Backends
+Everything the automation does to the desktop - clicks, keys, clipboard,
+window focus and screen capture - goes through a backend, so the same runner
+can drive the real TruTops through pyautogui or the simulator in simulator.py.
+
+A backend provides click(x, y), press(key), hotkey(*keys), set_clipboard(text),
+get_clipboard(), focus(title) and a `screen` capture source for CaptureHub.
+"""
+
+import sys
+import time
+
+from capture import open_backend
+from direct_input import ClipboardError, open_native
+
+# Times the clipboard is set again when reading it back shows other text
+CLIPBOARD_ATTEMPTS = 3
+
+
+class Backend:
+    """Interface every desktop backend implements."""
+
+    name = "base"
+    screen = None  # Capture source: grab(region, out), screen_size(), name
+
+    def click(self, x, y):
+        raise NotImplementedError
+
+    def press(self, key):
+        raise NotImplementedError
+
+    def hotkey(self, *keys):
+        raise NotImplementedError
+
+    def set_clipboard(self, text):
+        raise NotImplementedError
+
+    def get_clipboard(self):
+        """Current clipboard text, or None if this backend can't read it."""
+        return None
+
+    def focus(self, title):
+        """Bring the window whose title contains title to the front. Returns True if done."""
+        return True
+
+
+class PyAutoGuiBackend(Backend):
+    """The real desktop: pyautogui input, clip.exe clipboard, win32 focus fallback."""
+
+    name = "pyautogui"
+
+    def __init__(self, capture="auto"):
+        import pyautogui
+
+        self._gui = pyautogui
+        self.screen = open_backend(capture)
+
+    def click(self, x, y):
+        self._gui.moveTo(x, y)
+        time.sleep(0.1)
+        self._gui.click()
+
+    def press(self, key):
+        self._gui.press(key)
+
+    def hotkey(self, *keys):
+        self._gui.hotkey(*keys)
+
+    def set_clipboard(self, text):
+        import subprocess
+        # Use clip.exe on Windows
+        process = subprocess.Popen(['clip'], stdin=subprocess.PIPE)
+        process.communicate(text.encode('utf-8'))
+
+    def focus(self, title):
+        return _focus_pyautogui(self._gui, title)
+
+
+def _focus_pyautogui(gui, title):
+    """Bring a window to the front with pyautogui, falling back to win32gui. Returns True if done."""
+    try:
+        # Try pyautogui first
+        windows = gui.getWindowsWithTitle(title)
+        if windows:
+            win = windows[0]
+            try:
+                # Try multiple activation methods
+                win.minimize()
+                win.restore()
+                win.activate()
+                time.sleep(0.3)
+                print("[FOCUS] Activated: {}".format(win.title))
+                return True
+            except Exception as e:
+                print("[FOCUS] pyautogui activate failed: {}".format(e))
+
+        # Fallback: Try win32gui directly
+        return _focus_win32(title)
+
+    except Exception as e:
+        print("[FOCUS] Error: {}".format(e))
+        return False
+
+
+def _focus_win32(title):
+    """Bring a window to the front with win32gui. Returns True if done."""
+    try:
+        import win32gui
+        import win32con
+
+        def find_window(hwnd, windows_list):
+            if win32gui.IsWindowVisible(hwnd):
+                window_title = win32gui.GetWindowText(hwnd)
+                if title.lower() in window_title.lower():
+                    windows_list.append((hwnd, window_title))
+
+        found = []
+        win32gui.EnumWindows(find_window, found)
+
+        if found:
+            hwnd, win_title = found[0]
+            # Force to foreground
+            win32gui.ShowWindow(hwnd, win32con.SW_RESTORE)
+            win32gui.SetForegroundWindow(hwnd)
+            time.sleep(0.3)
+            print("[FOCUS] win32gui activated: {}".format(win_title))
+            return True
+        else:
+            # List all windows for debugging
+            all_windows = []
+            win32gui.EnumWindows(lambda h, l: l.append(win32gui.GetWindowText(h)) if win32gui.GetWindowText(h) else None, all_windows)
+            print("[FOCUS] Window '{}' not found!".format(title))
+            print("[FOCUS] Available windows containing 'tru':")
+            for w in all_windows:
+                if 'tru' in w.lower():
+                    print("  - {}".format(w))
+            return False
+
+    except ImportError:
+        print("[FOCUS] win32gui not available - install pywin32: pip install pywin32")
+        return False
+    except Exception as e:
+        print("[FOCUS] Error: {}".format(e))
+        return False
+
+
+class DirectBackend(Backend):
+    """Single-event SendInput clicks and keys, in-process clipboard.
+
+    Uses direct_input.Win32Input on Windows; pass a StandInInput as native to
+    drive another backend (e.g. the simulator) the same way elsewhere.
+    """
+
+    name = "direct"
+
+    def __init__(self, capture="auto", native=None):
+        self.native = native or open_native()
+        self.screen = getattr(self.native, "screen", None) or open_backend(capture)
+        # On the real desktop pyautogui still provides the fail-safe corner
+        self._gui = None
+        if native is None:
+            import pyautogui
+            self._gui = pyautogui
+
+    def _fail_safe(self):
+        """Raise pyautogui.FailSafeException if the mouse sits in a screen corner, as pyautogui does."""
+        if self._gui is not None:
+            self._gui.failSafeCheck()
+
+    def click(self, x, y):
+        self._fail_safe()
+        self.native.click(x, y)
+
+    def press(self, key):
+        self._fail_safe()
+        self.native.keys([key])
+
+    def hotkey(self, *keys):
+        self._fail_safe()
+        self.native.keys(list(keys))
+
+    def set_clipboard(self, text):
+        self.native.set_clipboard(text)
+
+    def get_clipboard(self):
+        return self.native.get_clipboard()
+
+    def focus(self, title):
+        focus = getattr(self.native, "focus", None)
+        if focus is not None:
+            return focus(title)
+        if self._gui is None:
+            return _focus_win32(title)
+        # pywin32 is optional, so go through pyautogui first like the pyautogui backend
+        return _focus_pyautogui(self._gui, title)
+
+
+def open_desktop(name="pyautogui", config=None, **options):
+    """Backend by name: direct, pyautogui or simulated."""
+    if name == "simulated":
+        from simulator import SimulatedTruTops
+        return SimulatedTruTops(**options)
+    capture = config.get("capture", "backend") if config is not None else None
+    if name == "direct":
+        if sys.platform == "win32":
+            return DirectBackend(capture or "auto")
+        print("[INPUT] Direct input needs Windows - using pyautogui")
+    return PyAutoGuiBackend(capture or "auto")
+
+
+class Driver:
+    """What WorkflowExecutor drives: a backend plus button lookup from config."""
+
+    def __init__(self, backend, detector, config):
+        self.backend = backend
+        self.detector = detector
+        self.config = config
+
+    def click(self, x, y):
+        self.backend.click(x, y)
+
+    def press(self, key):
+        self.backend.press(key)
+
+    def hotkey(self, *keys):
+        self.backend.hotkey(*keys)
+
+    def set_clipboard(self, text):
+        """Set the clipboard and, where the backend can read it, make sure it holds text."""
+        for attempt in range(1, CLIPBOARD_ATTEMPTS + 1):
+            self.backend.set_clipboard(text)
+            current = self.backend.get_clipboard()
+            if current is None or current == text:
+                return
+            print("[CLIPBOARD] Read back {!r} instead of {!r} (attempt {}/{})".format(
+                current[:40], text[:40], attempt, CLIPBOARD_ATTEMPTS))
+            time.sleep(0.05 * attempt)
+        raise ClipboardError("Clipboard did not take {!r}".format(text))
+
+    def find_button(self, button_key):
+        """Find a configured button on screen using image detection."""
+        image_path = self.config.get("buttons", button_key, "image")
+        fallback = self.config.get("buttons", button_key, "fallback_coords")
+
+        pos, strategy = self.detector.find_button(image_path, fallback)
+
+        if pos:
+            print("[IMAGE] Found '{}' via {} at ({}, {})".format(
+                button_key, strategy, pos[0], pos[1]))
+        else:
+            print("[IMAGE] Could not find '{}'".format(button_key))
+        return pos
@@ -0,0 +1,611 @@
+# -*- coding: utf-8 -*-
+"""
+Batch Runner
+The per-file loop of a conversion batch, without any GUI: journal, preflight,
+incremental skips, staging, the workflow itself, GEO checks, per-file
+recovery and the hang watchdog. Progress goes out through an EventQueue, so
+the Tk window (app.py) and the headless simulator (simulator.py) run the very
+same loop.
+"""
+
+import collections
+import itertools
+import json
+import os
+import time
+
+from backends import Driver
+from button_detector import ButtonDetector
+from geo import GeoValidator
+from hang_watchdog import Watchdog, open_target, restart
+from incremental import ConversionManifest
+from journal import FAILED, QUEUED, SKIPPED, STARTED, SUCCEEDED, JobJournal
+from preflight import preflight
+from recovery import BatchSummary, RecoveryPolicy, is_fatal
+from save_watcher import SaveWatcher, expected_output
+from staging import Stager, StagingCache, is_network_path
+from timing_profile import TimingProfile
+from tracing import Tracer
+from wait_engine import WaitEngine
+from workflow import WorkflowError, WorkflowExecutor, compile_plan, describe_plan, load_plan
+
+
+class BatchRunner:
+    """Converts a list of DWGs one by one through the configured workflow."""
+
+    def __init__(self, config, desktop, hub, events, profile=None, manifest=None, journal=None):
+        """
+        Args:
+            desktop: Backend the workflow drives (real desktop or simulator)
+            hub: CaptureHub over the desktop's screen
+            events: EventQueue progress is posted to ("file", "status", "progress", "throughput")
+            profile, manifest, journal: Default to the files in the working folder
+        """
+        self.config = config
+        self.events = events
+        self.running = False
+        self.current_index = 0
+        self.escape_pressed = False
+        self.step_by_step = False
+        self.dry_run = False
+        self.files = []
+        self.backend = desktop
+        self.hub = hub
+        self.detector = ButtonDetector(self.hub.grab, scales=self.config.get("detect", "scales") or [1.0])
+        self.waits = WaitEngine(poll_interval=self.config.get("wait", "poll_interval") or 0.02,
+                                hub=self.hub, detector=self.detector)
+        self.save_watcher = SaveWatcher(stable_time=self.config.get("save_watch", "stable_time") or 0.3)
+        self.profile = profile or TimingProfile(
+            percentile=self.config.get("timing", "percentile") or 99,
+            margin=self.config.get("timing", "margin") or 0.5,
+            min_samples=self.config.get("timing", "min_samples") or 5,
+        )
+        self.calibrating = False
+        self.incremental = False
+        self.manifest = manifest or ConversionManifest()
+        self.tracer = None
+        self.journal = journal or JobJournal()
+        self.journaling = False
+        self.queue = []
+        self.resuming = False
+        self.watching = False
+        self._incoming = collections.deque()
+        self._names = {}  # Lower-case .geo path -> DWG, for duplicate checks
+        self.validator = None
+        self._validated = collections.deque()  # (index, GeoReport) from the validator thread
+        self._geo_attempts = {}
+        self.stager = None
+        self._local = {}  # index -> staged local copy of the DWG
+        self._uploaded = collections.deque()  # (index, error) from the upload thread
+        self.recovery = RecoveryPolicy.from_config(self.config)
+        self.summary = BatchSummary()
+        self.watchdog = None
+        self.trutops = None  # Target the watchdog checks and restarts (None = from config)
+        self.restarts = 0
+        self._converted = 0  # Files through the workflow this batch, for spacing out profile saves
+        self.report = []
+
+    def prepare(self, files, dry_run=False, step_by_step=False, calibrate=False, incremental=False):
+        """Set up a new batch; run() then processes it.
+
+        Args:
+            calibrate: Process only the first few files with the default
+                timeouts to build up this workstation's timing profile
+            incremental: Skip files whose .geo is already up to date
+        """
+        self.running = True
+        self.escape_pressed = False
+        self.files = files
+        self.dry_run = dry_run
+        self.step_by_step = step_by_step
+        self.calibrating = calibrate
+        self.incremental = incremental and not calibrate
+        self.journaling = not (calibrate or dry_run)
+        self.resuming = False
+
+        if calibrate:
+            self.files = files[:self.config.get("timing", "calibration_files") or 5]
+        self.queue = list(range(len(self.files)))
+        self._incoming.clear()
+        self._names = {}
+        self._validated.clear()
+        self._geo_attempts = {}
+        self._local = {}
+        self._uploaded.clear()
+        self.recovery = RecoveryPolicy.from_config(self.config)
+        self.summary = BatchSummary()
+        self.restarts = 0
+        self._converted = 0
+        self.detector.forget()  # Dialogs are looked for where they last were; windows may have moved
+
+    def enqueue(self, indices):
+        """Add files (indices into the app's file list) to the running batch."""
+        if not self.calibrating:
+            self._incoming.extend(indices)
+
+    def _take_incoming(self, queue):
+        """Move files added while running onto the queue."""
+        added = []
+        while self._incoming:
+            added.append(self._incoming.popleft())
+        if not added:
+            return
+        for i in added:
+            self._mark(i, QUEUED)
+        added = self._preflight(added)
+        if self.incremental:
+            added = self._changed_files(added)
+        queue.extend(added)
+        print("[QUEUE] {} file(s) added to the batch".format(len(added)))
+
+    def _preflight(self, indices):
+        """Indices of files that pass the DWG checks; the rest are failed up front."""
+        if not self.config.get("preflight", "enabled") or not indices:
+            return indices
+        start = time.perf_counter()
+        problems = preflight(
+            [self.files[i] for i in indices],
+            seen=self._names,
+            workers=self.config.get("preflight", "workers") or 8,
+            min_size=self.config.get("preflight", "min_size") or 0,
+            min_version=self.config.get("preflight", "min_version") or "AC1009",
+            output_path=self._output_path,
+        )
+        passed = []
+        for i in indices:
+            reason = problems.get(self.files[i])
+            if reason is None:
+                passed.append(i)
+                continue
+            print("[PREFLIGHT] {} - {}".format(os.path.basename(self.files[i]), reason))
+            self._mark(i, FAILED, "preflight: {}".format(reason))
+            self.events.post("file", i, "invalid")
+        print("[PREFLIGHT] {} of {} files OK ({:.2f}s)".format(len(passed), len(indices), time.perf_counter() - start))
+        return passed
+
+    def _open_stager(self, queue):
+        """Stager for the batch if staging is on ("auto": only for DWGs on a network share)."""
+        enabled = self.config.get("staging", "enabled")
+        if self.dry_run or not enabled or not queue:
+            return None
+        if enabled == "auto" and not is_network_path(self.files[queue[0]]):
+            return None
+        cache = StagingCache(self.config.get("staging", "folder") or None,
+                             (self.config.get("staging", "max_mb") or 2048) * 1024 * 1024)
+        print("[STAGE] Staging DWGs in {} ({:.0f} MB cached)".format(cache.root, cache.size / 1048576.0))
+        return Stager(cache,
+                      prefetch=self.config.get("staging", "prefetch") or 4,
+                      workers=self.config.get("staging", "workers") or 2,
+                      verify=bool(self.config.get("staging", "verify")))
+
+    def _open_watchdog(self):
+        """Hang watchdog for the batch, if it is on."""
+        if self.dry_run or self.step_by_step or not self.config.get("watchdog", "enabled"):
+            return None
+        # Without a way to find and restart TruTops a trip could only stop the batch
+        target = self.trutops or open_target(self.config)
+        if target is None or not target.command:
+            print("[WATCHDOG] Off - set watchdog.restart_command (and process_name or window_title)")
+            return None
+        if not target.alive():
+            print("[WATCHDOG] Off - TruTops process/window not found; check watchdog.process_name")
+            return None
+        return Watchdog(
+            self.hub, target,
+            region=self.config.get("watchdog", "region"),
+            timeout=self.config.get("watchdog", "timeout") or 90.0,
+            unresponsive_timeout=self.config.get("watchdog", "unresponsive_timeout") or 15.0,
+            poll=self.config.get("watchdog", "poll") or 1.0,
+            threshold=self.config.get("wait", "change_threshold") or 1.5,
+        ).start()
+
+    def _hung(self):
+        return self.watchdog is not None and self.watchdog.tripped is not None
+
+    def _restart_trutops(self, reason):
+        """Kill and restart a hung TruTops. Returns True once it is ready for the next file."""
+        self.events.post("status", "TruTops hung ({}) - restarting".format(reason))
+        ok = restart(self.watchdog.target,
+                     ready_timeout=self.config.get("watchdog", "ready_timeout") or 120.0,
+                     settle=self.config.get("watchdog", "restart_settle") or 0.0,
+                     is_running=lambda: self.running)
+        self.restarts += 1
+        if ok:
+            self._focus_trutops()
+        return ok
+
+    def _produced_path(self, index):
+        """Where TruTops actually saved the .geo - next to the staged copy if there is one."""
+        return self._output_path(self._local.get(index, self.files[index]))
+
+    def _finish(self, index):
+        """A file TruTops has converted: done, or checked first if GEO validation is on."""
+        if self.validator is not None:
+            self.events.post("file", index, "checking")
+            self.validator.submit(index, self._produced_path(index))
+            return
+        self._deliver(index)
+
+    def _deliver(self, index):
+        """Upload a staged .geo to the share, or mark the file done if it is already there."""
+        produced, target = self._produced_path(index), self._output_path(self.files[index])
+        if self.stager is None or produced == target:
+            self._succeeded(index)
+            return
+        self.events.post("file", index, "uploading")
+        self.stager.upload(produced, target, lambda error: self._uploaded.append((index, error)))
+
+    def _succeeded(self, index):
+        self.summary.succeeded(index)
+        self._mark(index, SUCCEEDED)
+        self.events.post("file", index, "done")
+        if not self.dry_run:
+            # The staged copy has the same contents and hashes without another trip over SMB
+            self.manifest.record(self.files[index], self._output_path(self.files[index]),
+                                 source=self._local.get(index))
+            if (index + 1) % 10 == 0:
+                self.manifest.save()
+
+    def _take_validated(self, queue, driver=None):
+        """Act on GEO checks and uploads that finished: succeed, queue a retry, or fail the file.
+
+        Args:
+            queue: Files still to convert, or None once the batch is over (no more retries)
+        """
+        while self._validated:
+            i, report = self._validated.popleft()
+            try:
+                self._checked(i, report, queue)
+            except Exception as e:
+                self._result_failed(i, e, queue, driver)
+        while self._uploaded:
+            i, error = self._uploaded.popleft()
+            try:
+                if error is None:
+                    self._succeeded(i)
+                    continue
+                print("[STAGE] Upload of {} failed: {}".format(os.path.basename(self.files[i]), error))
+                self._mark(i, FAILED, "upload failed: {}".format(error))
+                self.events.post("file", i, "failed")
+            except Exception as e:
+                self._result_failed(i, e, queue, driver)
+
+    def _checked(self, index, report, queue):
+        """A finished GEO check: deliver the file, convert it again, or fail it."""
+        name = os.path.basename(self.files[index])
+        if report.ok:
+            print("[GEO] {}: {}".format(name, report.summary()))
+            self._deliver(index)
+            return
+        attempts = self._geo_attempts.get(index, 0) + 1
+        self._geo_attempts[index] = attempts
+        if queue is not None and attempts <= (self.config.get("geo", "retries") or 0):
+            print("[GEO] {}: {} - converting again".format(name, report.summary()))
+            self._mark(index, QUEUED, "bad GEO: {}".format(report.summary()))
+            self.events.post("file", index, "pending")
+            queue.append(index)
+        else:
+            print("[GEO] {}: {}".format(name, report.summary()))
+            self._mark(index, FAILED, "bad GEO: {}".format(report.summary()))
+            self.events.post("file", index, "failed")
+
+    def _result_failed(self, index, error, queue, driver):
+        """Delivering a converted file raised: retry it like any failed file, or fail it after the batch."""
+        print("ERROR: {}".format(error))
+        if queue is not None and driver is not None and not is_fatal(error):
+            self._file_failed(index, str(error), queue, driver)
+            return
+        try:
+            self._mark(index, FAILED, str(error))
+        except Exception as e:
+            print("[JOURNAL] Could not record {}: {}".format(os.path.basename(self.files[index]), e))
+        self.events.post("file", index, "failed")
+        if is_fatal(error):
+            self.events.post("status", "Error: {}".format(error))
+            self.running = False
+
+    def _file_failed(self, index, reason, queue, driver):
+        """Get TruTops back to idle, then retry the file after a pause or quarantine it."""
+        name = os.path.basename(self.files[index])
+        attempts = self.summary.failed(index)
+        if not self.dry_run:
+            self.recovery.reset(driver, is_running=lambda: self.running)
+            self._focus_trutops()
+
+        if attempts <= self.recovery.attempts:
+            delay = self.recovery.delay(attempts)
+            print("[RECOVER] {} failed ({}) - retry {}/{} in {:.1f}s".format(
+                name, reason, attempts, self.recovery.attempts, delay))
+            self._mark(index, QUEUED, reason)
+            self.events.post("file", index, "pending")
+            self._pause(delay)
+            queue.appendleft(index)
+            return
+
+        print("[RECOVER] {} quarantined after {} attempt(s): {}".format(name, attempts, reason))
+        self.summary.quarantine(index, reason)
+        self._mark(index, FAILED, "quarantined: {}".format(reason))
+        self.events.post("file", index, "quarantined")
+        copy = self.recovery.quarantine(self.files[index])
+        if copy is not None:
+            print("[RECOVER] Copied to {}".format(copy))
+        limit = self.recovery.max_consecutive
+        if limit and self.summary.consecutive >= limit:
+            # Something is wrong with TruTops or the desktop, not with the drawings
+            print("[RECOVER] {} files in a row failed - stopping the batch".format(self.summary.consecutive))
+            self.events.post("status", "Stopped: {} files in a row failed".format(self.summary.consecutive))
+            self.running = False
+
+    def _process(self, queue, executor, driver):
+        """Convert the queued files one after the other until the queue is empty or the batch stops."""
+        waiting = False
+        while self.running and not self.escape_pressed:
+            self._take_incoming(queue)
+            self._take_validated(queue, driver)
+            if not queue and self._finishing():
+                time.sleep(0.05)  # Last files still being checked; they may need converting again
+                continue
+            if not queue:
+                # In watch mode an empty queue just means SolidWorks hasn't exported more yet
+                if self.watching and not self.calibrating:
+                    if not waiting:
+                        self.events.post("status", "Waiting for new DWGs - STOP to finish")
+                        waiting = True
+                    time.sleep(0.5)
+                    continue
+                break
+            waiting = False
+            i = queue.popleft()
+            total = len(self.files)
+
+            file_path = self.files[i]
+            file_name = os.path.basename(file_path)  # Just the filename with extension
+            self.current_index = i
+            self._mark(i, STARTED)
+
+            # Update UI
+            self.events.post("file", i, "processing")
+            self.events.post("status", "Processing {} ({}/{}) - ESC to abort".format(file_name, i + 1, total))
+            self.events.post("progress", i, total)
+
+            try:
+                print("\n--- File {}/{}: {} ---".format(i + 1, total, file_name))
+
+                open_path = file_path
+                if self.stager is not None:
+                    # Current file first, then the next few, all copied in the background
+                    self.stager.prefetch([file_path] + list(itertools.islice(queue, self.stager.prefetch_count)))
+                    local = self.stager.stage(file_path)
+                    if local is not None:
+                        open_path = self._local[i] = local
+                if self.watchdog is not None:
+                    self.watchdog.arm()
+                try:
+                    completed = executor.run_file(open_path, is_running=lambda: self.running and not self._hung())
+                finally:
+                    if self.watchdog is not None:
+                        self.watchdog.disarm()
+                    if self.stager is not None:
+                        self.stager.release(file_path)
+                if self._hung() and self.running:
+                    reason = "TruTops hung: {}".format(self.watchdog.tripped)
+                    if not self._restart_trutops(self.watchdog.tripped):
+                        # Left unfinished in the journal; START offers to resume from it
+                        self._mark(i, QUEUED, reason)
+                        self.events.post("file", i, "pending")
+                        self.events.post("status", "TruTops hung and could not be restarted")
+                        self.running = False
+                        break
+                    self._file_failed(i, reason, queue, driver)
+                    continue
+                if not self.running:
+                    break
+                self._converted += 1
+                if self._converted % (self.config.get("timing", "save_every") or 10) == 0:
+                    self.profile.save()  # The rest is saved when the batch ends
+                self._show_throughput(len(queue))
+
+                if not completed:
+                    print("FAILED: {}".format(file_name))
+                    self._file_failed(i, "workflow step failed", queue, driver)
+                    continue
+
+                self._finish(i)
+                print("Done!")
+
+            except Exception as e:
+                print("ERROR: {}".format(e))
+                if is_fatal(e):
+                    self._mark(i, FAILED, str(e))
+                    self.events.post("status", "Error: {}".format(e))
+                    self.running = False
+                    break
+                self._file_failed(i, str(e), queue, driver)
+
+    def _cleanup(self):
+        """Stop the watchdog, wait for the last checks and uploads, save what was learned."""
+        if self.watchdog is not None:
+            self.watchdog.stop()
+            self.watchdog = None
+        if self.validator is not None:
+            self.validator.join()
+            self.validator.close()
+            self._take_validated(None)
+            self.validator = None
+        if self.stager is not None:
+            self.stager.close()  # Waits for the last uploads
+            self._take_validated(None)
+            self.stager = None
+        self.profile.save()
+        self.manifest.save()
+        self.journal.close()
+        self._export_trace()
+
+    def _pause(self, seconds):
+        """Sleep, but wake up early if the batch is stopped."""
+        end = time.perf_counter() + seconds
+        while self.running and not self.escape_pressed and time.perf_counter() < end:
+            time.sleep(0.05)
+
+    def _report(self):
+        """Print the retried / quarantined files at the end of a batch."""
+        lines = self.summary.lines(self.files)
+        if lines:
+            print("\n[SUMMARY]")
+            for line in lines:
+                print("  " + line)
+        return lines
+
+    def _finishing(self):
+        """True while converted files are still being checked or uploaded."""
+        return bool(self._validated or self._uploaded
+                    or (self.validator is not None and self.validator.busy)
+                    or (self.stager is not None and self.stager.busy))
+
+    def _mark(self, index, state, reason=None):
+        """Record a file's progress in the batch journal."""
+        if self.journaling:
+            self.journal.mark(self.files[index], state, reason)
+
+    def _focus_trutops(self):
+        """Try to focus TrueTops window."""
+        title = self.config.get("trutops_window_title")
+        if not title:
+            # No window title configured - skip focusing
+            print("[FOCUS] Skipped (no window configured)")
+            return True
+        return self.backend.focus(title)
+
+    def _wait_for_confirm(self, action_desc):
+        """In step-by-step mode, wait for user to press Enter."""
+        if self.step_by_step:
+            print("\n  >>> NEXT: {} <<<".format(action_desc))
+            print("  Press ENTER to continue (or 'q' to quit)...")
+            response = input("  > ").strip().lower()
+            if response == 'q':
+                self.running = False
+                return False
+        return True
+
+    def _output_path(self, file_path):
+        """Where the .geo for a DWG is expected."""
+        return expected_output(
+            file_path,
+            self.config.get("save_watch", "output_folder"),
+            self.config.get("save_watch", "extension") or ".geo",
+        )
+
+    def _changed_files(self, indices):
+        """Indices of files that need converting; marks the rest as skipped."""
+        queue = []
+        for i in indices:
+            needed, reason = self.manifest.needs_conversion(self.files[i], self._output_path(self.files[i]))
+            if needed:
+                queue.append(i)
+            else:
+                print("[SKIP] {} - {}".format(os.path.basename(self.files[i]), reason))
+                self._mark(i, SKIPPED, reason)
+                self.events.post("file", i, "skipped")
+        self.manifest.save()
+        print("[INCREMENTAL] {} of {} files need converting".format(len(queue), len(indices)))
+        return queue
+
+    def _show_throughput(self, remaining):
+        """Rolling files/hour and ETA from the trace."""
+        if self.tracer is None:
+            return
+        rate, eta = self.tracer.rolling_rate(), self.tracer.eta(remaining)
+        self.events.post("throughput", rate, eta)
+
+    def _export_trace(self):
+        """Write the batch trace and print the steps that took longest."""
+        if self.tracer is None or not self.tracer.spans:
+            return
+        try:
+            base = self.tracer.export(self.config.get("trace", "folder") or "traces")
+        except IOError as e:
+            print("[TRACE] Could not save trace: {}".format(e))
+            return
+        print("[TRACE] Saved {}.jsonl / .csv / .trace.json".format(base))
+        for row in self.tracer.summary()[:5]:
+            print("  {:<22} {:<6} {:>8.2f}s total  {:>6.3f}s mean  {:>6.3f}s p95  (x{})".format(
+                row["step"], row["phase"], row["total"], row["mean"], row["p95"], row["count"]))
+
+    def run(self):
+        """Process the prepared batch on this thread.
+
+        Returns:
+            "invalid" (bad workflow plan), "aborted" (ESC), "stopped",
+            "calibrated" or "complete"
+        """
+        try:
+            plan = load_plan(self.config)
+            steps = compile_plan(plan, self.config)
+        except (WorkflowError, IOError, json.JSONDecodeError) as e:
+            print("[WORKFLOW] Invalid plan: {}".format(e))
+            self.events.post("status", "Workflow error: {}".format(e))
+            self.running = False
+            return "invalid"
+
+        driver = Driver(self.backend, self.detector, self.config)
+        executor = WorkflowExecutor(steps, self.config, driver, self.waits, self.save_watcher, self.profile)
+        executor.dry_run = self.dry_run
+        executor.calibrating = self.calibrating
+        self.tracer = Tracer(self.config.get("trace", "window") or 10) if self.config.get("trace", "enabled") else None
+        executor.tracer = self.tracer
+        if self.step_by_step:
+            executor.confirm = self._wait_for_confirm
+
+        # Focus TrueTops first
+        print("\n" + "=" * 50)
+        print("STARTING AUTOMATION - Press ESC to abort")
+        print("Workflow: {}".format(describe_plan(plan)))
+        print("=" * 50)
+
+        queue = self.queue
+        if self.journaling:
+            if self.resuming:
+                self.journal.resume()
+            else:
+                self.journal.begin([self.files[i] for i in queue])
+        queue = self._preflight(queue)
+        if self.incremental:
+            queue = self._changed_files(queue)
+        queue = collections.deque(queue)
+
+        # .geo files are checked on a background thread while the next DWG runs
+        self.validator = None
+        if self.config.get("geo", "validate") and not self.dry_run:
+            self.validator = GeoValidator(
+                lambda i, report: self._validated.append((i, report)),
+                etch_layers=self.config.get("geo", "etch_layers") or [2],
+                allow_open_cuts=bool(self.config.get("geo", "allow_open_cuts")),
+            )
+        self.stager = self._open_stager(queue)
+        self.watchdog = self._open_watchdog()
+
+        self._focus_trutops()
+        time.sleep(0.5)
+
+        try:
+            self._process(queue, executor, driver)
+        finally:
+            self._cleanup()
+        total = len(self.files)
+        self.report = self._report()
+
+        if self.escape_pressed:
+            outcome = "aborted"
+            self.events.post("status", "Aborted by user (ESC)")
+        elif self.running and self.calibrating:
+            outcome = "calibrated"
+            self.events.post("status", "Calibration complete!")
+            self.events.post("progress", total, total)
+        elif self.running:
+            outcome = "complete"
+            self.events.post("status", "Complete!")
+            self.events.post("progress", total, total)
+        else:
+            outcome = "stopped"
+        self.running = False
+        return outcome
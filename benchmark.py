@@ -0,0 +1,438 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks
+Measures the automation on synthetic data and the simulated TruTops so changes
+can be compared without TruTops or a real desktop. Results are printed as
+JSON; give a stored baseline to have regressions flagged (exit code 1).
+
+    python benchmark.py                              # everything
+    python benchmark.py throughput --files 10 100
+    python benchmark.py --save baseline.json
+    python benchmark.py --baseline baseline.json --tolerance 0.15
+"""
+
+import argparse
+import contextlib
+import copy
+import csv
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import zipfile
+
+import cv2
+import numpy as np
+
+from bom import load_bom
+from button_detector import ButtonDetector
+from file_queue import EventQueue, FileQueue
+from journal import STARTED, SUCCEEDED, JobJournal
+from timing_profile import percentile
+
+RESOLUTIONS = {
+    "1080p": (1920, 1080),
+    "4k": (3840, 2160),
+}
+
+
+def synthetic_frame(width, height, seed=0):
+    """RGB frame that looks roughly like a desktop: flat panels, text-ish noise."""
+    rng = np.random.default_rng(seed)
+    frame = np.full((height, width, 3), 236, dtype=np.uint8)
+    for _ in range(200):
+        x, y = int(rng.integers(0, width - 200)), int(rng.integers(0, height - 60))
+        w, h = int(rng.integers(40, 400)), int(rng.integers(16, 200))
+        frame[y:y + h, x:x + w] = rng.integers(60, 250, size=3, dtype=np.uint8)
+    specks = rng.random((height, width)) < 0.01
+    frame[specks] = 0
+    return frame
+
+
+def _timings(func, repeat):
+    """Run func repeat times, return per-call milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def _summary(samples):
+    return {
+        "mean_ms": round(statistics.mean(samples), 3),
+        "median_ms": round(statistics.median(samples), 3),
+        "max_ms": round(max(samples), 3),
+    }
+
+
+def bench_detector(resolution="4k", repeat=10):
+    """Button lookup on a synthetic frame: old per-call approach vs ButtonDetector."""
+    width, height = RESOLUTIONS[resolution]
+    frame = synthetic_frame(width, height)
+
+    # Button somewhere in the lower right, cut out as the template
+    bx, by, bw, bh = width - 700, height - 300, 160, 44
+    frame[by:by + bh, bx:bx + bw] = (70, 130, 200)
+    cv2.putText(frame, "Save", (bx + 40, by + 30), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (255, 255, 255), 2)
+    template = frame[by:by + bh, bx:bx + bw].copy()
+
+    folder = tempfile.mkdtemp(prefix="bench_detector_")
+    path = os.path.join(folder, "button.png")
+    cv2.imencode(".png", cv2.cvtColor(template, cv2.COLOR_RGB2BGR))[1].tofile(path)
+
+    def grab(region=None):
+        # Copy so each capture costs what a real grab of that area allocates
+        if region is None:
+            return frame.copy()
+        left, top, right, bottom = region
+        return frame[top:bottom, left:right].copy()
+
+    def legacy_lookup():
+        # What pyautogui.locateOnScreen did per strategy: full capture, reload PNG, match
+        for confidence in (0.8, 0.6, 0.5):
+            screen = grab()
+            needle = cv2.cvtColor(cv2.imread(path), cv2.COLOR_BGR2RGB)
+            result = cv2.matchTemplate(screen, needle, cv2.TM_CCOEFF_NORMED)
+            if cv2.minMaxLoc(result)[1] >= confidence:
+                return
+
+    detector = ButtonDetector(grab=grab)
+    detector.find_button(path)  # Warm the template cache and last-hit region
+
+    legacy = _timings(legacy_lookup, repeat)
+    cached = _timings(lambda: detector.find_button(path), repeat)
+    return {
+        "resolution": resolution,
+        "legacy": _summary(legacy),
+        "cached_roi": _summary(cached),
+        "speedup": round(statistics.median(legacy) / max(statistics.median(cached), 1e-6), 1),
+    }
+
+
+def bench_matcher(resolution="4k", repeat=5):
+    """Which of several dialogs is showing: one MultiTemplateMatcher pass vs a lookup each."""
+    width, height = RESOLUTIONS[resolution]
+    frame = synthetic_frame(width, height, seed=1)
+
+    folder = tempfile.mkdtemp(prefix="bench_matcher_")
+    images = {}
+    for i, label in enumerate(("Save Selection", "OK", "Warning")):
+        x, y = 100 + i * (width // 3), height // 2
+        frame[y:y + 48, x:x + 220] = (90 + i * 40, 120, 180)
+        cv2.putText(frame, label, (x + 10, y + 32), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
+        template = frame[y:y + 48, x:x + 220]
+        images[label] = os.path.join(folder, "{}.png".format(i))
+        cv2.imencode(".png", cv2.cvtColor(template, cv2.COLOR_RGB2BGR))[1].tofile(images[label])
+
+    def grab(region=None):
+        return frame.copy()
+
+    detector = ButtonDetector(grab=grab, scales=(1.0,))
+    multi = ButtonDetector(grab=grab)
+    multi.detect_all(images)  # Build the matcher once
+
+    def one_by_one():
+        for path in images.values():
+            detector._last_hits.clear()
+            detector.locate(path)
+
+    separate = _timings(one_by_one, repeat)
+    single_pass = _timings(lambda: multi.detect_all(images), repeat)
+    return {
+        "resolution": resolution,
+        "templates": len(images),
+        "separate_lookups": _summary(separate),
+        "single_pass_multiscale": _summary(single_pass),
+        "speedup": round(statistics.median(separate) / max(statistics.median(single_pass), 1e-6), 1),
+    }
+
+
+def bench_journal(files=200):
+    """Progress bookkeeping per file: rewriting config.json vs the batch journal."""
+    folder = tempfile.mkdtemp(prefix="bench_journal_")
+    config_path = os.path.join(folder, "config.json")
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.json")) as f:
+        config = json.load(f)
+    names = [os.path.join(folder, "part_{:04d}.dwg".format(i)) for i in range(files)]
+
+    def config_rewrite():
+        # What Config.set("last_processed_index", i) did for every file
+        config["last_processed_index"] = config.get("last_processed_index", 0) + 1
+        with open(config_path, 'w') as f:
+            json.dump(config, f, indent=2)
+
+    journal = JobJournal(os.path.join(folder, "job_journal.jsonl"))
+    journal.begin(names)
+    marks = iter(names)
+
+    def journal_marks():
+        name = next(marks)
+        journal.mark(name, STARTED)
+        journal.mark(name, SUCCEEDED)
+
+    rewrite = _timings(config_rewrite, files)
+    journaled = _timings(journal_marks, files)
+    journal.close()
+    return {
+        "files": files,
+        "config_rewrite": _summary(rewrite),
+        "journal": _summary(journaled),
+    }
+
+
+def bench_queue(files=10000):
+    """Loading and tracking a big batch: list scans vs FileQueue, per-event vs coalesced updates."""
+    paths = [os.path.join("C:\\Laser", "part_{:05d}.dwg".format(i)) for i in range(files)]
+
+    def list_add():
+        # What App._add_files did: a linear membership test per file
+        known = []
+        for path in paths:
+            if path not in known:
+                known.append(path)
+
+    old_add = _timings(list_add, 1)
+    new_add = _timings(lambda: FileQueue(paths), 5)
+
+    # A batch posts processing + done per file plus status text and progress
+    events = EventQueue()
+    for i in range(files):
+        events.post("file", i, "processing")
+        events.post("status", "Processing {}".format(i))
+        events.post("progress", i, files)
+        events.post("file", i, "done")
+    start = time.perf_counter()
+    changed, latest = events.drain()
+    drain_ms = (time.perf_counter() - start) * 1000
+    return {
+        "files": files,
+        "list_add_ms": round(old_add[0], 3),
+        "queue_add": _summary(new_add),
+        "events_posted": files * 4,
+        "file_updates_after_coalescing": len(changed),
+        "drain_ms": round(drain_ms, 3),
+    }
+
+
+BOM_MATERIALS = ("SS 7GA", "SS 11GA", "SS 14GA", "SS 16GA", "UHMW", "HDPE")
+
+
+def write_bom(folder, rows):
+    """Synthetic BOM laid out like the SolidWorks export, as .csv and .xlsx (13 columns)."""
+    lines = [["Assembly BOM"], ["Item", "Document", "Description", "", "", "Qty", "", "", "", "", "", "Material", "Hand"]]
+    for i in range(rows):
+        part = i % max(rows // 3, 1)  # Each part turns up in three assemblies
+        lines.append([str(i + 1), "PART-{:05d}.SLDPRT".format(part), "Plate {}".format(part),
+                      "", "", str(i % 7 + 1), "", "", "", "", "", BOM_MATERIALS[part % len(BOM_MATERIALS)],
+                      "L" if part % 2 else "R"])
+    csv_path = os.path.join(folder, "bom.csv")
+    with open(csv_path, 'w', newline='') as f:
+        csv.writer(f).writerows(lines)
+
+    cells = []
+    for r, line in enumerate(lines, 1):
+        row = "".join('<c r="{}{}" t="inlineStr"><is><t>{}</t></is></c>'.format(chr(65 + c), r, value)
+                      for c, value in enumerate(line) if value)
+        cells.append('<row r="{}">{}</row>'.format(r, row))
+    ns = 'xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"'
+    xlsx_path = os.path.join(folder, "bom.xlsx")
+    with zipfile.ZipFile(xlsx_path, 'w', zipfile.ZIP_DEFLATED) as z:
+        z.writestr("xl/workbook.xml", '<workbook {} xmlns:r="http://schemas.openxmlformats.org/officeDocument/'
+                   '2006/relationships"><sheets><sheet name="BOM" sheetId="1" r:id="rId1"/></sheets></workbook>'.format(ns))
+        z.writestr("xl/_rels/workbook.xml.rels", '<Relationships xmlns="http://schemas.openxmlformats.org/package/'
+                   '2006/relationships"><Relationship Id="rId1" Target="worksheets/sheet1.xml"/></Relationships>')
+        z.writestr("xl/worksheets/sheet1.xml", '<worksheet {}><sheetData>{}</sheetData></worksheet>'.format(ns, "".join(cells)))
+    return csv_path, xlsx_path
+
+
+def bench_bom(rows=30000):
+    """Loading and indexing a large BOM, and material / file lookups against it."""
+    folder = tempfile.mkdtemp(prefix="bench_bom_")
+    csv_path, xlsx_path = write_bom(folder, rows)
+    with contextlib.redirect_stdout(None):
+        csv_load = _timings(lambda: load_bom(csv_path), 3)
+        xlsx_load = _timings(lambda: load_bom(xlsx_path), 3)
+        bom = load_bom(xlsx_path)
+    names = ["PART-{:05d}FLO.dwg".format(i) for i in range(rows // 3)]
+    lookups = _timings(lambda: [bom.find(name) for name in names], 5)
+    return {
+        "rows": rows,
+        "parts": len(bom.rows),
+        "csv_load": _summary(csv_load),
+        "xlsx_load": _summary(xlsx_load),
+        "select_material": _summary(_timings(lambda: bom.select(names, "SS 14GA"), 5)),
+        "lookup_us": round(statistics.mean(lookups) * 1000 / len(names), 3),
+    }
+
+
+THROUGHPUT_SIZES = (10, 100, 1000)
+
+# Throughput runs use a simulated TruTops twenty times faster than the default
+# latencies, with the waits tightened to match, so 1000 files take minutes
+FAST_SPEED = 0.05
+FAST_SETTINGS = {
+    "wait": {"poll_interval": 0.005, "settle_time": 0.03, "change_timeout": 0.3},
+    "save_watch": {"stable_time": 0.03},
+    "dialogs": {"appear_timeout": 0.1},
+}
+
+
+def _usage():
+    """(CPU seconds, RSS in MB) of this process, or (None, None) if unknown."""
+    try:
+        import psutil
+        process = psutil.Process()
+        times = process.cpu_times()
+        return times.user + times.system, process.memory_info().rss / 2 ** 20
+    except ImportError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None, None
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    # Peak rather than current RSS; kilobytes on Linux, bytes on macOS
+    rss = usage.ru_maxrss / (2 ** 20 if sys.platform == "darwin" else 2 ** 10)
+    return usage.ru_utime + usage.ru_stime, rss
+
+
+def _percentiles(samples):
+    if not samples:
+        return {}
+    return {"p50": round(percentile(samples, 50), 4), "p90": round(percentile(samples, 90), 4),
+            "p99": round(percentile(samples, 99), 4)}
+
+
+def bench_throughput(files=10, seed=0):
+    """Whole batch through the app's batch loop (batch.BatchRunner) against the
+    simulated TruTops. cpu_percent and rss_mb are for this process, so they
+    cover the batch loop and the simulator together.
+    """
+    from simulator import simulate
+    from workflow import DEFAULT_WORKFLOW
+
+    plan = copy.deepcopy(DEFAULT_WORKFLOW)
+    for step in plan:
+        if "settle_time" in step.get("wait", {}):
+            step["wait"]["settle_time"] = FAST_SETTINGS["wait"]["settle_time"]
+
+    cpu_before, _ = _usage()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        result = simulate(files, speed=FAST_SPEED, seed=seed, plan=plan, overrides=FAST_SETTINGS)
+    cpu_after, rss = _usage()
+
+    summary = {
+        "files": files,
+        "failed": result["failed"],
+        "seconds": result["seconds"],
+        "files_per_hour": result["files_per_hour"],
+        "file_seconds": _percentiles(result["file_seconds"]),
+        "step_seconds": {name: _percentiles(samples) for name, samples in result["step_seconds"].items()},
+    }
+    if cpu_before is not None:
+        summary["cpu_percent"] = round((cpu_after - cpu_before) / max(result["seconds"], 1e-6) * 100, 1)
+        summary["rss_mb"] = round(rss, 1)
+    return summary
+
+
+def _throughput(sizes):
+    return [bench_throughput(files) for files in sizes]
+
+
+BENCHMARKS = {
+    "detector": lambda sizes: [bench_detector(name) for name in RESOLUTIONS],
+    "matcher": lambda sizes: [bench_matcher(name) for name in RESOLUTIONS],
+    "journal": lambda sizes: [bench_journal()],
+    "queue": lambda sizes: [bench_queue()],
+    "bom": lambda sizes: [bench_bom()],
+    "throughput": _throughput,
+}
+
+# Leaf names compared against a baseline, and which way is better
+HIGHER_IS_BETTER = ("files_per_hour", "speedup")
+COMPARED = HIGHER_IS_BETTER + ("mean_ms", "median_ms", "p50", "p90", "p99", "cpu_percent", "rss_mb")
+
+# Changes smaller than this are noise whatever the percentage (seconds, ms, points, MB)
+NOISE_FLOOR = {"p50": 0.02, "p90": 0.02, "p99": 0.02, "mean_ms": 0.05, "median_ms": 0.05,
+               "cpu_percent": 5.0, "rss_mb": 10.0}
+
+
+def flatten(results, prefix=""):
+    """Dotted metric names -> numbers. List entries are named by resolution or file count."""
+    flat = {}
+    if isinstance(results, dict):
+        for key, value in results.items():
+            flat.update(flatten(value, "{}.{}".format(prefix, key) if prefix else key))
+    elif isinstance(results, list):
+        for i, value in enumerate(results):
+            label = i
+            if isinstance(value, dict):
+                label = value.get("resolution") or value.get("files") or i
+            flat.update(flatten(value, "{}[{}]".format(prefix, label)))
+    elif isinstance(results, (int, float)) and not isinstance(results, bool):
+        flat[prefix] = results
+    return flat
+
+
+def compare(results, baseline, tolerance=0.15):
+    """Metrics that got worse than the baseline by more than tolerance (a fraction)."""
+    current, previous = flatten(results), flatten(baseline)
+    regressions = []
+    for name, value in sorted(current.items()):
+        leaf = name.rsplit(".", 1)[-1]
+        old = previous.get(name)
+        if leaf not in COMPARED or not old:
+            continue
+        change = (value - old) / abs(old)
+        worse = -change if leaf in HIGHER_IS_BETTER else change
+        if worse > tolerance and abs(value - old) > NOISE_FLOOR.get(leaf, 0):
+            regressions.append({"metric": name, "baseline": old, "current": value,
+                                "change_percent": round(change * 100, 1)})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the converter on synthetic data")
+    parser.add_argument("names", nargs="*", help="Benchmarks to run: {}".format(", ".join(BENCHMARKS)))
+    parser.add_argument("--files", type=int, nargs="+", default=list(THROUGHPUT_SIZES),
+                        help="Batch sizes for the throughput benchmark")
+    parser.add_argument("--baseline", help="Earlier results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed slowdown (0.15 = 15%%)")
+    parser.add_argument("--save", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    names = args.names or list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        print("Unknown benchmark '{}'. Available: {}".format(unknown[0], ", ".join(BENCHMARKS)))
+        return 1
+
+    output = {
+        "meta": {
+            "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "machine": platform.node(),
+        },
+        "results": {name: BENCHMARKS[name](args.files) for name in names},
+    }
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        output["regressions"] = compare(output["results"], baseline.get("results", baseline), args.tolerance)
+
+    text = json.dumps(output, indent=2)
+    print(text)
+    if args.save:
+        with open(args.save, 'w') as f:
+            f.write(text + "\n")
+    return 1 if output.get("regressions") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,358 @@
+# -*- coding: utf-8 -*-
+"""
+BOM Import
+Loads a SolidWorks BOM export (CSV or XLSX) and indexes it by material and by
+DWG file name, so picking a material or checking whether a DWG is on the BOM
+is a dictionary lookup. Rows are streamed: CSV through the csv module and XLSX
+straight from the workbook XML with the standard library, no Excel needed.
+
+Column numbers are 1-based like the BomCopier settings (column B = 2). Part
+names such as "BRACKET-001.SLDPRT" map to both "BRACKET-001.dwg" and the flat
+pattern export "BRACKET-001FLO.dwg".
+
+    python bom.py BOM.xlsx                  # materials and part counts
+    python bom.py BOM.xlsx --material "SS 14GA"
+"""
+
+import argparse
+import csv
+import io
+import json
+import os
+import posixpath
+import re
+import sys
+import time
+import zipfile
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import unescape
+
+# Same defaults as BomCopier's AppConfig
+DEFAULT_MAPPING = {
+    "name_column": 2,          # Column B: document name
+    "quantity_column": 6,      # Column F
+    "material_column": 12,     # Column L
+    "handedness_column": 0,    # 0 = not in this BOM
+    "header_rows": 2,          # Title + header rows to skip
+    "part_extension": ".SLDPRT",
+    "suffix": "FLO",           # Flat pattern exports are named <part>FLO.dwg
+    "extension": ".dwg",
+}
+
+_SHEET_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_PKG_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+
+class BomError(ValueError):
+    """Raised when a BOM file cannot be read."""
+
+
+class BomRow:
+    """One part on the BOM. Quantities of a part listed in several assemblies are added up."""
+
+    __slots__ = ("part", "material", "quantity", "handedness", "line")
+
+    def __init__(self, part, material, quantity, handedness="", line=0):
+        self.part = part
+        self.material = material
+        self.quantity = quantity
+        self.handedness = handedness
+        self.line = line
+
+    def file_names(self, mapping=DEFAULT_MAPPING):
+        """(normal, suffix) DWG names for this part, e.g. part.dwg and partFLO.dwg."""
+        base = _base_name(self.part, mapping["part_extension"])
+        return base + mapping["extension"], base + mapping["suffix"] + mapping["extension"]
+
+    def __repr__(self):
+        return "BomRow({!r}, {!r}, qty={})".format(self.part, self.material, self.quantity)
+
+
+def _base_name(part, part_extension):
+    if part_extension and part.lower().endswith(part_extension.lower()):
+        return part[:-len(part_extension)]
+    return os.path.splitext(part)[0]
+
+
+def _cell(row, column):
+    return row[column].strip() if 0 <= column < len(row) else ""
+
+
+def _quantity(text):
+    try:
+        return int(float(text))
+    except (TypeError, ValueError):
+        return 0
+
+
+# Readers: each yields one list of cell strings per sheet row
+
+def _csv_rows(path):
+    with open(path, 'r', newline='', encoding='utf-8-sig', errors='replace') as f:
+        sample = f.read(4096)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+        except csv.Error:
+            dialect = csv.excel
+        for row in csv.reader(f, dialect):
+            yield row
+
+
+_COLUMNS = {}
+
+
+def _column_index(letters):
+    """Zero-based column of cell reference letters like "AB"."""
+    index = _COLUMNS.get(letters)
+    if index is None:
+        index = 0
+        for char in letters:
+            index = index * 26 + ord(char) - 64
+        index = _COLUMNS[letters] = index - 1
+    return index
+
+
+def _column_letters(index):
+    """Zero-based column -> letters, e.g. 27 -> "AB"."""
+    letters = ""
+    index += 1
+    while index:
+        index, rest = divmod(index - 1, 26)
+        letters = chr(65 + rest) + letters
+    return letters
+
+
+def _first_sheet(archive):
+    """Path inside the archive of the workbook's first worksheet."""
+    workbook = ET.fromstring(archive.read("xl/workbook.xml"))
+    sheet = workbook.find("{0}sheets/{0}sheet".format(_SHEET_NS))
+    if sheet is None:
+        raise BomError("Workbook has no worksheets")
+    rel_id = sheet.get(_REL_NS + "id")
+    rels = ET.fromstring(archive.read("xl/_rels/workbook.xml.rels"))
+    for rel in rels.iter(_PKG_REL_NS + "Relationship"):
+        if rel.get("Id") == rel_id:
+            target = rel.get("Target")
+            return target.lstrip("/") if target.startswith("/") else posixpath.normpath("xl/" + target)
+    raise BomError("Workbook relationship {} not found".format(rel_id))
+
+
+# The sheet XML is scanned with regular expressions rather than parsed into
+# elements, which makes a 50,000-row BOM several times quicker to load. Cells
+# carry their own reference (r="L12"), so rows need no parsing, and the
+# pattern only matches the columns that are used. Some generators put an x:
+# namespace prefix on every tag.
+_CELL = r'<{p}c r="({letters})(\d+)"([^>/]*)(?:/>|>(?:<{p}v>([^<]*)</{p}v>)?(.*?)</{p}c>)'
+_VALUE = re.compile(r"<(?:x:)?v>([^<]*)</(?:x:)?v>")
+_TEXT = re.compile(r"<(?:x:)?t\b[^>]*>([^<]*)</(?:x:)?t>")
+# Plain strings are <si><t>text</t></si>; rich text splits them into runs
+_STRING_ITEM = re.compile(r"<(?:x:)?si><(?:x:)?t(?: [^>]*)?>([^<]*)</(?:x:)?t></(?:x:)?si>"
+                          r"|<(?:x:)?si>(.*?)</(?:x:)?si>", re.S)
+
+
+def _text(xml):
+    text = "".join(_TEXT.findall(xml))
+    return unescape(text) if "&" in text else text
+
+
+def _shared_strings(archive):
+    if "xl/sharedStrings.xml" not in archive.namelist():
+        return []
+    xml = archive.read("xl/sharedStrings.xml").decode("utf-8")
+    strings = []
+    for plain, rich in _STRING_ITEM.findall(xml):
+        if rich:
+            strings.append(_text(rich))
+        else:
+            strings.append(unescape(plain) if "&" in plain else plain)
+    return strings
+
+
+def _sheet_chunks(stream, size=1024 * 1024):
+    """Sheet XML in pieces that each end after a complete row."""
+    pending = ""
+    while True:
+        data = stream.read(size)
+        if not data:
+            break
+        pending += data
+        end = pending.rfind("row>")  # Closing tags only: </row> or </x:row>
+        if end >= 0:
+            yield pending[:end + 4]
+            pending = pending[end + 4:]
+    if pending:
+        yield pending
+
+
+def _xlsx_rows(path, columns=None):
+    try:
+        archive = zipfile.ZipFile(path)
+    except zipfile.BadZipFile:
+        raise BomError("{} is not an .xlsx workbook".format(path))
+    letters = "[A-Z]+"
+    if columns is not None:
+        letters = "|".join(sorted(set(_column_letters(column) for column in columns if column >= 0)))
+    with archive:
+        strings = _shared_strings(archive)
+        # Decode incrementally so multi-byte characters split across reads survive
+        stream = io.TextIOWrapper(archive.open(_first_sheet(archive)), encoding="utf-8", errors="replace")
+        cell = None
+        number, row, previous = 1, [], "1"
+        for chunk in _sheet_chunks(stream):
+            if cell is None:
+                prefix = "x:" if "<x:c " in chunk else ""
+                cell = re.compile(_CELL.format(p=prefix, letters=letters), re.S)
+            for column, ref, attrs, value, body in cell.findall(chunk):
+                if ref != previous:
+                    # Rows without any (wanted) cells are left out; keep line numbers right
+                    previous, target = ref, int(ref)
+                    while number < target:
+                        yield row
+                        number, row = number + 1, []
+
+                if body and 't="inlineStr"' in attrs:
+                    text = _text(body)
+                else:
+                    if body:
+                        # A formula comes before its cached value
+                        found = _VALUE.search(body)
+                        value = found.group(1) if found else ""
+                    if value and 't="s"' in attrs:
+                        text = strings[int(value)]
+                    else:
+                        text = unescape(value) if "&" in value else value
+                column = _column_index(column)
+                if column >= len(row):
+                    row.extend([""] * (column - len(row) + 1))
+                row[column] = text
+        yield row
+
+
+def read_rows(path, columns=None):
+    """Stream a BOM's rows as lists of strings, picking the reader by extension.
+
+    Args:
+        columns: Zero-based columns that are needed; spreadsheets skip the rest
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension in (".xlsx", ".xlsm"):
+        return _xlsx_rows(path, columns)
+    if extension in (".csv", ".txt"):
+        return _csv_rows(path)
+    raise BomError("Unsupported BOM format '{}' (use .xlsx or .csv)".format(extension))
+
+
+class Bom:
+    """BOM rows with indexes by material and by DWG file name."""
+
+    def __init__(self, mapping=None):
+        self.mapping = dict(DEFAULT_MAPPING, **(mapping or {}))
+        self.rows = []
+        self.by_material = {}   # material (lower case) -> [BomRow]
+        self.by_file = {}       # DWG file name (lower case) -> BomRow
+        self._materials = {}    # material (lower case) -> name as first written
+        self.conflicts = []     # (part, material, other material) listed under two materials
+
+    def add(self, part, material, quantity, handedness="", line=0):
+        """Add a BOM line, merging it with an earlier line for the same part."""
+        base = _base_name(part, self.mapping["part_extension"]).lower()
+        normal = base + self.mapping["extension"].lower()
+        suffix = base + (self.mapping["suffix"] + self.mapping["extension"]).lower()
+        existing = self.by_file.get(normal)
+        if existing is not None:
+            if existing.material.lower() == material.lower():
+                existing.quantity += quantity
+                return existing
+            self.conflicts.append((part, existing.material, material))
+        row = BomRow(part, material, quantity, handedness, line)
+        self.rows.append(row)
+        key = material.lower()
+        self._materials.setdefault(key, material)
+        self.by_material.setdefault(key, []).append(row)
+        self.by_file.setdefault(normal, row)
+        self.by_file.setdefault(suffix, row)
+        return row
+
+    def materials(self):
+        """Distinct materials, sorted, as written in the BOM."""
+        return sorted((name for key, name in self._materials.items() if key), key=str.lower)
+
+    def rows_for(self, material):
+        return self.by_material.get(material.lower(), [])
+
+    def find(self, file_name):
+        """The BOM row for a DWG (path or file name), or None."""
+        return self.by_file.get(os.path.basename(file_name).lower())
+
+    def select(self, paths, material=None):
+        """The paths that are on the BOM (and of material, if given), in their original order."""
+        wanted = material.lower() if material else None
+        selected = []
+        for path in paths:
+            row = self.by_file.get(os.path.basename(path).lower())
+            if row is not None and (wanted is None or row.material.lower() == wanted):
+                selected.append(path)
+        return selected
+
+    def counts(self):
+        """material -> (parts, total quantity)."""
+        return {self._materials[key]: (len(rows), sum(row.quantity for row in rows))
+                for key, rows in self.by_material.items()}
+
+
+def load_bom(path, mapping=None):
+    """Read a BOM file into an indexed Bom.
+
+    Args:
+        mapping: Column numbers and naming overrides (see DEFAULT_MAPPING)
+    """
+    bom = Bom(mapping)
+    m = bom.mapping
+    name_col, qty_col, material_col = m["name_column"] - 1, m["quantity_column"] - 1, m["material_column"] - 1
+    hand_col = (m.get("handedness_column") or 0) - 1
+    if min(name_col, qty_col, material_col) < 0:
+        raise BomError("Column numbers start at 1")
+    skip = m.get("header_rows") or 0
+
+    start = time.perf_counter()
+    for line, row in enumerate(read_rows(path, (name_col, qty_col, material_col, hand_col)), 1):
+        if line <= skip or name_col >= len(row):
+            continue
+        part = row[name_col].strip()
+        if not part:
+            continue
+        bom.add(part, _cell(row, material_col), _quantity(_cell(row, qty_col)), _cell(row, hand_col), line)
+
+    print("[BOM] {} parts, {} materials from {} in {:.2f}s".format(
+        len(bom.rows), len(bom.by_material), os.path.basename(path), time.perf_counter() - start))
+    for part, first, other in bom.conflicts[:5]:
+        print("[BOM] {} is listed as both '{}' and '{}'".format(part, first, other))
+    return bom
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarise a SolidWorks BOM by material")
+    parser.add_argument("bom")
+    parser.add_argument("--material", help="List the parts of one material")
+    parser.add_argument("--mapping", type=json.loads, default=None,
+                        help='Column overrides as JSON, e.g. \'{"material_column": 5}\'')
+    args = parser.parse_args()
+
+    try:
+        bom = load_bom(args.bom, args.mapping)
+    except (BomError, IOError) as e:
+        print("[BOM] {}".format(e))
+        return 1
+    if args.material:
+        for row in bom.rows_for(args.material):
+            print("{:<40} {:>5}  {}".format(row.file_names(bom.mapping)[0], row.quantity, row.handedness))
+        return 0
+    for material, (parts, quantity) in sorted(bom.counts().items(), key=lambda item: item[0].lower()):
+        print("{:<30} {:>6} parts {:>7} pcs".format(material or "(no material)", parts, quantity))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
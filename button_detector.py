@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+"""
+Button Detector
+Finds button templates on screen. Templates are decoded once and kept in
+memory, each lookup takes one screenshot, and the area around a button's last
+position is searched before falling back to the whole screen.
+"""
+
+import os
+
+import cv2
+import numpy as np
+
+from template_matcher import DEFAULT_SCALES, MultiTemplateMatcher
+
+# Pixels around the last hit searched before the full screen
+SEARCH_MARGIN = 150
+
+
+class Template:
+    """A decoded button image, in colour and grayscale."""
+
+    def __init__(self, path):
+        self.path = path
+        self.mtime = os.path.getmtime(path)
+        # imdecode instead of imread so non-ASCII Windows paths work
+        bgr = cv2.imdecode(np.fromfile(path, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if bgr is None:
+            raise IOError("Could not decode {}".format(path))
+        self.rgb = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+        self.gray = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
+        self.height, self.width = self.gray.shape
+
+
+class ButtonDetector:
+    """Finds buttons on screen with multiple strategies."""
+
+    # Minimum match score for each strategy, best first
+    STRATEGIES = [
+        ("High confidence", 0.8),
+        ("Medium confidence", 0.6),
+        ("Low confidence", 0.5),
+    ]
+    GRAYSCALE_CONFIDENCE = 0.6
+
+    def __init__(self, grab=None, margin=SEARCH_MARGIN, scales=DEFAULT_SCALES):
+        """
+        Args:
+            grab: Callable(region) -> RGB numpy frame, normally CaptureHub.grab
+        """
+        if grab is None:
+            from capture import CaptureHub
+            grab = CaptureHub().grab
+        self._grab = grab
+        self.margin = margin
+        self.scales = tuple(scales)
+        self._templates = {}
+        self._last_hits = {}
+        self._found_scales = {}
+        self._matchers = {}
+
+    def template(self, image_path):
+        """Cached template for image_path, reloaded only if the file changed."""
+        cached = self._templates.get(image_path)
+        if cached is not None and cached.mtime == os.path.getmtime(image_path):
+            return cached
+        cached = Template(image_path)
+        self._templates[image_path] = cached
+        return cached
+
+    def matcher(self, images, scales=None):
+        """Cached MultiTemplateMatcher for a dict of name -> image path (at self.scales unless given)."""
+        scales = tuple(scales or self.scales)
+        key = (tuple(sorted((name, path, self.template(path).mtime) for name, path in images.items())), scales)
+        matcher = self._matchers.get(key)
+        if matcher is None:
+            matcher = MultiTemplateMatcher(
+                {name: self.template(path).gray for name, path in images.items()}, scales)
+            self._matchers[key] = matcher
+        return matcher
+
+    def detect_all(self, images, region=None, scales=None):
+        """Best match of every template in a single capture.
+
+        Args:
+            images: dict of name -> image path (missing files are left out)
+            region: Optional (left, top, right, bottom) to restrict the search to
+            scales: Template scales to try (default self.scales)
+
+        Returns:
+            dict of name -> template_matcher.Match in screen coordinates
+        """
+        images = {name: path for name, path in images.items() if path and os.path.exists(path)}
+        if not images:
+            return {}
+
+        matches = self.matcher(images, scales).match_all(self._grab(region))
+        if region:
+            for match in matches.values():
+                match.x += region[0]
+                match.y += region[1]
+        return matches
+
+    def _search_region(self, image_path, template):
+        """Region around the last hit for this template, or None."""
+        hit = self._last_hits.get(image_path)
+        if hit is None:
+            return None
+        x, y = hit
+        return (
+            max(0, x - self.margin),
+            max(0, y - self.margin),
+            x + template.width + self.margin,
+            y + template.height + self.margin,
+        )
+
+    @staticmethod
+    def _best_match(frame, needle):
+        """(score, (x, y)) of the best match of needle in frame."""
+        if frame.shape[0] < needle.shape[0] or frame.shape[1] < needle.shape[1]:
+            return -1.0, None
+        result = cv2.matchTemplate(frame, needle, cv2.TM_CCOEFF_NORMED)
+        _, score, _, location = cv2.minMaxLoc(result)
+        return score, location
+
+    def _match(self, frame, template, min_confidence):
+        """Match a template in a frame: colour first, then grayscale.
+
+        Returns (score, (x, y), strategy name) or (score, None, None).
+        """
+        score, location = self._best_match(frame, template.rgb)
+        for name, confidence in self.STRATEGIES:
+            if confidence < min_confidence:
+                break
+            if score >= confidence:
+                return score, location, name
+
+        if min_confidence <= self.GRAYSCALE_CONFIDENCE:
+            gray = cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)
+            gray_score, gray_location = self._best_match(gray, template.gray)
+            if gray_score >= self.GRAYSCALE_CONFIDENCE:
+                return gray_score, gray_location, "Grayscale match"
+
+        return score, None, None
+
+    def locate(self, image_path, region=None, min_confidence=0.5):
+        """Find a template on screen.
+
+        Args:
+            image_path: Template PNG
+            region: Optional (left, top, right, bottom) to restrict the search to
+            min_confidence: Lowest strategy score accepted
+
+        Returns:
+            ((left, top, width, height), strategy) or (None, None)
+        """
+        template = self.template(image_path)
+
+        roi = None if region else self._search_region(image_path, template)
+        frame = None
+        for area in ([roi] if roi else []) + [region]:
+            frame = self._grab(area)
+            score, location, strategy = self._match(frame, template, min_confidence)
+            if location is not None:
+                offset_x, offset_y = (area[0], area[1]) if area else (0, 0)
+                x, y = location[0] + offset_x, location[1] + offset_y
+                self._last_hits[image_path] = (x, y)
+                return (x, y, template.width, template.height), strategy
+
+        # Last resort: the same capture at other scales, in case display scaling
+        # changed since the PNG was captured
+        if len(self.scales) > 1:
+            match = self.matcher({"button": image_path}).match_all(frame)["button"]
+            if match.score >= max(min_confidence, self.GRAYSCALE_CONFIDENCE):
+                offset_x, offset_y = (region[0], region[1]) if region else (0, 0)
+                x, y = match.x + offset_x, match.y + offset_y
+                self._last_hits[image_path] = (x, y)
+                self._found_scales[image_path] = match.scale
+                return (x, y, match.width, match.height), "Scaled match (x{})".format(match.scale)
+
+        return None, None
+
+    def visible(self, image_path, region=None, min_confidence=0.8):
+        """Whether a template is on screen now - the cheap check for polling a dialog.
+
+        One capture and one match: inside region, else around where the template
+        was last seen, else the whole screen; only at the scale it was last found
+        at. Unlike locate() there is no fallback to other areas or scales, so a
+        poll stays well inside a dialog's appear timeout.
+        """
+        area = region or self._search_region(image_path, self.template(image_path))
+        scale = self._found_scales.get(image_path, 1.0)
+        match = self.detect_all({"guard": image_path}, area, scales=(scale,)).get("guard")
+        if match is None or match.score < min_confidence:
+            return False
+        self._last_hits[image_path] = (match.x, match.y)
+        return True
+
+    def forget(self):
+        """Drop the remembered positions, e.g. before a batch in case windows moved."""
+        self._last_hits.clear()
+
+    def find_button(self, image_path, fallback_coords=None):
+        """Find a button on screen using image detection."""
+        if not image_path or not os.path.exists(image_path):
+            if fallback_coords:
+                return tuple(fallback_coords), "Saved coordinates (no image)"
+            return None, "Not found (no image file)"
+
+        try:
+            box, strategy = self.locate(image_path)
+        except (IOError, cv2.error) as e:
+            print("[DETECT] {}: {}".format(image_path, e))
+            box, strategy = None, None
+
+        if box:
+            left, top, width, height = box
+            return (left + width // 2, top + height // 2), strategy
+
+        if fallback_coords:
+            return tuple(fallback_coords), "Saved coordinates"
+
+        return None, "Not found"
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+Screen Capture Hub
+One place every detector and wait condition grabs the screen through. Only
+the requested region is captured, into a numpy buffer that is reused for the
+next grab of the same region, and a region can be asked whether it changed
+since it was last looked at.
+
+Uses mss when it is installed (pip install mss), PIL ImageGrab otherwise.
+"""
+
+import threading
+
+import cv2
+import numpy as np
+from PIL import ImageGrab
+
+# Size regions are shrunk to for change detection
+FINGERPRINT_SIZE = (96, 54)
+
+
+class _PilBackend:
+    """PIL ImageGrab - always available, slower on large regions."""
+
+    name = "pil"
+
+    def grab(self, region, out):
+        image = ImageGrab.grab(bbox=region)
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        frame = np.asarray(image)
+        if out is None or out.shape != frame.shape:
+            return frame.copy()
+        np.copyto(out, frame)
+        return out
+
+    def screen_size(self):
+        return ImageGrab.grab().size
+
+
+class _MssBackend:
+    """mss - grabs straight from the OS into a raw buffer, one instance per thread."""
+
+    name = "mss"
+
+    def __init__(self):
+        import mss
+
+        self._mss = mss
+        self._local = threading.local()
+
+    @property
+    def _sct(self):
+        sct = getattr(self._local, "sct", None)
+        if sct is None:
+            sct = self._local.sct = self._mss.mss()
+        return sct
+
+    def grab(self, region, out):
+        if region is None:
+            monitor = self._sct.monitors[1]
+        else:
+            left, top, right, bottom = region
+            monitor = {"left": left, "top": top, "width": right - left, "height": bottom - top}
+        shot = self._sct.grab(monitor)
+        bgra = np.frombuffer(shot.raw, dtype=np.uint8).reshape(shot.height, shot.width, 4)
+        if out is None or out.shape != (shot.height, shot.width, 3):
+            out = np.empty((shot.height, shot.width, 3), dtype=np.uint8)
+        cv2.cvtColor(bgra, cv2.COLOR_BGRA2RGB, dst=out)
+        return out
+
+    def screen_size(self):
+        monitor = self._sct.monitors[1]
+        return monitor["width"], monitor["height"]
+
+
+def open_backend(name="auto"):
+    """Capture backend by name: auto, mss or pil."""
+    if name in ("auto", "mss"):
+        try:
+            return _MssBackend()
+        except ImportError:
+            if name == "mss":
+                print("[CAPTURE] mss not available - install it: pip install mss")
+    return _PilBackend()
+
+
+class CaptureHub:
+    """Shared screen capture with reusable buffers and fingerprints for change detection.
+
+    Frames returned by grab() are reused for the next grab of the same region
+    on the same thread - copy them if they need to outlive that.
+    """
+
+    def __init__(self, backend="auto"):
+        self.backend = open_backend(backend) if isinstance(backend, str) else backend
+        self._local = threading.local()
+        print("[CAPTURE] Using {} backend".format(self.backend.name))
+
+    @property
+    def _buffers(self):
+        buffers = getattr(self._local, "buffers", None)
+        if buffers is None:
+            buffers = self._local.buffers = {}
+        return buffers
+
+    def grab(self, region=None):
+        """Capture a region (left, top, right, bottom), or the whole screen, as RGB."""
+        key = tuple(region) if region else None
+        frame = self.backend.grab(key, self._buffers.get(key))
+        self._buffers[key] = frame
+        return frame
+
+    def screen_size(self):
+        """(width, height) of the primary screen."""
+        return self.backend.screen_size()
+
+    def fingerprint(self, region=None):
+        """Small grayscale thumbnail of a region used for change detection."""
+        small = cv2.resize(self.grab(region), FINGERPRINT_SIZE, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_RGB2GRAY)
+
+    @staticmethod
+    def difference(a, b):
+        """Mean absolute pixel difference between two fingerprints (0-255)."""
+        return float(cv2.absdiff(a, b).mean())
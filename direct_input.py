@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+"""
+Direct Input
+Low-latency mouse, keyboard and clipboard for the "direct" desktop backend.
+On Windows a click is one absolute-position SendInput event - no cursor travel,
+no sleeps - and the clipboard is set and read back in-process through the
+Win32 API instead of spawning clip.exe for every file. All DLL handles and
+function signatures are set up once when the backend is opened.
+
+StandInInput offers the same calls on Linux and macOS: it keeps the clipboard
+in-process, records the events that would have been sent and can forward them
+to another backend such as the simulated TruTops.
+"""
+
+import collections
+import ctypes
+import sys
+import time
+
+# Absolute mouse coordinates are normalised to 0..65535 across the virtual desktop
+ABSOLUTE_RANGE = 65535
+
+# Virtual-key codes for the key names workflows use (pyautogui spelling)
+VIRTUAL_KEYS = {
+    "enter": 0x0D, "return": 0x0D, "tab": 0x09, "esc": 0x1B, "escape": 0x1B,
+    "space": 0x20, "backspace": 0x08, "delete": 0x2E, "del": 0x2E, "insert": 0x2D,
+    "ctrl": 0x11, "ctrlleft": 0xA2, "ctrlright": 0xA3, "shift": 0x10, "shiftleft": 0xA0,
+    "shiftright": 0xA1, "alt": 0x12, "altleft": 0xA4, "altright": 0xA5, "win": 0x5B,
+    "left": 0x25, "up": 0x26, "right": 0x27, "down": 0x28,
+    "home": 0x24, "end": 0x23, "pageup": 0x21, "pagedown": 0x22,
+}
+VIRTUAL_KEYS.update(("f{}".format(n), 0x6F + n) for n in range(1, 13))
+VIRTUAL_KEYS.update((chr(c).lower(), c) for c in range(ord("A"), ord("Z") + 1))
+VIRTUAL_KEYS.update((chr(c), c) for c in range(ord("0"), ord("9") + 1))
+
+# Keys that need KEYEVENTF_EXTENDEDKEY
+EXTENDED_KEYS = {0x21, 0x22, 0x23, 0x24, 0x25, 0x26, 0x27, 0x28, 0x2D, 0x2E, 0xA3, 0xA5, 0x5B}
+
+
+class ClipboardError(RuntimeError):
+    """Raised when the clipboard cannot be set to the expected text."""
+
+
+def virtual_key(name):
+    """Virtual-key code for a key name, e.g. "enter" or "v"."""
+    try:
+        return VIRTUAL_KEYS[name.lower()]
+    except KeyError:
+        raise ValueError("Unknown key '{}'".format(name))
+
+
+def absolute(value, origin, extent):
+    """Screen pixel -> SendInput absolute coordinate."""
+    return int(round((value - origin) * ABSOLUTE_RANGE / max(extent - 1, 1)))
+
+
+class Win32Input:
+    """SendInput and the Win32 clipboard through ctypes."""
+
+    MOUSEEVENTF_MOVE = 0x0001
+    MOUSEEVENTF_LEFTDOWN = 0x0002
+    MOUSEEVENTF_LEFTUP = 0x0004
+    MOUSEEVENTF_VIRTUALDESK = 0x4000
+    MOUSEEVENTF_ABSOLUTE = 0x8000
+    KEYEVENTF_EXTENDEDKEY = 0x0001
+    KEYEVENTF_KEYUP = 0x0002
+    INPUT_MOUSE = 0
+    INPUT_KEYBOARD = 1
+    CF_UNICODETEXT = 13
+    GMEM_MOVEABLE = 0x0002
+    HWND_MESSAGE = -3
+
+    def __init__(self, open_attempts=20):
+        """
+        Args:
+            open_attempts: Tries (10 ms apart) while another program holds the clipboard
+        """
+        from ctypes import wintypes
+
+        class MOUSEINPUT(ctypes.Structure):
+            _fields_ = [("dx", wintypes.LONG), ("dy", wintypes.LONG), ("mouseData", wintypes.DWORD),
+                        ("dwFlags", wintypes.DWORD), ("time", wintypes.DWORD),
+                        ("dwExtraInfo", ctypes.c_size_t)]
+
+        class KEYBDINPUT(ctypes.Structure):
+            _fields_ = [("wVk", wintypes.WORD), ("wScan", wintypes.WORD), ("dwFlags", wintypes.DWORD),
+                        ("time", wintypes.DWORD), ("dwExtraInfo", ctypes.c_size_t)]
+
+        class _UNION(ctypes.Union):
+            _fields_ = [("mi", MOUSEINPUT), ("ki", KEYBDINPUT)]
+
+        class INPUT(ctypes.Structure):
+            _anonymous_ = ("u",)
+            _fields_ = [("type", wintypes.DWORD), ("u", _UNION)]
+
+        self._INPUT = INPUT
+        self.open_attempts = open_attempts
+        self._window = None
+
+        user32 = ctypes.WinDLL("user32", use_last_error=True)
+        kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        user32.SendInput.argtypes = [wintypes.UINT, ctypes.c_void_p, ctypes.c_int]
+        user32.SendInput.restype = wintypes.UINT
+        user32.CreateWindowExW.argtypes = [wintypes.DWORD, wintypes.LPCWSTR, wintypes.LPCWSTR, wintypes.DWORD,
+                                           ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_int,
+                                           wintypes.HWND, wintypes.HMENU, wintypes.HINSTANCE, wintypes.LPVOID]
+        user32.CreateWindowExW.restype = wintypes.HWND
+        user32.IsWindow.argtypes = [wintypes.HWND]
+        user32.IsWindow.restype = wintypes.BOOL
+        user32.OpenClipboard.argtypes = [wintypes.HWND]
+        user32.OpenClipboard.restype = wintypes.BOOL
+        user32.SetClipboardData.argtypes = [wintypes.UINT, wintypes.HANDLE]
+        user32.SetClipboardData.restype = wintypes.HANDLE
+        user32.GetClipboardData.argtypes = [wintypes.UINT]
+        user32.GetClipboardData.restype = wintypes.HANDLE
+        kernel32.GlobalAlloc.argtypes = [wintypes.UINT, ctypes.c_size_t]
+        kernel32.GlobalAlloc.restype = wintypes.HGLOBAL
+        kernel32.GlobalLock.argtypes = [wintypes.HGLOBAL]
+        kernel32.GlobalLock.restype = ctypes.c_void_p
+        kernel32.GlobalUnlock.argtypes = [wintypes.HGLOBAL]
+        kernel32.GlobalFree.argtypes = [wintypes.HGLOBAL]
+        self._user32 = user32
+        self._kernel32 = kernel32
+
+        # Physical pixels, the same coordinates screen captures use
+        try:
+            user32.SetProcessDPIAware()
+        except AttributeError:
+            pass
+        self.desktop = tuple(user32.GetSystemMetrics(metric) for metric in (76, 77, 78, 79))
+
+    def _send(self, inputs):
+        array = (self._INPUT * len(inputs))(*inputs)
+        sent = self._user32.SendInput(len(inputs), array, ctypes.sizeof(self._INPUT))
+        if sent != len(inputs):
+            raise ctypes.WinError(ctypes.get_last_error())
+
+    def click(self, x, y):
+        left, top, width, height = self.desktop
+        event = self._INPUT(type=self.INPUT_MOUSE)
+        event.mi.dx = absolute(x, left, width)
+        event.mi.dy = absolute(y, top, height)
+        event.mi.dwFlags = (self.MOUSEEVENTF_MOVE | self.MOUSEEVENTF_ABSOLUTE | self.MOUSEEVENTF_VIRTUALDESK
+                            | self.MOUSEEVENTF_LEFTDOWN | self.MOUSEEVENTF_LEFTUP)
+        self._send([event])
+
+    def _key(self, code, up):
+        event = self._INPUT(type=self.INPUT_KEYBOARD)
+        event.ki.wVk = code
+        event.ki.dwFlags = ((self.KEYEVENTF_KEYUP if up else 0)
+                            | (self.KEYEVENTF_EXTENDEDKEY if code in EXTENDED_KEYS else 0))
+        return event
+
+    def keys(self, names):
+        """Press names together (one key or a hotkey) in a single SendInput call."""
+        codes = [virtual_key(name) for name in names]
+        self._send([self._key(code, False) for code in codes] +
+                   [self._key(code, True) for code in reversed(codes)])
+
+    def _clipboard_owner(self):
+        """Hidden message-only window to own the clipboard.
+
+        OpenClipboard(NULL) followed by EmptyClipboard leaves the clipboard with
+        no owner and SetClipboardData then fails. A window dies with the thread
+        that made it, so a new one is made if the batch runs on a new thread.
+        """
+        if self._window is None or not self._user32.IsWindow(self._window):
+            self._window = self._user32.CreateWindowExW(0, "STATIC", None, 0, 0, 0, 0, 0,
+                                                        self.HWND_MESSAGE, None, None, None)
+            if not self._window:
+                raise ClipboardError("Could not create the clipboard window ({})".format(ctypes.get_last_error()))
+        return self._window
+
+    def _open_clipboard(self):
+        window = self._clipboard_owner()
+        for _ in range(self.open_attempts):
+            if self._user32.OpenClipboard(window):
+                return
+            time.sleep(0.01)  # Another program has it open
+        raise ClipboardError("Clipboard is in use by another program")
+
+    def set_clipboard(self, text):
+        data = (text + "\0").encode("utf-16-le")
+        self._open_clipboard()
+        try:
+            self._user32.EmptyClipboard()
+            handle = self._kernel32.GlobalAlloc(self.GMEM_MOVEABLE, len(data))
+            if not handle:
+                raise ClipboardError("Out of memory for the clipboard")
+            pointer = self._kernel32.GlobalLock(handle)
+            ctypes.memmove(pointer, data, len(data))
+            self._kernel32.GlobalUnlock(handle)
+            if not self._user32.SetClipboardData(self.CF_UNICODETEXT, handle):
+                self._kernel32.GlobalFree(handle)
+                raise ClipboardError("SetClipboardData failed ({})".format(ctypes.get_last_error()))
+        finally:
+            self._user32.CloseClipboard()
+
+    def get_clipboard(self):
+        self._open_clipboard()
+        try:
+            handle = self._user32.GetClipboardData(self.CF_UNICODETEXT)
+            if not handle:
+                return ""
+            pointer = self._kernel32.GlobalLock(handle)
+            try:
+                return ctypes.wstring_at(pointer)
+            finally:
+                self._kernel32.GlobalUnlock(handle)
+        finally:
+            self._user32.CloseClipboard()
+
+
+class StandInInput:
+    """Same calls as Win32Input for machines without it, kept in-process.
+
+    Events are recorded as they would be sent (absolute coordinates, key
+    codes) and, if a target backend is given, forwarded to it.
+    """
+
+    def __init__(self, target=None, size=(1920, 1080)):
+        self.target = target
+        self.screen = target.screen if target is not None else None
+        width, height = self.screen.screen_size() if self.screen is not None else size
+        self.desktop = (0, 0, width, height)
+        self.events = collections.deque(maxlen=1000)
+        self.clipboard = ""
+
+    def click(self, x, y):
+        left, top, width, height = self.desktop
+        self.events.append(("click", absolute(x, left, width), absolute(y, top, height)))
+        if self.target is not None:
+            self.target.click(x, y)
+
+    def keys(self, names):
+        self.events.append(("keys",) + tuple(virtual_key(name) for name in names))
+        if self.target is None:
+            return
+        if len(names) == 1:
+            self.target.press(names[0])
+        else:
+            self.target.hotkey(*names)
+
+    def set_clipboard(self, text):
+        self.clipboard = text
+        if self.target is not None:
+            self.target.set_clipboard(text)
+
+    def get_clipboard(self):
+        # Read back from the target when it has its own clipboard, like the real thing would
+        read = getattr(self.target, "get_clipboard", None)
+        return read() if read is not None else self.clipboard
+
+    def focus(self, title):
+        return self.target.focus(title) if self.target is not None else True
+
+
+def open_native(target=None):
+    """Win32Input on Windows, otherwise a StandInInput (forwarding to target if given)."""
+    if sys.platform == "win32" and target is None:
+        return Win32Input()
+    return StandInInput(target)
@@ -0,0 +1,534 @@
+# -*- coding: utf-8 -*-
+"""
+Multi-Station Dispatcher
+Spreads one batch of DWGs over every PC with a TruTops licence. A coordinator
+holds the queue and hands each file out on a lease; a worker agent on each PC
+pulls a file, runs the normal workflow on it and reports back over HTTP. A
+worker that stops renewing its lease (crashed, unplugged) has its file put
+back in the queue for another station.
+
+The DWG paths are sent as-is, so the laser folder must be a share every
+station sees under the same path (e.g. \\\\server\\laser).
+
+The coordinator speaks plain HTTP. Bind it to the shop network's address with
+--host; every request must carry the shared token (printed by serve, or set
+with --token or TRUTOPS_DISPATCH_TOKEN), since without one anyone on the
+network could /add files for the stations to open. The token travels in the
+clear, so keep the port off the internet.
+
+    python dispatch.py serve \\\\server\\laser --host 192.168.1.10 --port 8765
+    python dispatch.py work http://192.168.1.10:8765 --token <token>
+    python dispatch.py demo --files 60 --workers 1 2 3
+"""
+
+import argparse
+import collections
+import hmac
+import json
+import os
+import random
+import secrets
+import socket
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from journal import FAILED, QUEUED, STARTED, SUCCEEDED, JobJournal, replay
+
+DISPATCH_JOURNAL = "dispatch_journal.jsonl"
+WORKER_JOURNAL = "worker_journal.jsonl"  # A station's own batch journal, apart from the app's
+DEFAULT_PORT = 8765
+TOKEN_HEADER = "X-Dispatch-Token"
+TOKEN_ENV = "TRUTOPS_DISPATCH_TOKEN"
+COMPLETE_ATTEMPTS = 5  # Tries to report a result before the lease is left to expire
+
+
+class Job:
+    """One DWG and who, if anyone, holds it."""
+
+    def __init__(self, job_id, path):
+        self.id = job_id
+        self.path = path
+        self.state = QUEUED
+        self.worker = None
+        self.expires = 0.0
+        self.attempts = 0
+        self.reason = None
+        self.elapsed = None
+
+
+class Coordinator:
+    """Queue of DWGs handed out to workers on renewable leases."""
+
+    def __init__(self, files=(), lease_time=120.0, max_attempts=3, journal=None):
+        """
+        Args:
+            lease_time: Seconds a worker may go without renewing before its file is requeued
+            max_attempts: Leases a file gets before it is marked failed
+            journal: Optional JobJournal the batch progress is logged to
+        """
+        self.lease_time = lease_time
+        self.max_attempts = max_attempts
+        self.journal = journal
+        self.jobs = {}
+        self._queue = collections.deque()
+        self._lock = threading.Lock()
+        self.workers = {}
+        self.started = time.monotonic()
+        self.add(files)
+
+    def add(self, files):
+        """Queue more DWGs."""
+        with self._lock:
+            for path in files:
+                job = Job(len(self.jobs) + 1, path)
+                self.jobs[job.id] = job
+                self._queue.append(job.id)
+                self._mark(job, QUEUED)
+
+    def _mark(self, job, state, reason=None):
+        job.state = state
+        if self.journal is not None:
+            self.journal.mark(job.path, state, reason)
+
+    def _requeue_expired(self, now):
+        """Put files whose lease ran out back at the front of the queue."""
+        for job in self.jobs.values():
+            if job.state != STARTED or job.expires > now:
+                continue
+            print("[DISPATCH] Lease on {} expired ({})".format(os.path.basename(job.path), job.worker))
+            job.worker = None
+            if job.attempts >= self.max_attempts:
+                job.reason = "lease expired {} times".format(job.attempts)
+                self._mark(job, FAILED, job.reason)
+            else:
+                self._mark(job, QUEUED, "lease expired")
+                self._queue.appendleft(job.id)
+
+    def lease(self, worker):
+        """Next file for a worker, or None if nothing is queued."""
+        now = time.monotonic()
+        with self._lock:
+            self.workers.setdefault(worker, {"done": 0, "failed": 0})["seen"] = now
+            self._requeue_expired(now)
+            if not self._queue:
+                return None
+            job = self.jobs[self._queue.popleft()]
+            job.worker = worker
+            job.expires = now + self.lease_time
+            job.attempts += 1
+            self._mark(job, STARTED)
+            return {"job": job.id, "file": job.path, "lease_time": self.lease_time}
+
+    def renew(self, job_id, worker):
+        """Extend a lease. False if the worker no longer holds it."""
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.state != STARTED or job.worker != worker:
+                return False
+            job.expires = time.monotonic() + self.lease_time
+            return True
+
+    def complete(self, job_id, worker, ok, reason=None, elapsed=None):
+        """Record a worker's result. Results for a lease that was lost are ignored."""
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.state != STARTED or job.worker != worker:
+                return False
+            job.worker = None
+            job.elapsed = elapsed
+            stats = self.workers.setdefault(worker, {"done": 0, "failed": 0})
+            if ok:
+                stats["done"] += 1
+                self._mark(job, SUCCEEDED)
+            elif job.attempts < self.max_attempts:
+                job.reason = reason
+                self._mark(job, QUEUED, reason)
+                self._queue.append(job.id)
+            else:
+                stats["failed"] += 1
+                job.reason = reason
+                self._mark(job, FAILED, reason)
+            return True
+
+    def status(self):
+        """Counts per state, per-worker totals and whether the batch is finished."""
+        with self._lock:
+            self._requeue_expired(time.monotonic())
+            counts = collections.Counter(job.state for job in self.jobs.values())
+            return {
+                "counts": dict(counts),
+                "workers": {name: {"done": s["done"], "failed": s["failed"]} for name, s in self.workers.items()},
+                "finished": counts[QUEUED] == 0 and counts[STARTED] == 0,
+                "elapsed": round(time.monotonic() - self.started, 3),
+            }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """JSON over HTTP: POST /lease, /renew, /complete, /add and GET /status."""
+
+    coordinator = None
+    token = None
+
+    def _allowed(self):
+        """Whether the request carries the shared token (always, if none is set)."""
+        if self.token is None:
+            return True
+        if hmac.compare_digest((self.headers.get(TOKEN_HEADER) or "").encode('utf-8'), self.token.encode('utf-8')):
+            return True
+        self._reply(403, {"error": "missing or wrong token"})
+        return False
+
+    def _reply(self, code, payload=None):
+        body = json.dumps(payload).encode('utf-8') if payload is not None else b""
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if not self._allowed():
+            return
+        if self.path == "/status":
+            self._reply(200, self.coordinator.status())
+        else:
+            self._reply(404, {"error": "unknown path"})
+
+    def do_POST(self):
+        if not self._allowed():
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._reply(400, {"error": "invalid JSON"})
+            return
+
+        coordinator = self.coordinator
+        if self.path == "/lease":
+            job = coordinator.lease(request.get("worker", "?"))
+            if job:
+                self._reply(200, job)
+            else:
+                self._reply(204)
+        elif self.path == "/renew":
+            self._reply(200, {"ok": coordinator.renew(request.get("job"), request.get("worker"))})
+        elif self.path == "/complete":
+            accepted = coordinator.complete(request.get("job"), request.get("worker"), bool(request.get("ok")),
+                                            request.get("reason"), request.get("elapsed"))
+            self._reply(200, {"ok": accepted})
+        elif self.path == "/add":
+            coordinator.add(request.get("files") or [])
+            self._reply(200, {"ok": True})
+        else:
+            self._reply(404, {"error": "unknown path"})
+
+    def log_message(self, format, *args):
+        pass  # One line per request would drown out the progress output
+
+
+def serve(coordinator, host="127.0.0.1", port=DEFAULT_PORT, token=None):
+    """Start the coordinator's HTTP server on a background thread.
+
+    Args:
+        host: Address to listen on; the default only takes this PC's own workers
+        token: Shared secret every request must carry (None = no check, for local use only)
+    """
+    handler = type("Handler", (_Handler,), {"coordinator": coordinator, "token": token})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class WorkerAgent:
+    """Pulls files from a coordinator and processes them one at a time."""
+
+    def __init__(self, url, process, name=None, idle_poll=1.0, token=None):
+        """
+        Args:
+            url: Coordinator address, e.g. http://server:8765
+            process: Callable(file_path) -> (ok, reason) doing the conversion
+            name: Worker name shown by the coordinator (default: host name)
+            token: The coordinator's shared token
+        """
+        self.url = url.rstrip("/")
+        self.process = process
+        self.name = name or socket.gethostname()
+        self.idle_poll = idle_poll
+        self.token = token
+        self.running = True
+
+    def _headers(self):
+        headers = {"Content-Type": "application/json"}
+        if self.token:
+            headers[TOKEN_HEADER] = self.token
+        return headers
+
+    def _post(self, path, payload):
+        data = json.dumps(payload).encode('utf-8')
+        request = urllib.request.Request(self.url + path, data=data, headers=self._headers())
+        with urllib.request.urlopen(request, timeout=10) as response:
+            body = response.read()
+        return json.loads(body) if body else None
+
+    def _status(self):
+        request = urllib.request.Request(self.url + "/status", headers=self._headers())
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return json.loads(response.read())
+
+    def _heartbeat(self, job, done):
+        """Renew the lease until the file is finished."""
+        interval = max(0.05, job["lease_time"] / 3.0)
+        while not done.wait(interval):
+            try:
+                if not self._post("/renew", {"job": job["job"], "worker": self.name})["ok"]:
+                    print("[WORKER] Lost the lease on {}".format(os.path.basename(job["file"])))
+                    return
+            except (urllib.error.URLError, OSError) as e:
+                print("[WORKER] Renew failed: {}".format(e))
+
+    def run(self, until_finished=True):
+        """Process files until the batch is finished (or forever)."""
+        print("[WORKER] {} pulling from {}".format(self.name, self.url))
+        while self.running:
+            try:
+                job = self._post("/lease", {"worker": self.name})
+            except (urllib.error.URLError, OSError) as e:
+                print("[WORKER] Coordinator unreachable: {}".format(e))
+                time.sleep(self.idle_poll)
+                continue
+
+            if job is None:
+                try:
+                    if until_finished and self._status()["finished"]:
+                        return
+                except (urllib.error.URLError, OSError) as e:
+                    print("[WORKER] Coordinator unreachable: {}".format(e))
+                time.sleep(self.idle_poll)
+                continue
+
+            done = threading.Event()
+            threading.Thread(target=self._heartbeat, args=(job, done), daemon=True).start()
+            start = time.perf_counter()
+            try:
+                try:
+                    ok, reason = self.process(job["file"])
+                except Exception as e:
+                    ok, reason = False, str(e)
+                elapsed = round(time.perf_counter() - start, 3)
+
+                print("[WORKER] {} {} in {:.2f}s".format(
+                    os.path.basename(job["file"]), "done" if ok else "FAILED ({})".format(reason), elapsed))
+                # The lease is still renewed while reporting, so a retry doesn't find the file handed out again
+                self._complete({"job": job["job"], "worker": self.name, "ok": ok,
+                                "reason": reason, "elapsed": elapsed})
+            finally:
+                done.set()
+
+    def _complete(self, payload):
+        """Report a result, retrying with a growing pause. Returns False if it never got through.
+
+        An unreported file is not lost: its lease runs out and the coordinator
+        hands it out again.
+        """
+        for attempt in range(COMPLETE_ATTEMPTS):
+            if attempt:
+                time.sleep(min(self.idle_poll * 2 ** attempt, 30.0))
+            try:
+                self._post("/complete", payload)
+                return True
+            except (urllib.error.URLError, OSError) as e:
+                print("[WORKER] Reporting {} failed ({}/{}): {}".format(
+                    payload["job"], attempt + 1, COMPLETE_ATTEMPTS, e))
+        return False
+
+
+def desktop_process(config=None, desktop=None, journal_path=WORKER_JOURNAL):
+    """process(file_path) that converts a file on this PC the way the app does.
+
+    Each leased file runs as a batch of one through batch.BatchRunner, so it
+    gets the same preflight, per-file recovery (reset keys, TruTops refocused,
+    retries), GEO check and hang watchdog as a batch started from the app.
+    Uses this folder's config.json, so run the worker from the app folder
+    after setting up locations there.
+
+    Args:
+        config: Settings to use instead of config.json
+        desktop: Backend to drive instead of the configured input backend
+    """
+    # Imported here: these need a desktop session and the GUI dependencies
+    from backends import open_desktop
+    from batch import BatchRunner
+    from capture import CaptureHub
+    from file_queue import EventQueue
+    from settings import Config
+
+    config = config or Config()
+    desktop = desktop or open_desktop(config.get("input", "backend") or "direct", config)
+    events = EventQueue()
+    runner = BatchRunner(config, desktop, CaptureHub(desktop.screen), events, journal=JobJournal(journal_path))
+
+    def process(file_path):
+        runner.prepare([file_path])
+        outcome = runner.run()
+        status = events.drain()[0].get(0)
+        if status == "done":
+            return True, None
+        reason = replay(journal_path).details.get(file_path)
+        return False, reason or status or outcome
+
+    return process
+
+
+def simulated_process(mean=0.05, jitter=0.3, fail_rate=0.0, seed=None):
+    """process(file_path) that just takes a while, for testing without TruTops.
+
+    Args:
+        mean: Average seconds per file
+        jitter: Spread as a fraction of the mean
+        fail_rate: Fraction of files reported as failed
+    """
+    rng = random.Random(seed)
+    lock = threading.Lock()
+
+    def process(file_path):
+        with lock:
+            duration = max(0.0, rng.gauss(mean, mean * jitter))
+            failed = rng.random() < fail_rate
+        time.sleep(duration)
+        return (False, "simulated failure") if failed else (True, None)
+
+    return process
+
+
+def _crashing_process(process, after):
+    """Wrap process so the worker thread dies silently mid-file after some files."""
+    count = [0]
+
+    def crashing(file_path):
+        count[0] += 1
+        if count[0] > after:
+            raise SystemExit  # Escapes WorkerAgent.run like a killed process would
+        return process(file_path)
+
+    return crashing
+
+
+def run_demo(files=60, workers=(1, 2, 3), mean=0.05, lease_time=0.5):
+    """Same simulated batch with 1..N workers on this machine, plus a crash run."""
+    results = []
+    names = ["demo_{:04d}.dwg".format(i) for i in range(files)]
+    for count in workers:
+        coordinator = Coordinator(names, lease_time=lease_time)
+        server = serve(coordinator, "127.0.0.1", 0)
+        url = "http://127.0.0.1:{}".format(server.server_address[1])
+        agents = [WorkerAgent(url, simulated_process(mean, seed=n), "sim-{}".format(n), idle_poll=0.05)
+                  for n in range(count)]
+        start = time.perf_counter()
+        threads = [threading.Thread(target=agent.run) for agent in agents]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        server.shutdown()
+        status = coordinator.status()
+        results.append({
+            "workers": count,
+            "files": files,
+            "seconds": round(elapsed, 2),
+            "files_per_hour": round(files / elapsed * 3600),
+            "counts": status["counts"],
+        })
+
+    # One station dies after a few files; its leased file must be redone elsewhere
+    coordinator = Coordinator(names, lease_time=lease_time)
+    server = serve(coordinator, "127.0.0.1", 0)
+    url = "http://127.0.0.1:{}".format(server.server_address[1])
+    agents = [WorkerAgent(url, _crashing_process(simulated_process(mean, seed=0), 3), "sim-crash", idle_poll=0.05),
+              WorkerAgent(url, simulated_process(mean, seed=1), "sim-1", idle_poll=0.05)]
+    threads = [threading.Thread(target=agent.run, daemon=True) for agent in agents]
+    for thread in threads:
+        thread.start()
+    threads[1].join()
+    server.shutdown()
+    results.append({"crash_test": coordinator.status()})
+
+    base = results[0]["files_per_hour"]
+    for result in results[:-1]:
+        result["scaling"] = round(result["files_per_hour"] / base, 2)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Spread a DWG batch over several TruTops stations")
+    sub = parser.add_subparsers(dest="command")
+
+    p = sub.add_parser("serve", help="Hold the queue for a folder of DWGs")
+    p.add_argument("folder")
+    p.add_argument("--host", default="0.0.0.0", help="Address to listen on, e.g. this PC's shop network address")
+    p.add_argument("--port", type=int, default=DEFAULT_PORT)
+    p.add_argument("--token", default=os.environ.get(TOKEN_ENV),
+                   help="Shared token workers must send (default: ${}, or a new random one)".format(TOKEN_ENV))
+    p.add_argument("--lease", type=float, default=120.0, help="Seconds before an unrenewed file is requeued")
+    p.add_argument("--resume", action="store_true", help="Only queue files the last dispatch left unfinished")
+
+    p = sub.add_parser("work", help="Convert files from a coordinator on this PC")
+    p.add_argument("url")
+    p.add_argument("--name")
+    p.add_argument("--token", default=os.environ.get(TOKEN_ENV), help="The coordinator's token")
+    p.add_argument("--simulate", action="store_true", help="Pretend to convert (no TruTops needed)")
+
+    p = sub.add_parser("demo", help="Simulated coordinator and workers on this machine")
+    p.add_argument("--files", type=int, default=60)
+    p.add_argument("--workers", type=int, nargs="+", default=[1, 2, 3])
+    p.add_argument("--mean", type=float, default=0.05, help="Simulated seconds per file")
+
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        journal = JobJournal(DISPATCH_JOURNAL)
+        if args.resume:
+            files = replay(DISPATCH_JOURNAL).unfinished()
+            journal.resume()
+        else:
+            files = sorted(os.path.join(args.folder, name) for name in os.listdir(args.folder)
+                           if name.lower().endswith(".dwg"))
+            journal.begin([])
+        coordinator = Coordinator(files, lease_time=args.lease, journal=journal)
+        token = args.token or secrets.token_urlsafe(16)
+        server = serve(coordinator, args.host, args.port, token)
+        print("[DISPATCH] {} files queued, listening on {}:{}".format(len(files), *server.server_address[:2]))
+        if not args.token:
+            print("[DISPATCH] Start workers with --token {}".format(token))
+        try:
+            while not coordinator.status()["finished"]:
+                time.sleep(2.0)
+                print("[DISPATCH] {}".format(coordinator.status()["counts"]))
+        except KeyboardInterrupt:
+            pass
+        server.shutdown()
+        journal.close()
+        print("[DISPATCH] {}".format(json.dumps(coordinator.status())))
+        return 0
+
+    if args.command == "work":
+        process = simulated_process() if args.simulate else desktop_process()
+        WorkerAgent(args.url, process, args.name, token=args.token).run(until_finished=False)
+        return 0
+
+    if args.command == "demo":
+        print(json.dumps(run_demo(args.files, args.workers, args.mean), indent=2))
+        return 0
+
+    parser.print_help()
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+File Queue
+The batch's file list as an indexed model, and the event queue the worker
+thread reports progress through. Adding, looking up and updating files costs
+the same for 10 files as for 10,000; the GUI drains the events at a fixed
+frame rate and only the newest state of each file is kept.
+"""
+
+import os
+import queue
+
+PENDING = "pending"
+
+
+def file_key(path):
+    """Identity of a file regardless of case, slashes and relative paths."""
+    return os.path.normcase(os.path.abspath(path))
+
+
+class FileQueue:
+    """Ordered file paths with an index for membership and a status per index."""
+
+    def __init__(self, paths=()):
+        self.paths = []
+        self.status = {}     # index -> status; files not in here are pending
+        self._index = {}     # file_key -> index
+        self.add(paths)
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __iter__(self):
+        return iter(self.paths)
+
+    def __getitem__(self, index):
+        return self.paths[index]
+
+    def __contains__(self, path):
+        return file_key(path) in self._index
+
+    def add(self, paths):
+        """Append files not already in the queue; returns their indices."""
+        added = []
+        for path in paths:
+            key = file_key(path)
+            if key in self._index:
+                continue
+            self._index[key] = len(self.paths)
+            added.append(len(self.paths))
+            self.paths.append(os.path.normpath(path))
+        return added
+
+    def index_of(self, path):
+        """Index of a file, or None."""
+        return self._index.get(file_key(path))
+
+    def get_status(self, index):
+        return self.status.get(index, PENDING)
+
+    def set_status(self, index, status):
+        if status == PENDING:
+            self.status.pop(index, None)
+        else:
+            self.status[index] = status
+
+    def reset(self):
+        """Every file back to pending."""
+        self.status.clear()
+
+    def counts(self):
+        """Number of files per status."""
+        counts = {PENDING: len(self.paths) - len(self.status)}
+        for status in self.status.values():
+            counts[status] = counts.get(status, 0) + 1
+        return counts
+
+
+class EventQueue:
+    """Thread-safe progress events from the worker, coalesced when drained.
+
+    The worker posts ("file", index, status) and ("status", text),
+    ("progress", current, total), ("throughput", rate, eta) style events
+    without touching Tk; the GUI drains them once per frame.
+    """
+
+    def __init__(self):
+        self._queue = queue.SimpleQueue()
+
+    def post(self, kind, *args):
+        self._queue.put((kind, args))
+
+    def drain(self):
+        """Everything posted since the last drain.
+
+        Returns:
+            (files, latest): files maps index -> newest status, in the order
+            the files last changed; latest maps every other kind to its
+            newest arguments
+        """
+        files = {}
+        latest = {}
+        while True:
+            try:
+                kind, args = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "file":
+                index, status = args
+                files.pop(index, None)
+                files[index] = status
+            else:
+                latest[kind] = args
+        return files, latest
@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+"""
+GEO Validation
+Reads the .geo files TruTops writes and checks them before they reach the
+laser. The file is streamed line by line; only point coordinates are kept.
+
+The parts of the format used here:
+
+    #~31                    point section
+    P                       one record per point, records end with |~
+    <id>
+    <x> <y> <z>
+    |~
+    ##~~                    end of section
+    #~331                   element section
+    LIN | ARC | CIR         element type
+    <layer> <pen>           attributes; the layer tells cut from etch
+    <point ids...>          LIN: start end, ARC: centre start end [direction],
+    |~                      CIR: centre radius
+    ##~~
+    #~EOF                   end of file
+
+Other sections are skipped. Contours are worked out from the elements:
+elements sharing end points form one contour, which is closed when every
+point in it joins exactly two element ends (a circle is closed by itself).
+
+GeoValidator runs the checks on a background thread so the next DWG can be
+driven while the last .geo is read.
+
+The layout above has not been checked against a file from the shop's
+TruTops version yet, so validation is off unless geo.validate is set.
+"""
+
+import collections
+import math
+import os
+import queue
+import threading
+
+END_MARKERS = ("#~EOF", "#~END")
+ELEMENT_TYPES = ("LIN", "ARC", "CIR")
+ETCH_LAYERS = (2,)  # Element layers that are etched rather than cut
+
+
+class GeoReport:
+    """What a .geo contains and what is wrong with it."""
+
+    def __init__(self, path):
+        self.path = path
+        self.size = 0
+        self.points = 0
+        self.entities = collections.Counter()   # LIN / ARC / CIR -> count
+        self.cut = 0
+        self.etch = 0
+        self.contours = 0
+        self.closed = 0
+        self.open = 0
+        self.open_cut = 0
+        self.bbox = None                        # (min_x, min_y, max_x, max_y)
+        self.complete = False                   # End marker seen
+        self.errors = []
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    def summary(self):
+        if self.errors:
+            return "; ".join(self.errors)
+        width, height = self.bbox[2] - self.bbox[0], self.bbox[3] - self.bbox[1]
+        return "{} contours ({} open), {} cut / {} etch elements, {:.1f} x {:.1f}".format(
+            self.contours, self.open, self.cut, self.etch, width, height)
+
+    def as_dict(self):
+        return {
+            "path": self.path, "ok": self.ok, "errors": self.errors, "size": self.size,
+            "points": self.points, "entities": dict(self.entities), "cut": self.cut, "etch": self.etch,
+            "contours": self.contours, "closed": self.closed, "open": self.open, "bbox": self.bbox,
+        }
+
+
+def _records(lines):
+    """(section, [record lines]) for every record, in file order; yields (None, [marker]) at the end."""
+    section = None
+    record = []
+    for raw in lines:
+        line = raw.strip()
+        if not line:
+            continue
+        if line in END_MARKERS:
+            yield None, [line]
+            return
+        if line == "##~~":
+            section, record = None, []
+        elif line.startswith("#~"):
+            section, record = line[2:], []
+        elif line == "|~":
+            if record:
+                yield section, record
+            record = []
+        else:
+            record.append(line)
+
+
+def _arc_extent(center, start, end, ccw):
+    """Points bounding an arc: its ends plus any axis extremes it sweeps through."""
+    cx, cy = center
+    radius = math.hypot(start[0] - cx, start[1] - cy)
+    a0 = math.atan2(start[1] - cy, start[0] - cx)
+    a1 = math.atan2(end[1] - cy, end[0] - cx)
+    if not ccw:
+        a0, a1 = a1, a0
+    sweep = (a1 - a0) % (2 * math.pi) or 2 * math.pi
+    extent = [start, end]
+    for quarter in range(4):
+        angle = quarter * math.pi / 2
+        if (angle - a0) % (2 * math.pi) <= sweep:
+            extent.append((cx + radius * math.cos(angle), cy + radius * math.sin(angle)))
+    return extent
+
+
+def parse_geo(path, etch_layers=ETCH_LAYERS):
+    """Read a .geo and count what is in it. Returns a GeoReport (errors not yet checked)."""
+    report = GeoReport(path)
+    report.size = os.path.getsize(path)
+    points = {}
+    ends = collections.Counter()       # point id -> element ends meeting there
+    links = collections.defaultdict(set)
+    extent = []
+    circles = 0
+    cut_ids = set()
+
+    with open(path, 'r', encoding='latin-1') as f:
+        for section, record in _records(f):
+            if section is None:
+                report.complete = True
+                break
+            kind = record[0]
+            try:
+                if kind == "P" and len(record) >= 3:
+                    x, y = record[2].split()[:2]
+                    points[record[1]] = (float(x), float(y))
+                elif kind in ELEMENT_TYPES and len(record) >= 3:
+                    layer = int(record[1].split()[0])
+                    refs = record[2].split()
+                    report.entities[kind] += 1
+                    if layer in etch_layers:
+                        report.etch += 1
+                    else:
+                        report.cut += 1
+                    if kind == "CIR":
+                        cx, cy = points[refs[0]]
+                        r = float(refs[1])
+                        extent += [(cx - r, cy - r), (cx + r, cy + r)]
+                        circles += 1
+                        continue
+                    first, last = (refs[0], refs[1]) if kind == "LIN" else (refs[1], refs[2])
+                    if kind == "ARC":
+                        ccw = len(refs) < 4 or refs[3] != "-1"
+                        extent += _arc_extent(points[refs[0]], points[first], points[last], ccw)
+                    else:
+                        extent += [points[first], points[last]]
+                    ends[first] += 1
+                    ends[last] += 1
+                    links[first].add(last)
+                    links[last].add(first)
+                    if layer not in etch_layers:
+                        cut_ids.update((first, last))
+            except (KeyError, ValueError, IndexError):
+                report.errors.append("bad {} record near element {}".format(kind, sum(report.entities.values())))
+                break
+
+    report.points = len(points)
+    if extent:
+        xs, ys = [p[0] for p in extent], [p[1] for p in extent]
+        report.bbox = (min(xs), min(ys), max(xs), max(ys))
+
+    # Contours: connected groups of element end points
+    seen = set()
+    for start in links:
+        if start in seen:
+            continue
+        group, stack = [], [start]
+        seen.add(start)
+        while stack:
+            point = stack.pop()
+            group.append(point)
+            for other in links[point]:
+                if other not in seen:
+                    seen.add(other)
+                    stack.append(other)
+        report.contours += 1
+        if all(ends[point] == 2 for point in group):
+            report.closed += 1
+        else:
+            report.open += 1
+            if cut_ids.intersection(group):
+                report.open_cut += 1
+    report.contours += circles
+    report.closed += circles
+    return report
+
+
+def validate_geo(path, etch_layers=ETCH_LAYERS, allow_open_cuts=False):
+    """Parse a .geo and list what would make it unusable at the laser."""
+    if not os.path.exists(path):
+        report = GeoReport(path)
+        report.errors.append("missing")
+        return report
+    try:
+        report = parse_geo(path, etch_layers)
+    except OSError as e:
+        report = GeoReport(path)
+        report.errors.append("cannot read ({})".format(e.strerror or e))
+        return report
+    if report.size == 0:
+        report.errors.append("empty file")
+        return report
+    if not report.complete:
+        report.errors.append("truncated (no end marker)")
+    if not report.entities:
+        report.errors.append("no geometry")
+    elif not report.cut:
+        report.errors.append("nothing to cut")
+    if report.open_cut and not allow_open_cuts:
+        report.errors.append("{} open cut contour(s)".format(report.open_cut))
+    return report
+
+
+def format_geo(points, elements):
+    """GEO text for points {id: (x, y)} and elements [(type, layer, refs)] (simulator output)."""
+    lines = ["#~1", "1.03", "1", "##~~", "#~31"]
+    for point_id, (x, y) in points.items():
+        lines += ["P", str(point_id), "{:.6f} {:.6f} 0.000000".format(x, y), "|~"]
+    lines += ["##~~", "#~331"]
+    for kind, layer, refs in elements:
+        lines += [kind, "{} 0".format(layer), " ".join(str(ref) for ref in refs), "|~"]
+    lines += ["##~~", "#~EOF"]
+    return "\n".join(lines) + "\n"
+
+
+class GeoValidator:
+    """Validates .geo files on a background thread, one at a time, in submission order."""
+
+    def __init__(self, on_result, etch_layers=ETCH_LAYERS, allow_open_cuts=False):
+        """
+        Args:
+            on_result: Callable(key, report) called from the validator thread
+        """
+        self.on_result = on_result
+        self.etch_layers = tuple(etch_layers)
+        self.allow_open_cuts = allow_open_cuts
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def submit(self, key, path):
+        self._queue.put((key, path))
+
+    @property
+    def busy(self):
+        """True while files are waiting or being checked."""
+        return self._queue.unfinished_tasks > 0
+
+    def join(self):
+        """Wait until everything submitted has been checked."""
+        self._queue.join()
+
+    def close(self):
+        self._queue.put(None)
+
+    def _loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            key, path = item
+            try:
+                report = validate_geo(path, self.etch_layers, self.allow_open_cuts)
+            except Exception as e:
+                report = GeoReport(path)
+                report.errors.append("validator error: {}".format(e))
+            try:
+                self.on_result(key, report)
+            finally:
+                self._queue.task_done()
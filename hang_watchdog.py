@@ -0,0 +1,319 @@
+# -*- coding: utf-8 -*-
+"""
+Hang Watchdog
+Notices when TruTops has frozen on a drawing, so the batch stops clicking at
+a window that no longer listens. A background thread watches two things while
+a file is being converted:
+
+- the screen (or a region of it): if nothing changes for watchdog.timeout
+  seconds, TruTops is taken to be stuck
+- the TruTops process: if it has exited, or Windows reports its window as not
+  responding for watchdog.unresponsive_timeout seconds, it is stuck sooner
+
+The runner then kills TruTops, starts it again with watchdog.restart_command,
+waits for its window to answer and carries on with the files still queued.
+"""
+
+import os
+import shlex
+import subprocess
+import sys
+import threading
+import time
+
+
+class ProcessTarget:
+    """A process the watchdog can check, kill and start again."""
+
+    def __init__(self, command=None, process=None):
+        """
+        Args:
+            command: Command line that starts it (string or list)
+            process: Already running subprocess.Popen, if we started it
+        """
+        self.command = command
+        self.process = process
+
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def responding(self):
+        return self.alive()
+
+    def ready(self):
+        return self.alive() and self.responding()
+
+    def kill(self):
+        if self.alive():
+            self.process.kill()
+            self.process.wait(timeout=10)
+
+    def launch(self):
+        if not self.command:
+            raise RuntimeError("No restart command configured (watchdog.restart_command)")
+        args = self.command
+        if isinstance(args, str) and sys.platform != "win32":
+            args = shlex.split(args)
+        self.process = subprocess.Popen(args)
+
+    def wait_ready(self, timeout=120.0, is_running=None):
+        """Wait until the restarted process answers. Returns True if it did in time."""
+        is_running = is_running or (lambda: True)
+        deadline = time.perf_counter() + timeout
+        while is_running() and time.perf_counter() < deadline:
+            if self.ready():
+                return True
+            time.sleep(0.5)
+        return False
+
+
+class WindowTarget(ProcessTarget):
+    """TruTops on Windows: found by its process name (or exact window title), hung when
+    Windows says its window isn't responding.
+
+    Windows of this process, the one that started it (the console) and any
+    process it started are never matched, so the converter can't take itself
+    for TruTops - or kill itself.
+    """
+
+    def __init__(self, process_name=None, title=None, command=None):
+        super().__init__(command)
+        import ctypes
+        from ctypes import wintypes
+
+        self.process_name = (process_name or "").lower() or None
+        self.title = (title or "").strip().lower() or None
+        self._ctypes = ctypes
+        self._user32 = ctypes.WinDLL("user32", use_last_error=True)
+        self._kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        self._enum_proc = ctypes.WINFUNCTYPE(wintypes.BOOL, wintypes.HWND, wintypes.LPARAM)
+        self._user32.IsHungAppWindow.argtypes = [wintypes.HWND]
+        self._user32.GetWindowThreadProcessId.argtypes = [wintypes.HWND, ctypes.POINTER(wintypes.DWORD)]
+        self._kernel32.CreateToolhelp32Snapshot.restype = wintypes.HANDLE
+
+        class PROCESSENTRY32W(ctypes.Structure):
+            _fields_ = [("dwSize", wintypes.DWORD), ("cntUsage", wintypes.DWORD),
+                        ("th32ProcessID", wintypes.DWORD), ("th32DefaultHeapID", ctypes.c_size_t),
+                        ("th32ModuleID", wintypes.DWORD), ("cntThreads", wintypes.DWORD),
+                        ("th32ParentProcessID", wintypes.DWORD), ("pcPriClassBase", wintypes.LONG),
+                        ("dwFlags", wintypes.DWORD), ("szExeFile", wintypes.WCHAR * 260)]
+
+        self._PROCESSENTRY32W = PROCESSENTRY32W
+
+    def _processes(self):
+        """pid -> (parent pid, lower-case executable name) for every running process."""
+        ctypes = self._ctypes
+        snapshot = self._kernel32.CreateToolhelp32Snapshot(0x2, 0)  # TH32CS_SNAPPROCESS
+        processes = {}
+        if not snapshot or snapshot == ctypes.c_void_p(-1).value:
+            return processes
+        try:
+            entry = self._PROCESSENTRY32W()
+            entry.dwSize = ctypes.sizeof(entry)
+            more = self._kernel32.Process32FirstW(snapshot, ctypes.byref(entry))
+            while more:
+                processes[entry.th32ProcessID] = (entry.th32ParentProcessID, entry.szExeFile.lower())
+                more = self._kernel32.Process32NextW(snapshot, ctypes.byref(entry))
+        finally:
+            self._kernel32.CloseHandle(snapshot)
+        return processes
+
+    @staticmethod
+    def _own_family(processes):
+        """This process, its parent and everything it started."""
+        me = os.getpid()
+        family = {me, os.getppid()}
+        children = {me}
+        while children:
+            children = {pid for pid, (parent, _) in processes.items()
+                        if parent in children and pid not in family}
+            family |= children
+        return family
+
+    def window(self):
+        """(hwnd, pid) of the first visible TruTops window, or None."""
+        if not self.process_name and not self.title:
+            return None
+        ctypes = self._ctypes
+        processes = self._processes()
+        family = self._own_family(processes)
+        found = []
+
+        def check(hwnd, _):
+            if not self._user32.IsWindowVisible(hwnd):
+                return True
+            pid = ctypes.c_ulong()
+            self._user32.GetWindowThreadProcessId(hwnd, ctypes.byref(pid))
+            if pid.value in family:
+                return True
+            if self.process_name:
+                matched = processes.get(pid.value, (0, ""))[1] == self.process_name
+            else:
+                length = self._user32.GetWindowTextLengthW(hwnd)
+                buffer = ctypes.create_unicode_buffer(length + 1)
+                self._user32.GetWindowTextW(hwnd, buffer, length + 1)
+                matched = buffer.value.strip().lower() == self.title
+            if matched:
+                found.append((hwnd, pid.value))
+                return False
+            return True
+
+        self._user32.EnumWindows(self._enum_proc(check), 0)
+        return found[0] if found else None
+
+    def alive(self):
+        return self.window() is not None
+
+    def responding(self):
+        window = self.window()
+        return window is not None and not self._user32.IsHungAppWindow(window[0])
+
+    def kill(self):
+        window = self.window()  # Never one of ours, see window()
+        if window is not None:
+            subprocess.call(["taskkill", "/PID", str(window[1]), "/T", "/F"],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        super().kill()
+
+
+def process_name(command):
+    """Executable name a command line starts, e.g. "TruTops.exe"."""
+    if not command:
+        return None
+    if isinstance(command, str):
+        command = shlex.split(command, posix=sys.platform != "win32")
+    return os.path.basename(command[0].strip('"')) if command else None
+
+
+def open_target(config):
+    """What the watchdog checks and restarts, or None if nothing identifies TruTops.
+
+    On Windows that is the TruTops process, by watchdog.process_name (default:
+    the executable restart_command starts) or by an exact watchdog.window_title;
+    elsewhere the process restart_command starts.
+    """
+    command = config.get("watchdog", "restart_command") or None
+    if sys.platform == "win32":
+        name = config.get("watchdog", "process_name") or process_name(command)
+        title = config.get("watchdog", "window_title")
+        if name or title:
+            return WindowTarget(name, title, command)
+        return None
+    if command:
+        return ProcessTarget(command)
+    return None
+
+
+def restart(target, ready_timeout=120.0, settle=5.0, is_running=None):
+    """Kill the target, start it again and wait until it answers. Returns True if it did."""
+    if target is None or not target.command:
+        print("[WATCHDOG] Can't restart TruTops - set watchdog.restart_command")
+        return False
+    print("[WATCHDOG] Killing TruTops")
+    target.kill()
+    print("[WATCHDOG] Starting TruTops again")
+    try:
+        target.launch()
+    except (OSError, RuntimeError) as e:
+        print("[WATCHDOG] Could not start TruTops: {}".format(e))
+        return False
+    start = time.perf_counter()
+    if not target.wait_ready(ready_timeout, is_running):
+        print("[WATCHDOG] TruTops didn't answer within {:.0f}s".format(ready_timeout))
+        return False
+    time.sleep(settle)  # Window answering isn't the same as done loading
+    print("[WATCHDOG] TruTops ready after {:.1f}s".format(time.perf_counter() - start))
+    return True
+
+
+class Watchdog:
+    """Background thread that trips when the screen stops changing or TruTops stops answering.
+
+    The runner arms it for each file and checks tripped afterwards; it only
+    watches while armed and trips at most once per arm().
+    """
+
+    def __init__(self, hub, target=None, region=None, timeout=90.0, unresponsive_timeout=15.0,
+                 poll=1.0, threshold=1.5, on_hang=None):
+        """
+        Args:
+            hub: CaptureHub to take screen fingerprints through
+            target: ProcessTarget for liveness checks (None = screen only)
+            region: (left, top, right, bottom) to watch, None for the whole screen
+            on_hang: Optional callable(reason) called from the watchdog thread when it trips
+        """
+        self.hub = hub
+        self.target = target
+        self.region = tuple(region) if region else None
+        self.timeout = timeout
+        self.unresponsive_timeout = unresponsive_timeout
+        self.poll = poll
+        self.threshold = threshold
+        self.on_hang = on_hang
+        self.tripped = None
+        self._armed = False
+        self._fingerprint = None
+        self._last_change = 0.0
+        self._unresponsive_since = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.poll * 2 + 1)
+
+    def arm(self):
+        """Start watching (a file is being converted)."""
+        self._fingerprint = None
+        self._last_change = time.perf_counter()
+        self._unresponsive_since = None
+        self.tripped = None
+        self._armed = True
+
+    def disarm(self):
+        self._armed = False
+
+    def check(self):
+        """Why TruTops looks stuck right now, or None."""
+        now = time.perf_counter()
+        if self.target is not None and not self.target.alive():
+            return "TruTops is not running"
+
+        current = self.hub.fingerprint(self.region)
+        if self._fingerprint is None or self.hub.difference(self._fingerprint, current) > self.threshold:
+            self._last_change = now
+        self._fingerprint = current
+        still = now - self._last_change
+        if still >= self.timeout:
+            return "screen unchanged for {:.0f}s".format(still)
+
+        if self.target is not None and not self.target.responding():
+            if self._unresponsive_since is None:
+                self._unresponsive_since = now
+            elif now - self._unresponsive_since >= self.unresponsive_timeout:
+                return "not responding for {:.0f}s".format(now - self._unresponsive_since)
+        else:
+            self._unresponsive_since = None
+        return None
+
+    def _loop(self):
+        while not self._stop.wait(self.poll):
+            if not self._armed or self.tripped:
+                continue
+            try:
+                reason = self.check()
+            except Exception as e:
+                print("[WATCHDOG] Check failed: {}".format(e))
+                continue
+            if reason and self._armed:
+                self.tripped = reason
+                print("\n[WATCHDOG] TruTops looks hung: {}".format(reason))
+                if self.on_hang is not None:
+                    self.on_hang(reason)
+
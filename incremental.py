@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+Incremental Conversion
+Decides which DWGs actually need converting by comparing each one with its
+existing .geo. Size and modification time settle most cases; when they
+disagree only on the timestamp (a re-export of an unchanged part) the content
+hash recorded in the manifest at the last conversion decides.
+"""
+
+import hashlib
+import json
+import os
+
+MANIFEST_FILE = "conversion_manifest.json"
+
+
+def file_hash(path, chunk_size=1024 * 1024):
+    """SHA-1 of a file's contents."""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _key(path):
+    return os.path.normcase(os.path.abspath(path))
+
+
+class ConversionManifest:
+    """Records the state of each DWG when its .geo was last produced."""
+
+    def __init__(self, path=MANIFEST_FILE):
+        self.path = path
+        self.entries = {}
+        self.dirty = False
+        self.load()
+
+    def load(self):
+        """Load the manifest from disk."""
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r') as f:
+                    self.entries = json.load(f).get("files", {})
+            except (json.JSONDecodeError, IOError, AttributeError):
+                self.entries = {}
+
+    def save(self):
+        """Write the manifest to disk if anything changed."""
+        if not self.dirty:
+            return
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({"files": self.entries}, f)
+        os.replace(tmp_path, self.path)
+        self.dirty = False
+
+    def record(self, dwg_path, geo_path, source=None):
+        """Remember the DWG a .geo was just produced from.
+
+        Args:
+            source: Local copy with the same contents to hash instead of dwg_path (optional)
+
+        Returns:
+            False if the DWG couldn't be read; it is then simply converted again next time
+        """
+        try:
+            st = os.stat(dwg_path)
+            try:
+                sha1 = file_hash(source) if source else file_hash(dwg_path)
+            except OSError:
+                sha1 = file_hash(dwg_path)  # Staged copy already evicted
+        except OSError as e:
+            print("[INCREMENTAL] Could not record {}: {}".format(os.path.basename(dwg_path), e))
+            return False
+        self.entries[_key(dwg_path)] = {
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "sha1": sha1,
+            "geo": geo_path,
+        }
+        self.dirty = True
+        return True
+
+    def needs_conversion(self, dwg_path, geo_path):
+        """Whether a DWG must be (re)converted.
+
+        Returns:
+            (needed, reason)
+        """
+        try:
+            geo_st = os.stat(geo_path)
+        except OSError:
+            return True, "no output"
+        try:
+            st = os.stat(dwg_path)
+        except OSError:
+            return True, "DWG unreadable"
+
+        entry = self.entries.get(_key(dwg_path))
+        if entry is None:
+            # Converted before the manifest existed (or by hand): trust the timestamps
+            if geo_st.st_mtime_ns >= st.st_mtime_ns:
+                self.record(dwg_path, geo_path)
+                return False, "output newer"
+            return True, "DWG newer"
+
+        if entry["size"] != st.st_size:
+            return True, "size changed"
+        if entry["mtime_ns"] == st.st_mtime_ns:
+            return False, "unchanged"
+
+        # Same size, new timestamp - only the content can tell
+        if file_hash(dwg_path) == entry.get("sha1"):
+            entry["mtime_ns"] = st.st_mtime_ns
+            self.dirty = True
+            return False, "same content"
+        return True, "content changed"
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+Job Journal
+Append-only record of a batch: every file is logged as queued, then started,
+then succeeded, failed or skipped, one JSON line per event. Each event is
+written straight to the OS so it survives the app crashing; fsync is batched
+on a timer so a power cut loses at most the last second. Replaying the journal gives the
+exact set of files still to do.
+"""
+
+import json
+import os
+import threading
+import time
+
+JOURNAL_FILE = "job_journal.jsonl"
+
+QUEUED = "queued"
+STARTED = "started"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+SKIPPED = "skipped"
+
+# States a file does not need to be processed again from
+FINISHED = (SUCCEEDED, SKIPPED)
+
+
+class BatchState:
+    """Where each file of the last batch got to."""
+
+    def __init__(self):
+        self.batch = None
+        self.files = []
+        self.states = {}
+        self.details = {}
+
+    def apply(self, record):
+        """Fold one journal record into the state."""
+        event = record.get("event")
+        if event == "batch":
+            self.batch = record.get("batch")
+            self.files, self.states, self.details = [], {}, {}
+            return
+        path = record.get("file")
+        if path is None:
+            return
+        if path not in self.states:
+            self.files.append(path)
+        self.states[path] = event
+        if record.get("reason"):
+            self.details[path] = record["reason"]
+
+    def with_state(self, *states):
+        """Files whose last recorded state is one of states, in queue order."""
+        return [path for path in self.files if self.states[path] in states]
+
+    def pending(self):
+        """Files queued or interrupted while running."""
+        return self.with_state(QUEUED, STARTED)
+
+    def failed(self):
+        return self.with_state(FAILED)
+
+    def unfinished(self):
+        """Everything that still needs converting, failures included."""
+        return [path for path in self.files if self.states[path] not in FINISHED]
+
+    def counts(self):
+        counts = {}
+        for state in self.states.values():
+            counts[state] = counts.get(state, 0) + 1
+        return counts
+
+
+def replay(path=JOURNAL_FILE):
+    """Rebuild the last batch's state from the journal.
+
+    A torn final line (crash mid-write) is ignored.
+    """
+    state = BatchState()
+    if not os.path.exists(path):
+        return state
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                state.apply(json.loads(line))
+            except (ValueError, AttributeError):
+                continue
+    return state
+
+
+class JobJournal:
+    """Writer for the batch journal."""
+
+    def __init__(self, path=JOURNAL_FILE, sync_interval=1.0):
+        """
+        Args:
+            sync_interval: Longest time written events may wait for an fsync
+        """
+        self.path = path
+        self.sync_interval = sync_interval
+        self._file = None
+        self._unsynced = 0
+        self._last_sync = 0.0
+        self._timer = None  # Pending sync for events written since the last one
+        self._lock = threading.Lock()
+
+    def begin(self, files):
+        """Start a new batch, replacing the previous journal."""
+        self.close()
+        self._file = open(self.path, 'w', encoding='utf-8')
+        lines = [self._line("batch", batch=time.strftime("%Y%m%d-%H%M%S"))]
+        lines.extend(self._line(QUEUED, file=path) for path in files)
+        self._write("".join(lines))
+        self.sync()
+
+    def resume(self):
+        """Continue appending to the existing batch."""
+        self.close()
+        self._file = open(self.path, 'a', encoding='utf-8')
+        # Terminate a line torn by a crash so the next event starts clean
+        if self._file.tell() and not self._ends_with_newline():
+            self._write("\n")
+        self._last_sync = time.monotonic()
+
+    def _ends_with_newline(self):
+        with open(self.path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    @staticmethod
+    def _line(event, **fields):
+        fields["t"] = round(time.time(), 3)
+        fields["event"] = event
+        return json.dumps(fields) + "\n"
+
+    def _write(self, text):
+        self._file.write(text)
+        self._file.flush()
+        self._unsynced += 1
+
+    def mark(self, path, state, reason=None):
+        """Record a file's new state."""
+        if self._file is None:
+            return
+        fields = {"file": path}
+        if reason:
+            fields["reason"] = reason
+        with self._lock:
+            self._write(self._line(state, **fields))
+            wait = self._last_sync + self.sync_interval - time.monotonic()
+            if wait <= 0:
+                self._sync()
+            elif self._timer is None:
+                # Nothing may follow for a while (a slow file, the last one), so don't wait for the next event
+                self._timer = threading.Timer(wait, self.sync)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def sync(self):
+        """Force written events to disk."""
+        with self._lock:
+            self._sync()
+
+    def _sync(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._file is not None and self._unsynced:
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._sync()
+                self._file.close()
+                self._file = None
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+Material Organizer
+Copies the DWGs of a BOM material selection into one folder per material
+(laser/SS_14GA, laser/UHMW, ...). Copies run on a small thread pool because
+over an SMB share each file is mostly round trips, not bytes. Targets that
+already match are skipped, and every copy goes to a temporary name first and
+is renamed into place, so a half-copied DWG never appears under its real name.
+
+    python organizer.py BOM.xlsx Z:\\laser --material "SS 14GA"
+    python organizer.py BOM.xlsx Z:\\laser --target Z:\\sorted --workers 16 --hash
+"""
+
+import argparse
+import collections
+import concurrent.futures
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+
+from incremental import file_hash
+
+COPIED = "copied"
+SKIPPED = "skipped"      # Target already identical
+KEPT = "kept"            # Target differs but overwriting is off
+FAILED = "failed"
+
+# Network shares and FAT volumes keep modification times to 2 seconds
+MTIME_TOLERANCE = 2.0
+
+# Default home of the material folders inside the laser folder, kept out of its scans
+ORGANIZED_FOLDER = "by_material"
+
+CopyResult = collections.namedtuple("CopyResult", "source target status seconds error")
+
+
+def material_folder(material):
+    """Folder name for a material: "SS 14GA" -> "SS_14GA"."""
+    name = re.sub(r'[<>:"/\\|?*\s]+', "_", material.strip()).strip("._")
+    return name or "NO_MATERIAL"
+
+
+def target_root(source, target=None):
+    """Where the material folders go: target, or ORGANIZED_FOLDER inside source.
+
+    Raises ValueError if that is source itself, where the copies would be
+    scanned again as new exports.
+    """
+    root = target or os.path.join(source, ORGANIZED_FOLDER)
+    if os.path.normcase(os.path.abspath(root)) == os.path.normcase(os.path.abspath(source)):
+        raise ValueError("Material folders can't go straight into {} - choose a subfolder or "
+                         "another folder".format(source))
+    return root
+
+
+def scan_exclude(source, target=None):
+    """Scan exclude pattern for the material folders if they are inside source, else None."""
+    try:
+        rel = os.path.relpath(target_root(source, target), source)
+    except ValueError:
+        return None  # Other drive (or straight into source, refused when copying)
+    if rel == os.pardir or rel.startswith(os.pardir + os.sep):
+        return None
+    return rel.replace(os.sep, "/")
+
+
+def plan_copies(bom, paths, target_root, material=None):
+    """(source, target) pairs for the paths on the BOM, one folder per material.
+
+    Args:
+        paths: DWGs to consider, e.g. a scan of the laser folder
+        material: Only this material (default: every material on the BOM)
+    """
+    copies = []
+    targets = set()
+    for path in bom.select(paths, material):
+        row = bom.find(path)
+        target = os.path.join(target_root, material_folder(row.material), os.path.basename(path))
+        key = os.path.normcase(os.path.abspath(target))
+        # The same DWG found in two subfolders would race for one target
+        if key in targets or key == os.path.normcase(os.path.abspath(path)):
+            continue
+        targets.add(key)
+        copies.append((path, target))
+    return copies
+
+
+def identical(source, target, verify_hash=False):
+    """True if target exists with source's size and mtime (and contents, if verify_hash)."""
+    try:
+        src, dst = os.stat(source), os.stat(target)
+    except OSError:
+        return False
+    if src.st_size != dst.st_size or abs(src.st_mtime - dst.st_mtime) > MTIME_TOLERANCE:
+        return False
+    return not verify_hash or file_hash(source) == file_hash(target)
+
+
+def copy_file(source, target, verify_hash=False, overwrite=True):
+    """Copy one DWG via a temporary name. Returns a CopyResult."""
+    start = time.perf_counter()
+    if identical(source, target, verify_hash):
+        return CopyResult(source, target, SKIPPED, time.perf_counter() - start, None)
+    if not overwrite and os.path.exists(target):
+        return CopyResult(source, target, KEPT, time.perf_counter() - start, None)
+
+    folder, name = os.path.split(target)
+    temp = os.path.join(folder, ".{}.{}-{}.tmp".format(name, os.getpid(), threading.get_ident()))
+    try:
+        os.makedirs(folder, exist_ok=True)
+        shutil.copy2(source, temp)  # Keeps the mtime, so the next run can skip it
+        os.replace(temp, target)
+    except OSError as e:
+        try:
+            os.remove(temp)
+        except OSError:
+            pass
+        return CopyResult(source, target, FAILED, time.perf_counter() - start, str(e))
+    return CopyResult(source, target, COPIED, time.perf_counter() - start, None)
+
+
+def organize(copies, workers=8, verify_hash=False, overwrite=True, on_result=None, is_running=None):
+    """Run the copies on a thread pool.
+
+    Args:
+        copies: (source, target) pairs from plan_copies
+        on_result: Optional callable(CopyResult), called from worker threads
+        is_running: Optional callable; copies not yet started are dropped once it returns False
+
+    Returns:
+        list of CopyResult in the order of copies (dropped ones left out)
+    """
+    is_running = is_running or (lambda: True)
+
+    def run(pair):
+        if not is_running():
+            return None
+        result = copy_file(pair[0], pair[1], verify_hash, overwrite)
+        if on_result is not None:
+            on_result(result)
+        return result
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        results = list(pool.map(run, copies))
+    return [result for result in results if result is not None]
+
+
+def summarize(results, seconds=None):
+    """One-line summary of a run."""
+    counts = collections.Counter(result.status for result in results)
+    text = "{} copied, {} already there, {} failed".format(counts[COPIED], counts[SKIPPED], counts[FAILED])
+    if counts[KEPT]:
+        text += ", {} different but kept".format(counts[KEPT])
+    if seconds is not None:
+        text += " in {:.1f}s".format(seconds)
+    return text
+
+
+def log_result(result):
+    """Print a result the way BomCopier's log does."""
+    name = os.path.basename(result.source)
+    if result.status == COPIED:
+        print("[COPY] COPIED: {} -> {}".format(name, os.path.dirname(result.target)))
+    elif result.status == SKIPPED:
+        print("[COPY] SKIPPED: {} (identical)".format(name))
+    elif result.status == KEPT:
+        print("[COPY] KEPT: {} (target differs, overwrite off)".format(name))
+    else:
+        print("[COPY] ERROR: {} - {}".format(name, result.error))
+
+
+def main():
+    from bom import BomError, load_bom
+    from scanner import scan
+
+    parser = argparse.ArgumentParser(description="Copy a BOM's DWGs into one folder per material")
+    parser.add_argument("bom")
+    parser.add_argument("source", help="Folder the DWGs are exported to (searched recursively)")
+    parser.add_argument("--target", help="Where the material folders go (default: source/{})".format(
+        ORGANIZED_FOLDER))
+    parser.add_argument("--material", help="Only this material")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--hash", action="store_true", help="Also compare contents before skipping a target")
+    parser.add_argument("--keep", action="store_true", help="Don't overwrite targets that differ")
+    args = parser.parse_args()
+
+    try:
+        bom = load_bom(args.bom)
+    except (BomError, IOError) as e:
+        print("[BOM] {}".format(e))
+        return 1
+    try:
+        target = target_root(args.source, args.target)
+    except ValueError as e:
+        print("[COPY] {}".format(e))
+        return 1
+    exclude = scan_exclude(args.source, args.target)
+    copies = plan_copies(bom, scan(args.source, exclude=[exclude] if exclude else ()), target, args.material)
+    print("[COPY] {} DWGs to copy with {} workers".format(len(copies), args.workers))
+    start = time.perf_counter()
+    results = organize(copies, args.workers, args.hash, not args.keep, on_result=log_result)
+    print("[COPY] {}".format(summarize(results, time.perf_counter() - start)))
+    return 1 if any(result.status == FAILED for result in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
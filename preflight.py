@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+DWG Pre-flight
+Cheap checks run on the whole queue before TruTops sees any of it: each DWG
+must be readable, big enough to be a drawing and start with an AutoCAD
+version signature no older than MIN_VERSION, and no two files may save their
+.geo to the same place (one would overwrite the other). Only the first few header bytes are read, in parallel,
+so a network folder of thousands of DWGs is checked in seconds.
+"""
+
+import concurrent.futures
+import os
+
+# Version signature in the first six bytes -> AutoCAD release, oldest first
+DWG_VERSIONS = {
+    b"AC1.40": "R1.4", b"AC1.50": "R2.05", b"AC2.10": "R2.10",
+    b"AC1001": "R2.2", b"AC1002": "R2.5", b"AC1003": "R2.6", b"AC1004": "R9",
+    b"AC1006": "R10", b"AC1009": "R11/R12", b"AC1012": "R13", b"AC1014": "R14",
+    b"AC1015": "2000", b"AC1018": "2004", b"AC1021": "2007", b"AC1024": "2010",
+    b"AC1027": "2013", b"AC1032": "2018",
+}
+
+# Oldest release TruTops imports
+MIN_VERSION = b"AC1009"
+
+MIN_SIZE = 256  # Bytes; even an empty drawing is several KB
+
+
+def check_dwg(path, min_size=MIN_SIZE, min_version=MIN_VERSION):
+    """Why a DWG can't be converted, or None if it looks fine."""
+    if isinstance(min_version, str):
+        min_version = min_version.encode("ascii")
+    try:
+        size = os.path.getsize(path)
+        with open(path, 'rb') as f:
+            header = f.read(6)
+    except OSError as e:
+        return "cannot read ({})".format(e.strerror or e)
+    if size < min_size:
+        return "too small ({} bytes)".format(size)
+    if not (header in DWG_VERSIONS or (header.startswith(b"AC10") and header[4:].isdigit())):
+        return "not a DWG file"
+    # AC10xx signatures count up with each release, so one newer than this
+    # table is still a DWG TruTops may well read; only older ones are refused
+    if _release(header) < _release(min_version):
+        return "DWG version {} is too old".format(DWG_VERSIONS.get(header) or header.decode("ascii"))
+    return None
+
+
+def _release(signature):
+    """Sortable position of a version signature; the pre-AC10xx ones come first."""
+    if signature.startswith(b"AC10") and signature[4:].isdigit():
+        return int(signature[2:])
+    return -1 if signature in DWG_VERSIONS else 0
+
+
+def preflight(paths, seen=None, workers=8, min_size=MIN_SIZE, min_version=MIN_VERSION, output_path=None):
+    """Check many DWGs at once.
+
+    Args:
+        seen: Dict of output key -> path already in the batch; files that pass
+            are added, so later calls also catch duplicates
+        workers: Files checked in parallel
+        output_path: Callable(path) -> where its .geo is saved. Files are only
+            duplicates if these match; without it, if their names match
+
+    Returns:
+        dict of path -> reason for every file that should be left out
+    """
+    seen = {} if seen is None else seen
+    problems = {}
+    keys = {}
+    for path in paths:
+        if output_path is None:
+            key = os.path.basename(path).lower()
+        else:
+            key = os.path.normcase(os.path.abspath(output_path(path))).lower()
+        if _duplicate(seen.get(key), path):
+            problems[path] = "same .geo as {}".format(seen[key])
+            continue
+        keys[path] = key
+
+    checked = list(keys)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        reasons = list(pool.map(lambda p: check_dwg(p, min_size, min_version), checked))
+    for path, reason in zip(checked, reasons):
+        if reason:
+            problems[path] = reason
+            continue
+        # Only a file that will actually be converted claims its .geo
+        key = keys[path]
+        if _duplicate(seen.get(key), path):
+            problems[path] = "same .geo as {}".format(seen[key])
+            continue
+        seen[key] = path
+    return problems
+
+
+def _duplicate(first, path):
+    """Whether first is another file than path (None = nothing claimed the .geo yet)."""
+    return first is not None and os.path.normcase(os.path.abspath(first)) != os.path.normcase(os.path.abspath(path))
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+Per-file Recovery
+What the batch does when one drawing fails: press a short key sequence that
+closes whatever dialog TruTops was left in, wait a little longer each time,
+try the file again, and after the last attempt quarantine it and move on.
+Only errors that mean the operator wants the batch stopped (pyautogui's
+fail-safe corner, ESC) or that many files in a row failing end the run.
+"""
+
+import os
+import time
+
+from organizer import COPIED, SKIPPED, copy_file
+
+# Closes open/save dialogs, the geometry warning and the "save modifications?" prompt
+DEFAULT_RESET = ["esc", "esc", "esc"]
+
+# Exceptions that stop the whole batch, by class name (pyautogui may not be installed)
+FATAL_ERRORS = ("FailSafeException", "KeyboardInterrupt", "MemoryError")
+
+
+def is_fatal(error):
+    return type(error).__name__ in FATAL_ERRORS
+
+
+class RecoveryPolicy:
+    """Retry, back-off and quarantine settings for one batch."""
+
+    def __init__(self, attempts=2, backoff=2.0, max_backoff=30.0, reset_keys=None, reset_pause=0.3,
+                 max_consecutive=5, quarantine_folder=None):
+        """
+        Args:
+            attempts: Retries after the first failure before a file is quarantined
+            backoff: Pause before the first retry, doubled for each further one
+            reset_keys: Keys pressed to get TruTops back to idle
+            max_consecutive: Stop the batch after this many files in a row are quarantined
+            quarantine_folder: Copy quarantined DWGs here for a look later (None = don't)
+        """
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.reset_keys = DEFAULT_RESET if reset_keys is None else reset_keys
+        self.reset_pause = reset_pause
+        self.max_consecutive = max_consecutive
+        self.quarantine_folder = quarantine_folder
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            attempts=config.get("recovery", "attempts") or 0,
+            backoff=config.get("recovery", "backoff") or 0.0,
+            max_backoff=config.get("recovery", "max_backoff") or 30.0,
+            reset_keys=config.get("recovery", "reset_keys"),
+            reset_pause=config.get("recovery", "reset_pause") or 0.3,
+            max_consecutive=config.get("recovery", "max_consecutive") or 0,
+            quarantine_folder=config.get("recovery", "quarantine_folder") or None,
+        )
+
+    def delay(self, attempt):
+        """Seconds to wait before retry number attempt (1-based)."""
+        return min(self.backoff * 2 ** (attempt - 1), self.max_backoff)
+
+    def reset(self, driver, is_running=None):
+        """Press the reset sequence. Returns False if a key could not be sent."""
+        is_running = is_running or (lambda: True)
+        for key in self.reset_keys:
+            if not is_running():
+                break
+            try:
+                driver.press(key)
+            except Exception as e:
+                if is_fatal(e):
+                    raise
+                print("[RECOVER] Reset key '{}' failed: {}".format(key, e))
+                return False
+            time.sleep(self.reset_pause)
+        return True
+
+    def quarantine(self, path):
+        """Copy a DWG to the quarantine folder, if there is one. Returns the copy's path or None."""
+        if not self.quarantine_folder:
+            return None
+        result = copy_file(path, os.path.join(self.quarantine_folder, os.path.basename(path)))
+        if result.status not in (COPIED, SKIPPED):
+            print("[RECOVER] Could not copy {} to quarantine: {}".format(os.path.basename(path), result.error))
+            return None
+        return result.target
+
+
+class BatchSummary:
+    """Which files needed retries and which were quarantined."""
+
+    def __init__(self):
+        self.attempts = {}       # index -> failed attempts so far
+        self.quarantined = {}    # index -> last error
+        self.consecutive = 0     # Files quarantined since the last success
+
+    def failed(self, index):
+        """Count a failed attempt. Returns the number of failures for the file so far."""
+        self.attempts[index] = self.attempts.get(index, 0) + 1
+        return self.attempts[index]
+
+    def succeeded(self, index):
+        self.consecutive = 0
+
+    def quarantine(self, index, reason):
+        self.quarantined[index] = reason
+        self.consecutive += 1
+
+    @property
+    def retried(self):
+        """Files that failed at least once but were not quarantined."""
+        return [i for i in self.attempts if i not in self.quarantined]
+
+    def lines(self, files):
+        """Report lines naming every retried and quarantined file."""
+        lines = []
+        if self.retried:
+            lines.append("Retried ({}):".format(len(self.retried)))
+            lines += ["  {} (x{})".format(os.path.basename(files[i]), self.attempts[i]) for i in self.retried]
+        if self.quarantined:
+            lines.append("Quarantined ({}):".format(len(self.quarantined)))
+            lines += ["  {} - {}".format(os.path.basename(files[i]), reason)
+                      for i, reason in self.quarantined.items()]
+        return lines
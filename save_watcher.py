@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""
+Save Watcher
+Confirms that TruTops actually wrote the .geo for a DWG by watching the
+output folder until the expected file exists and its size stops changing.
+
+Uses inotify on Linux and change notifications on Windows, falling back to
+polling os.stat everywhere else.
+
+Run directly to try it against a stand-in writer process:
+    python save_watcher.py --demo 10
+"""
+
+import ctypes
+import ctypes.util
+import os
+import random
+import select
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def expected_output(dwg_path, output_folder=None, extension=".geo"):
+    """Path TruTops is expected to save the .geo for dwg_path to."""
+    folder = output_folder or os.path.dirname(dwg_path)
+    base = os.path.splitext(os.path.basename(dwg_path))[0]
+    return os.path.join(folder, base + extension)
+
+
+class _PollingNotifier:
+    """Fallback notifier - just sleeps, callers re-check os.stat."""
+
+    def __init__(self, folder, poll_interval=0.05):
+        self.poll_interval = poll_interval
+
+    def wait(self, timeout):
+        """Block up to timeout seconds. Returns True if something may have changed."""
+        time.sleep(min(timeout, self.poll_interval))
+        return True
+
+    def close(self):
+        pass
+
+
+class _InotifyNotifier:
+    """Linux inotify watch on a single folder."""
+
+    IN_MODIFY = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+
+    def __init__(self, folder, poll_interval=0.05):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = self.IN_MODIFY | self.IN_CLOSE_WRITE | self.IN_MOVED_TO | self.IN_CREATE
+        if libc.inotify_add_watch(self.fd, os.fsencode(folder), mask) < 0:
+            os.close(self.fd)
+            raise OSError(ctypes.get_errno(), "inotify_add_watch failed")
+
+    def wait(self, timeout):
+        readable, _, _ = select.select([self.fd], [], [], max(timeout, 0))
+        if not readable:
+            return False
+        try:
+            while os.read(self.fd, 65536):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def close(self):
+        os.close(self.fd)
+
+
+class _WindowsNotifier:
+    """Windows FindFirstChangeNotification watch on a single folder."""
+
+    FILE_NOTIFY_CHANGE_FILE_NAME = 0x00000001
+    FILE_NOTIFY_CHANGE_SIZE = 0x00000008
+    FILE_NOTIFY_CHANGE_LAST_WRITE = 0x00000010
+    WAIT_OBJECT_0 = 0
+
+    def __init__(self, folder, poll_interval=0.05):
+        from ctypes import wintypes
+
+        self.kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        self.kernel32.FindFirstChangeNotificationW.restype = wintypes.HANDLE
+        self.kernel32.FindFirstChangeNotificationW.argtypes = [
+            wintypes.LPCWSTR, wintypes.BOOL, wintypes.DWORD]
+        self.kernel32.FindNextChangeNotification.argtypes = [wintypes.HANDLE]
+        self.kernel32.FindCloseChangeNotification.argtypes = [wintypes.HANDLE]
+        self.kernel32.WaitForSingleObject.argtypes = [wintypes.HANDLE, wintypes.DWORD]
+        self.kernel32.WaitForSingleObject.restype = wintypes.DWORD
+
+        mask = (self.FILE_NOTIFY_CHANGE_FILE_NAME | self.FILE_NOTIFY_CHANGE_SIZE |
+                self.FILE_NOTIFY_CHANGE_LAST_WRITE)
+        self.handle = self.kernel32.FindFirstChangeNotificationW(folder, False, mask)
+        if not self.handle or self.handle == ctypes.c_void_p(-1).value:
+            raise OSError(ctypes.get_last_error(), "FindFirstChangeNotification failed")
+
+    def wait(self, timeout):
+        result = self.kernel32.WaitForSingleObject(self.handle, int(max(timeout, 0) * 1000))
+        if result != self.WAIT_OBJECT_0:
+            return False
+        self.kernel32.FindNextChangeNotification(self.handle)
+        return True
+
+    def close(self):
+        self.kernel32.FindCloseChangeNotification(self.handle)
+
+
+def open_notifier(folder, poll_interval=0.05):
+    """Best available change notifier for folder."""
+    try:
+        if sys.platform.startswith("linux"):
+            return _InotifyNotifier(folder, poll_interval)
+        if sys.platform == "win32":
+            return _WindowsNotifier(folder, poll_interval)
+    except (OSError, AttributeError) as e:
+        print("[SAVE] Change notifications unavailable ({}), polling instead".format(e))
+    return _PollingNotifier(folder, poll_interval)
+
+
+class SaveWatcher:
+    """Blocks until an expected output file has been written completely."""
+
+    def __init__(self, stable_time=0.3, poll_interval=0.05):
+        self.stable_time = stable_time
+        self.poll_interval = poll_interval
+
+    def _stat(self, path, since):
+        """(size, mtime) of path if it was written at/after since, else None."""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        if since is not None and st.st_mtime < since:
+            return None
+        return st.st_size, st.st_mtime_ns
+
+    def wait_for_file(self, path, timeout, since=None, is_running=None):
+        """Wait until path exists, is non-empty and its size has stopped changing.
+
+        Args:
+            path: Expected output file
+            timeout: Seconds to wait in total
+            since: Ignore versions of the file last modified before this time.time()
+            is_running: Optional callable; waiting stops when it returns False
+
+        Returns:
+            (saved, elapsed) - whether the file was confirmed and seconds waited
+        """
+        start = time.perf_counter()
+        deadline = start + timeout
+        folder = os.path.dirname(os.path.abspath(path))
+        if since is not None:
+            # Filesystem timestamps can be coarser than time.time()
+            since -= 2.0
+
+        notifier = open_notifier(folder, self.poll_interval)
+        try:
+            last = None
+            last_change = None
+            while True:
+                if is_running is not None and not is_running():
+                    return False, time.perf_counter() - start
+
+                now = time.perf_counter()
+                current = self._stat(path, since)
+                if current is not None and current[0] > 0:
+                    if current != last:
+                        last = current
+                        last_change = now
+                    elif now - last_change >= self.stable_time:
+                        return True, now - start
+
+                remaining = deadline - now
+                if remaining <= 0:
+                    return False, now - start
+
+                if last is None:
+                    notifier.wait(min(remaining, 1.0))
+                else:
+                    # Quiet for the rest of stable_time means the writer is done,
+                    # but poll anyway in case notifications get coalesced
+                    quiet = self.stable_time - (now - last_change)
+                    notifier.wait(max(0, min(remaining, quiet, self.poll_interval * 4)))
+        finally:
+            notifier.close()
+
+
+def _stand_in_writer(folder, names, max_delay):
+    """Stand-in for TruTops: writes each file in chunks after a random delay."""
+    for name in names:
+        time.sleep(random.uniform(0.05, max_delay))
+        with open(os.path.join(folder, name), "wb") as f:
+            for _ in range(random.randint(1, 5)):
+                f.write(os.urandom(random.randint(1024, 65536)))
+                f.flush()
+                time.sleep(random.uniform(0.0, 0.1))
+
+
+def _demo(count, max_delay=1.0):
+    """Watch a stand-in writer process produce count files."""
+    watcher = SaveWatcher()
+    folder = tempfile.mkdtemp(prefix="save_watcher_")
+    names = ["PART-{:03d}.geo".format(i) for i in range(count)]
+
+    writer = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--stand-in",
+                               folder, str(max_delay)] + names)
+    failures = 0
+    try:
+        for name in names:
+            path = os.path.join(folder, name)
+            saved, elapsed = watcher.wait_for_file(path, timeout=max_delay + 5.0)
+            size = os.path.getsize(path) if saved else 0
+            print("[SAVE] {} {} after {:.3f}s ({} bytes)".format(
+                name, "confirmed" if saved else "MISSING", elapsed, size))
+            failures += 0 if saved else 1
+    finally:
+        writer.wait()
+
+    print("{} of {} files confirmed in {}".format(count - failures, count, folder))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 3 and sys.argv[1] == "--stand-in":
+        _stand_in_writer(sys.argv[2], sys.argv[4:], float(sys.argv[3]))
+    elif len(sys.argv) > 1 and sys.argv[1] == "--demo":
+        sys.exit(_demo(int(sys.argv[2]) if len(sys.argv) > 2 else 10))
+    else:
+        print(__doc__)
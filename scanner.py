@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+Folder Scanner
+Finds the DWGs under the laser folder and, in watch mode, notices new ones as
+SolidWorks exports them. A new file is only reported once its size and
+modification time have stopped changing, so half-written exports are never
+queued.
+"""
+
+import fnmatch
+import os
+import re
+import threading
+import time
+
+DEFAULT_INCLUDE = ("*.dwg",)
+
+
+def _matches(rel_path, name, patterns):
+    """Case-insensitive match of a relative path or bare name against any pattern."""
+    rel_path, name = rel_path.lower(), name.lower()
+    for pattern in patterns:
+        pattern = pattern.lower().replace("\\", "/")
+        if fnmatch.fnmatchcase(name, pattern) or fnmatch.fnmatchcase(rel_path, pattern):
+            return True
+    return False
+
+
+def natural_key(path):
+    """Sort key that puts part_2 before part_10."""
+    return [int(piece) if piece.isdigit() else piece for piece in re.split(r"(\d+)", path.lower())]
+
+
+def scan_entries(folder, include=DEFAULT_INCLUDE, exclude=(), recursive=True):
+    """(path, size, mtime_ns) of every matching file under folder, in no particular order.
+
+    Patterns match either the file name or the path relative to folder
+    (forward slashes), e.g. "*.dwg", "old/*", "*_backup*". A directory
+    matching an exclude pattern is not entered.
+    """
+    found = []
+    stack = [("", folder)]
+    while stack:
+        rel_dir, path = stack.pop()
+        try:
+            iterator = os.scandir(path)
+        except OSError as e:
+            print("[SCAN] Cannot read {}: {}".format(path, e))
+            continue
+        with iterator:
+            for entry in iterator:
+                rel_path = rel_dir + entry.name
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if recursive and not _matches(rel_path, entry.name, exclude):
+                            stack.append((rel_path + "/", entry.path))
+                        continue
+                    if not entry.is_file() or not _matches(rel_path, entry.name, include):
+                        continue
+                    if _matches(rel_path, entry.name, exclude):
+                        continue
+                    st = entry.stat()
+                except OSError:
+                    continue  # Deleted or locked while scanning
+                found.append((entry.path, st.st_size, st.st_mtime_ns))
+    return found
+
+
+def scan(folder, include=DEFAULT_INCLUDE, exclude=(), recursive=True):
+    """Matching files under folder in a stable, natural order."""
+    paths = [path for path, _, _ in scan_entries(folder, include, exclude, recursive)]
+    return sorted(paths, key=lambda path: natural_key(os.path.relpath(path, folder)))
+
+
+class FolderWatcher:
+    """Polls a folder and reports new files once they have finished being written."""
+
+    def __init__(self, folder, on_new, include=DEFAULT_INCLUDE, exclude=(), recursive=True,
+                 interval=1.0, stable_time=2.0, known=()):
+        """
+        Args:
+            on_new: Callable(paths) called from the watcher thread with new files, sorted
+            stable_time: Seconds a file's size and mtime must stay unchanged
+            known: Files already queued that should not be reported
+        """
+        self.folder = folder
+        self.on_new = on_new
+        self.include = include
+        self.exclude = exclude
+        self.recursive = recursive
+        self.interval = interval
+        self.stable_time = stable_time
+        self.known = set(os.path.normcase(os.path.abspath(path)) for path in known)
+        self._candidates = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+        print("[WATCH] Watching {}".format(self.folder))
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval * 2)
+        print("[WATCH] Stopped")
+
+    def poll(self):
+        """One scan; returns the files that became ready."""
+        now = time.monotonic()
+        ready = []
+        seen = set()
+        for path, size, mtime in scan_entries(self.folder, self.include, self.exclude, self.recursive):
+            key = os.path.normcase(os.path.abspath(path))
+            if key in self.known:
+                continue
+            seen.add(key)
+            previous = self._candidates.get(key)
+            if previous is None or previous[:2] != (size, mtime):
+                self._candidates[key] = (size, mtime, now)
+            elif size > 0 and now - previous[2] >= self.stable_time:
+                del self._candidates[key]
+                self.known.add(key)
+                ready.append(path)
+        # Forget candidates that disappeared again (temp files, renames)
+        for key in list(self._candidates):
+            if key not in seen:
+                del self._candidates[key]
+        return sorted(ready, key=lambda path: natural_key(os.path.relpath(path, self.folder)))
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            ready = self.poll()
+            if ready:
+                print("[WATCH] {} new file(s)".format(len(ready)))
+                self.on_new(ready)
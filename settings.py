@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+Settings
+Default configuration and the config.json loader, kept apart from the GUI so
+headless tools (workers, simulator, benchmarks) can use the same settings.
+"""
+
+import copy
+import json
+import os
+
+# Default configuration
+DEFAULT_CONFIG = {
+    "import_delay": 3.0,
+    "save_delay": 2.0,
+    "trutops_window_title": "TruTops",  # Window title to focus
+    "click_locations": {
+        "open_drawing": [549, 114],          # Open Drawing button (not Ctrl+O)
+        "no_save": [3009, 672],              # "No" button - don't save modifications
+        "save_selected": [680, 126],         # Save Selected to GEO button
+        "select_top_left": [75, 209],        # Top-left corner of selection box
+        "select_bottom_right": [3350, 1867], # Bottom-right corner of selection box
+    },
+    "wait": {
+        "poll_interval": 0.02,     # Seconds between condition checks
+        "step_timeout": 15.0,      # Max wait for any step before moving on anyway
+        "settle_time": 0.25,       # Screen must be still this long to count as done
+        "change_timeout": 1.0,     # Assume no visible effect if nothing changes by then
+        "change_threshold": 1.5,   # Mean pixel difference (0-255) that counts as a change
+    },
+    "save_watch": {
+        "enabled": True,           # Confirm each .geo was written before moving on
+        "output_folder": "",       # Where TruTops saves .geo files (empty = next to the DWG)
+        "extension": ".geo",
+        "timeout": 30.0,           # Longest a save may take
+        "stable_time": 0.3,        # File size must be unchanged this long
+    },
+    "timing": {
+        "percentile": 99,          # Step timeout = this percentile of past durations...
+        "margin": 0.5,             # ...plus this fraction on top
+        "min_samples": 5,          # History needed before a step gets its own timeout
+        "calibration_files": 5,    # Files processed by a Calibrate run
+        "save_every": 10,          # Files between writes of timing_profile.json (and once at the end)
+    },
+    "capture": {
+        "backend": "auto",         # auto | mss | pil - mss is much faster (pip install mss)
+    },
+    "input": {
+        "backend": "direct",       # direct (SendInput + in-process clipboard, Windows) | pyautogui
+    },
+    "detect": {
+        "scales": [0.8, 0.9, 1.0, 1.1, 1.25],  # Button image scales tried (display scaling changes)
+    },
+    "buttons": {
+        # Dialogs that only sometimes appear - steps guarded by them are skipped when absent
+        "modifications_prompt": {"image": "ScreenShots/modifications_prompt.png", "fallback_coords": None},
+        "geometry_warning": {"image": "ScreenShots/geometry_warning.png", "fallback_coords": None},
+    },
+    "dialogs": {
+        "appear_timeout": 0.5,     # How long to look for an optional dialog before skipping its step
+        "confidence": 0.8,         # Match score needed to count a dialog as shown
+        "template_size": [160, 60],  # Size of the image captured around a dialog button
+    },
+    "bom": {
+        "file": "",                # Last BOM loaded (.xlsx or .csv)
+        "name_column": 2,          # Column numbers start at 1 (B = 2)
+        "quantity_column": 6,
+        "material_column": 12,
+        "handedness_column": 0,    # 0 = the BOM has no handedness column
+        "header_rows": 2,          # Title and header rows above the parts
+        "part_extension": ".SLDPRT",
+        "suffix": "FLO",           # Flat pattern DWGs are named <part>FLO.dwg
+        "extension": ".dwg",
+    },
+    "organizer": {
+        "target_folder": "",       # Where material folders are made (empty = by_material in the laser folder)
+        "workers": 8,              # Parallel copies; network shares gain the most
+        "verify_hash": False,      # Compare contents too before skipping an existing copy
+        "overwrite": True,         # Replace copies that differ from the export
+    },
+    "preflight": {
+        "enabled": True,           # Check DWG headers and names before the batch starts
+        "workers": 8,              # Files checked in parallel
+        "min_size": 256,           # Bytes; smaller files can't be drawings
+        "min_version": "AC1009",   # Oldest DWG version accepted (AC1009 = R12)
+    },
+    "geo": {
+        "validate": False,         # Check every .geo in the background before marking the file done (see README)
+        "etch_layers": [2],        # Element layers that are etched, not cut
+        "allow_open_cuts": False,  # Accept cut contours that don't close
+        "retries": 1,              # Conversions repeated for a file whose .geo is bad
+    },
+    "staging": {
+        "enabled": "auto",         # Convert from a local copy: true, false, or "auto" (DWGs on a network share)
+        "folder": "",              # Local cache folder (empty = %LOCALAPPDATA%\\TruTopsDWGtoGEO\\staging)
+        "max_mb": 2048,            # Cache size; least recently used files are deleted past this
+        "prefetch": 4,             # DWGs copied ahead of the one being converted
+        "workers": 2,              # Parallel prefetch copies
+        "verify": True,            # Read each uploaded .geo back and compare it
+    },
+    "recovery": {
+        "attempts": 2,             # Retries for a file that fails before it is quarantined
+        "backoff": 2.0,            # Seconds before the first retry, doubled for each further one
+        "max_backoff": 30.0,
+        "reset_keys": ["esc", "esc", "esc"],  # Pressed after a failure to close stray dialogs
+        "reset_pause": 0.3,        # Seconds between reset keys
+        "max_consecutive": 5,      # Stop the batch when this many files in a row are quarantined (0 = never)
+        "quarantine_folder": "",   # Copy quarantined DWGs here (empty = just list them)
+    },
+    "watchdog": {
+        "enabled": False,          # Watch for TruTops freezing (needs restart_command to be set)
+        "timeout": 90.0,           # Seconds without any screen change that count as a hang
+        "unresponsive_timeout": 15.0,  # Seconds Windows may report TruTops "not responding"
+        "region": None,            # [left, top, right, bottom] to watch (None = whole screen)
+        "poll": 1.0,               # Seconds between checks
+        "process_name": "",        # TruTops' executable, e.g. "TruTops.exe" (empty = the one restart_command starts)
+        "window_title": "",        # Or: TruTops' exact window title, if it can't be found by process
+        "restart_command": "",     # Starts TruTops again, e.g. "C:\\Program Files\\TRUMPF\\...\\TruTops.exe"
+        "ready_timeout": 120.0,    # Longest TruTops may take to answer after a restart
+        "restart_settle": 5.0,     # Extra seconds after it answers before the batch carries on
+    },
+    "laser_folder": "",            # Folder Scan Folder / Watch folder look in for DWGs
+    "scan": {
+        "include": ["*.dwg"],      # File name or relative path patterns to queue
+        "exclude": [],             # Patterns to skip, e.g. "old/*" or "*_backup*"
+        "recursive": True,         # Include subfolders
+        "watch_interval": 1.0,     # Seconds between checks for new exports
+        "stable_time": 2.0,        # An export must stop changing this long before it is queued
+    },
+    "trace": {
+        "enabled": True,           # Record detect/act/wait timings for every step
+        "folder": "traces",        # Where each batch's trace files are written
+        "window": 10,              # Recent files the live files/hour and ETA use
+    },
+    "incremental": False,          # Skip DWGs whose .geo is already up to date
+    "workflow_file": "",           # Optional JSON plan replacing the default steps (see workflow.py)
+}
+
+CONFIG_FILE = "config.json"
+
+
+class Config:
+    """Handles loading and saving configuration."""
+
+    def __init__(self, path=CONFIG_FILE):
+        """
+        Args:
+            path: Settings file, or None for defaults that are never saved
+        """
+        self.path = path
+        self.data = copy.deepcopy(DEFAULT_CONFIG)
+        self.load()
+        print("[CONFIG] Loaded. click_locations: {}".format(self.data.get("click_locations")))
+
+    def load(self):
+        """Load configuration from file."""
+        if self.path and os.path.exists(self.path):
+            try:
+                with open(self.path, 'r') as f:
+                    saved = json.load(f)
+                    self._deep_update(self.data, saved)
+            except (json.JSONDecodeError, IOError):
+                pass
+
+    def save(self):
+        """Save configuration to file."""
+        if not self.path:
+            return
+        full_path = os.path.abspath(self.path)
+        print("[CONFIG] Saving to: {}".format(full_path))
+        with open(self.path, 'w') as f:
+            json.dump(self.data, f, indent=2)
+        print("[CONFIG] Saved! click_locations: {}".format(self.data.get("click_locations")))
+
+    def update(self, values):
+        """Merge nested values into the settings without saving them."""
+        self._deep_update(self.data, values)
+
+    def _deep_update(self, base, update):
+        """Recursively update nested dictionaries."""
+        for key, value in update.items():
+            if key in base and isinstance(base[key], dict) and isinstance(value, dict):
+                self._deep_update(base[key], value)
+            else:
+                base[key] = value
+
+    def get(self, *keys):
+        """Get a nested config value."""
+        value = self.data
+        for key in keys:
+            if value is None:
+                return None
+            value = value.get(key) if isinstance(value, dict) else None
+        return value
+
+    def set(self, *keys_and_value):
+        """Set a nested config value."""
+        keys = keys_and_value[:-1]
+        value = keys_and_value[-1]
+        target = self.data
+        for key in keys[:-1]:
+            target = target.setdefault(key, {})
+        target[keys[-1]] = value
+        self.save()
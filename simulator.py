@@ -0,0 +1,500 @@
+# -*- coding: utf-8 -*-
+"""
+Simulated TruTops
+A stand-in for TruTops that reacts to the same clicks and keys as the real
+thing: Open Drawing, the "save modifications?" No, the file dialog, import
+settings, Save Selected to GEO, the selection box, the occasional geometry
+warning and the save dialog, which writes a .geo file. Every reaction takes a
+random time drawn from a log-normal latency distribution and shows up on a
+virtual screen the normal capture and wait code watches.
+
+Run directly for a headless batch through the app's batch loop (batch.py):
+    python simulator.py 20 --speed 0.5 --warning-rate 0.2
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import zlib
+
+import cv2
+import numpy as np
+
+from backends import Backend
+from hang_watchdog import ProcessTarget
+from geo import format_geo
+from save_watcher import expected_output
+
+SCREEN_SIZE = (1280, 720)
+
+# Where the simulated TruTops has its controls
+LAYOUT = {
+    "open_drawing": [60, 30],
+    "no_save": [700, 410],
+    "save_selected": [170, 30],
+    "select_top_left": [40, 90],
+    "select_bottom_right": [1240, 690],
+}
+
+# Boxes (x, y, width, height) captured as the optional dialog button images
+PROMPT_BOX = (620, 380, 160, 60)
+WARNING_BOX = (560, 330, 160, 60)
+
+# How long each reaction takes: (median seconds, log-normal sigma)
+DEFAULT_LATENCY = {
+    "open_drawing": (0.15, 0.3),   # Click Open Drawing -> prompt or file dialog
+    "no_save": (0.10, 0.3),        # No -> file dialog
+    "open": (0.25, 0.4),           # Enter in file dialog -> import settings
+    "import": (0.80, 0.5),         # Enter in import settings -> drawing shown
+    "save_selected": (0.10, 0.3),  # Save Selected to GEO -> selection mode
+    "select": (0.10, 0.3),         # Selection finished -> warning or save dialog
+    "warning": (0.10, 0.3),        # Enter on warning -> save dialog
+    "save": (0.30, 0.5),           # Enter in save dialog -> .geo on disk
+}
+
+# What each state looks like: background of the working area
+_STATE_COLOURS = {
+    "empty": (236, 236, 236),
+    "drawing": (250, 250, 250),
+    "prompt": (250, 250, 250),
+    "file_dialog": (210, 220, 235),
+    "import_dialog": (225, 215, 200),
+    "selecting": (225, 240, 250),
+    "warning": (250, 250, 250),
+    "save_dialog": (200, 230, 210),
+}
+
+
+# A process standing in for TruTops' own: beats a heartbeat file until hang_after seconds, then hangs
+STAND_IN = """
+import sys, time
+path, hang_after = sys.argv[1], float(sys.argv[2])
+start = time.time()
+while True:
+    if not hang_after or time.time() - start < hang_after:
+        with open(path, "w") as f:
+            f.write(str(time.time()))
+    time.sleep(0.1)
+"""
+
+
+class StandInProcess(ProcessTarget):
+    """Process the watchdog checks and restarts in place of TruTops.
+
+    It stops answering (no heartbeat) hang_after seconds after its first
+    start, and the simulated TruTops freezes with it; a restart brings both
+    back with no drawing open.
+    """
+
+    def __init__(self, sim, heartbeat, hang_after=None):
+        super().__init__([sys.executable, "-c", STAND_IN, heartbeat, "0"])
+        self.sim = sim
+        self.heartbeat = heartbeat
+        self.hang_after = hang_after
+        sim.process = self
+
+    def responding(self):
+        try:
+            return self.alive() and time.time() - os.path.getmtime(self.heartbeat) < 1.0
+        except OSError:
+            return False
+
+    def launch(self):
+        if self.hang_after:
+            self.command[-1] = str(self.hang_after)
+            self.hang_after = None  # Only the first run hangs
+        else:
+            self.command[-1] = "0"
+        if os.path.exists(self.heartbeat):
+            os.remove(self.heartbeat)
+        super().launch()
+        self.sim.restart()
+
+
+class SimulatedTruTops(Backend):
+    """TruTops stand-in driven through the Backend interface."""
+
+    name = "simulated"
+
+    def __init__(self, folder=".", output_folder=None, latency=None, warning_rate=0.1,
+                 speed=1.0, seed=None, extension=".geo", size=SCREEN_SIZE, bad_output_rate=0.0):
+        """
+        Args:
+            folder: Folder the open dialog shows (where the DWGs are)
+            output_folder: Where .geo files are saved (None = next to the DWG)
+            latency: Overrides for DEFAULT_LATENCY
+            warning_rate: Fraction of files that raise the geometry warning
+            speed: Multiplier on every latency (0.1 = ten times faster)
+            bad_output_rate: Fraction of saves that write a truncated .geo
+        """
+        self.folder = folder
+        self.output_folder = output_folder
+        self.latency = dict(DEFAULT_LATENCY, **(latency or {}))
+        self.warning_rate = warning_rate
+        self.bad_output_rate = bad_output_rate
+        self.speed = speed
+        self.extension = extension
+        self.size = size
+        self.screen = self
+        self._rng = random.Random(seed)
+        self._lock = threading.RLock()
+
+        self.state = "empty"
+        self.drawing = None
+        self.typed = ""
+        self.clipboard = ""
+        self.corner = False
+        self._frame = None
+        self._frame_key = None
+        self.stats = {"saved": 0, "warnings": 0, "ignored": 0, "bad_output": 0, "hung": 0}
+        self.process = None  # StandInProcess; while it doesn't answer, neither does the simulator
+
+    # Timing
+
+    def sample(self, kind):
+        """Random duration for a reaction."""
+        median, sigma = self.latency[kind]
+        return median * self.speed * self._rng.lognormvariate(0.0, sigma)
+
+    def _after(self, kind, action):
+        """Run action once the reaction's latency has passed."""
+        def react():
+            with self._lock:
+                if not self._hung():
+                    action()
+        timer = threading.Timer(self.sample(kind), react)
+        timer.daemon = True
+        timer.start()
+
+    def _go(self, state):
+        return lambda: setattr(self, "state", state)
+
+    def _hung(self):
+        if self.process is not None and not self.process.responding():
+            self.stats["hung"] += 1
+            return True
+        return False
+
+    def restart(self):
+        """Back to a freshly started TruTops with nothing open."""
+        with self._lock:
+            self.state = "empty"
+            self.drawing = None
+            self.typed = ""
+            self.corner = False
+
+    def _ignore(self, what):
+        self.stats["ignored"] += 1
+        print("[SIM] Ignored {} in state '{}'".format(what, self.state))
+
+    # Backend
+
+    def click(self, x, y):
+        with self._lock:
+            if self._hung():
+                return
+            target = self._target(x, y)
+            state = self.state
+            if target == "open_drawing" and state in ("empty", "drawing"):
+                self._after("open_drawing", self._go("prompt" if self.drawing else "file_dialog"))
+            elif target == "no_save" and state == "prompt":
+                self._after("no_save", self._go("file_dialog"))
+            elif target == "save_selected" and state == "drawing":
+                self.corner = False
+                self._after("save_selected", self._go("selecting"))
+            elif target == "select_top_left" and state == "selecting":
+                self.corner = True
+            elif target == "select_bottom_right" and state == "selecting" and self.corner:
+                warn = self._rng.random() < self.warning_rate
+                if warn:
+                    self.stats["warnings"] += 1
+                self._after("select", self._go("warning" if warn else "save_dialog"))
+            else:
+                self._ignore("click at ({}, {})".format(x, y))
+
+    def press(self, key):
+        with self._lock:
+            if self._hung():
+                return
+            state = self.state
+            if key in ("esc", "escape") and state not in ("empty", "drawing"):
+                # Closes whatever dialog is open
+                self._after("no_save", self._go("drawing" if self.drawing else "empty"))
+            elif key != "enter":
+                self._ignore("key '{}'".format(key))
+            elif state == "file_dialog" and self.typed:
+                self._after("open", self._go("import_dialog"))
+            elif state == "import_dialog":
+                self._after("import", self._open_drawing)
+            elif state == "warning":
+                self._after("warning", self._go("save_dialog"))
+            elif state == "save_dialog":
+                self._after("save", self._save)
+            else:
+                self._ignore("Enter")
+
+    def hotkey(self, *keys):
+        with self._lock:
+            if self._hung():
+                return
+            if tuple(keys) == ("ctrl", "v") and self.state == "file_dialog":
+                self.typed = self.clipboard
+            else:
+                self._ignore("hotkey {}".format("+".join(keys)))
+
+    def set_clipboard(self, text):
+        self.clipboard = text
+
+    def get_clipboard(self):
+        return self.clipboard
+
+    def _open_drawing(self):
+        self.drawing = os.path.join(self.folder, self.typed)
+        self.typed = ""
+        self.state = "drawing"
+
+    def _save(self):
+        path = expected_output(self.drawing, self.output_folder, self.extension)
+        text = format_geo(*part_geometry(self._rng.uniform(50, 500), self._rng.uniform(50, 300)))
+        if self._rng.random() < self.bad_output_rate:
+            text = text[:len(text) // 2]  # TruTops killed mid-write
+            self.stats["bad_output"] += 1
+        with open(path, 'w') as f:
+            f.write(text)
+        self.stats["saved"] += 1
+        self.state = "drawing"
+
+    @staticmethod
+    def _target(x, y, reach=25):
+        for name, (tx, ty) in LAYOUT.items():
+            if abs(tx - x) <= reach and abs(ty - y) <= reach:
+                return name
+        return None
+
+    # Screen
+
+    def screen_size(self):
+        return self.size
+
+    def grab(self, region, out):
+        with self._lock:
+            frame = self._render()
+        if region is not None:
+            left, top, right, bottom = region
+            frame = frame[top:bottom, left:right]
+        if out is None or out.shape != frame.shape:
+            return frame.copy()
+        np.copyto(out, frame)
+        return out
+
+    def _render(self):
+        """The virtual screen for the current state (cached until it changes)."""
+        key = (self.state, self.drawing, self.corner, self.typed)
+        if key == self._frame_key:
+            return self._frame
+
+        width, height = self.size
+        frame = np.full((height, width, 3), _STATE_COLOURS[self.state], dtype=np.uint8)
+        frame[:60] = (60, 63, 65)
+        for name in ("open_drawing", "save_selected"):
+            x, y = LAYOUT[name]
+            cv2.rectangle(frame, (x - 45, y - 18), (x + 45, y + 18), (90, 120, 160), -1)
+
+        if self.drawing and self.state in ("drawing", "prompt", "selecting", "warning"):
+            # Parts look different per file so loading one is a visible change
+            rng = np.random.default_rng(zlib.crc32(self.drawing.encode('utf-8')))
+            for _ in range(12):
+                x, y = int(rng.integers(80, width - 300)), int(rng.integers(100, height - 200))
+                cv2.rectangle(frame, (x, y), (x + int(rng.integers(40, 250)), y + int(rng.integers(30, 150))),
+                              (30, 30, 30), 2)
+        if self.state == "selecting" and self.corner:
+            # Selection box dragged out from the first corner
+            x, y = LAYOUT["select_top_left"]
+            cv2.rectangle(frame, (x, y), (width // 2, height // 2), (120, 170, 230), -1)
+        if self.state == "prompt":
+            _dialog(frame, PROMPT_BOX, "No", (70, 110, 190))
+        if self.state == "warning":
+            _dialog(frame, WARNING_BOX, "OK!", (200, 150, 30))
+        if self.state in ("file_dialog", "import_dialog", "save_dialog"):
+            cv2.putText(frame, self.state, (300, 200), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (20, 20, 20), 2)
+        if self.typed:
+            # File name field, highlighted once something is pasted into it
+            cv2.rectangle(frame, (200, 500), (1080, 620), (255, 255, 255), -1)
+            cv2.putText(frame, self.typed, (220, 575), cv2.FONT_HERSHEY_SIMPLEX, 1.5, (20, 20, 20), 3)
+
+        self._frame, self._frame_key = frame, key
+        return frame
+
+    def write_templates(self, folder):
+        """Save the prompt and warning button images; returns config "buttons" entries."""
+        buttons = {}
+        for name, state, box in (("modifications_prompt", "prompt", PROMPT_BOX),
+                                 ("geometry_warning", "warning", WARNING_BOX)):
+            with self._lock:
+                saved = self.state, self._frame_key
+                self.state = state
+                self._frame_key = None
+                frame = self._render()
+                self.state = saved[0]
+                self._frame_key = None
+            x, y, w, h = box
+            path = os.path.join(folder, "{}.png".format(name))
+            cv2.imencode(".png", cv2.cvtColor(frame[y:y + h, x:x + w], cv2.COLOR_RGB2BGR))[1].tofile(path)
+            buttons[name] = {"image": path, "fallback_coords": None}
+        return buttons
+
+    def config_overrides(self, folder):
+        """Settings that point the workflow at the simulator's controls."""
+        return {
+            "trutops_window_title": "",
+            "click_locations": {name: list(pos) for name, pos in LAYOUT.items()},
+            "buttons": self.write_templates(folder),
+            "save_watch": {"output_folder": self.output_folder or ""},
+            "detect": {"scales": [1.0]},
+            "geo": {"validate": True},  # Output is written with format_geo, so the checks know its format
+        }
+
+
+def part_geometry(width, height, hole=10.0):
+    """Points and elements for a plate with one hole and an etched line, as format_geo takes them."""
+    points = {1: (0.0, 0.0), 2: (width, 0.0), 3: (width, height), 4: (0.0, height),
+              5: (width / 2, height / 2), 6: (5.0, 5.0), 7: (25.0, 5.0)}
+    elements = [("LIN", 1, (1, 2)), ("LIN", 1, (2, 3)), ("LIN", 1, (3, 4)), ("LIN", 1, (4, 1)),
+                ("CIR", 1, (5, hole)), ("LIN", 2, (6, 7))]
+    return points, elements
+
+
+def _dialog(frame, box, label, colour):
+    """Draw a dialog with its button at box."""
+    x, y, w, h = box
+    cv2.rectangle(frame, (x - 120, y - 90), (x + w + 120, y + h + 40), (235, 235, 240), -1)
+    cv2.rectangle(frame, (x - 120, y - 90), (x + w + 120, y + h + 40), (40, 40, 40), 2)
+    cv2.rectangle(frame, (x, y), (x + w, y + h), colour, -1)
+    cv2.putText(frame, label, (x + 50, y + 40), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (255, 255, 255), 2)
+
+
+def simulate(files=20, speed=1.0, warning_rate=0.1, seed=0, latency=None, plan=None, overrides=None,
+             workdir=None, trace=False, direct=False, bad_output_rate=0.0, hang_after=None):
+    """Run a batch of fake DWGs through the app's batch loop against the simulator.
+
+    Journal, preflight, GEO checks, recovery and the watchdog all run as they
+    do in the app; only the desktop is simulated.
+
+    Args:
+        plan: Workflow steps (default: the built-in plan)
+        overrides: Nested settings applied on top of the defaults
+        workdir: Folder for the fake DWGs and outputs (default: a temp folder, removed after)
+        trace: Write the step trace to the configured trace folder
+        direct: Drive the simulator through the direct input backend's stand-in
+        bad_output_rate: Fraction of .geo files written truncated; the GEO
+            validator catches them and they are converted again
+        hang_after: Seconds after which a stand-in TruTops process hangs; the
+            hang watchdog has to notice, restart it and convert the file again
+
+    Returns:
+        dict summary with per-file times, successes and simulator counts
+    """
+    from backends import DirectBackend
+    from batch import BatchRunner
+    from capture import CaptureHub
+    from direct_input import StandInInput
+    from file_queue import EventQueue
+    from incremental import ConversionManifest
+    from journal import JobJournal
+    from settings import Config
+    from timing_profile import TimingProfile
+    from workflow import DEFAULT_WORKFLOW, step_names
+
+    folder = workdir or tempfile.mkdtemp(prefix="sim_trutops_")
+    runner = None
+    try:
+        paths = []
+        for i in range(files):
+            paths.append(os.path.join(folder, "part_{:04d}.dwg".format(i)))
+            with open(paths[-1], 'wb') as f:
+                f.write(b"AC1032" + bytes(1024))
+
+        sim = SimulatedTruTops(folder, latency=latency, warning_rate=warning_rate, speed=speed, seed=seed,
+                               bad_output_rate=bad_output_rate)
+        config = Config(None)
+        config.update(sim.config_overrides(folder))
+        # Every run is traced in memory for the per-file times; only written out if asked
+        config.update({"trace": {"enabled": True, "folder": config.get("trace", "folder") if trace
+                                 else os.path.join(folder, "traces")}})
+        if plan is not None:
+            config.update({"workflow": plan})
+        if hang_after:
+            config.update({"watchdog": {"enabled": True, "unresponsive_timeout": 1.0, "poll": 0.2,
+                                        "ready_timeout": 10.0, "restart_settle": 0.1}})
+        config.update(overrides or {})
+
+        desktop = DirectBackend(native=StandInInput(sim)) if direct else sim
+        events = EventQueue()
+        runner = BatchRunner(
+            config, desktop, CaptureHub(desktop.screen), events,
+            # Keep every step duration so callers can look at the whole distribution
+            profile=TimingProfile(os.path.join(folder, "timing_profile.json"), max_samples=files),
+            manifest=ConversionManifest(os.path.join(folder, "conversion_manifest.json")),
+            journal=JobJournal(os.path.join(folder, "job_journal.jsonl")),
+        )
+        if hang_after:
+            runner.trutops = StandInProcess(sim, os.path.join(folder, "heartbeat"), hang_after)
+            runner.trutops.launch()
+
+        runner.prepare(paths)
+        start = time.perf_counter()
+        runner.run()
+        elapsed = time.perf_counter() - start
+
+        statuses, _ = events.drain()
+        succeeded = sum(1 for status in statuses.values() if status == "done")
+        spans = runner.tracer.spans if runner.tracer is not None else []
+        return {
+            "files": files,
+            "succeeded": succeeded,
+            "failed": files - succeeded,
+            "geo_retried": len(runner._geo_attempts),
+            "retried": len(runner.summary.retried),
+            "quarantined": len(runner.summary.quarantined),
+            "restarts": runner.restarts,
+            "seconds": round(elapsed, 3),
+            "files_per_hour": round(files / elapsed * 3600) if elapsed else 0,
+            "file_seconds": [round(span[4], 4) for span in spans if span[2] == "file"],
+            "step_seconds": {name: runner.profile.samples(name) for name in step_names(plan or DEFAULT_WORKFLOW)},
+            "simulator": dict(sim.stats),
+        }
+    finally:
+        if runner is not None and runner.trutops is not None:
+            runner.trutops.kill()
+        if workdir is None:
+            shutil.rmtree(folder, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless batch against a simulated TruTops")
+    parser.add_argument("files", type=int, nargs="?", default=10)
+    parser.add_argument("--speed", type=float, default=1.0, help="Latency multiplier (0.1 = 10x faster)")
+    parser.add_argument("--warning-rate", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--trace", action="store_true", help="Write a step trace to traces/")
+    parser.add_argument("--direct", action="store_true", help="Send input through the direct backend's stand-in")
+    parser.add_argument("--bad-output-rate", type=float, default=0.0, help="Fraction of .geo files written truncated")
+    parser.add_argument("--hang-after", type=float, help="Seconds until a stand-in TruTops process hangs")
+    args = parser.parse_args()
+
+    result = simulate(args.files, args.speed, args.warning_rate, args.seed, trace=args.trace, direct=args.direct,
+                      bad_output_rate=args.bad_output_rate, hang_after=args.hang_after)
+    result.pop("file_seconds")
+    result.pop("step_seconds")
+    print(json.dumps(result, indent=2))
+    return 0 if result["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
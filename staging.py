@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""
+Local Staging
+Keeps SMB round trips out of the timed steps when the laser folder is on a
+network share. The next few queued DWGs are copied to a cache folder on the
+local disk while the current one is converted, TruTops opens the local copy
+and saves its .geo next to it, and the .geo is copied back to the share on a
+background thread and read back to verify it arrived intact.
+
+The cache is bounded by size: once it grows past the limit the least
+recently used files are deleted, except the ones still queued, being
+converted or waiting to be uploaded.
+"""
+
+import collections
+import concurrent.futures
+import os
+import sys
+import threading
+import time
+import zlib
+
+from incremental import file_hash
+from organizer import COPIED, SKIPPED, copy_file
+
+
+def default_folder():
+    """Cache folder on the local disk."""
+    base = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "TruTopsDWGtoGEO", "staging")
+
+
+def is_network_path(path):
+    """True for UNC paths and mapped network drives."""
+    path = os.path.abspath(path)
+    if path.startswith("\\\\") or path.startswith("//"):
+        return True
+    if sys.platform != "win32":
+        return False
+    import ctypes
+    drive = os.path.splitdrive(path)[0]
+    return bool(drive) and ctypes.windll.kernel32.GetDriveTypeW(drive + "\\") == 4  # DRIVE_REMOTE
+
+
+class StagingCache:
+    """Local copies of remote files, evicted least recently used first."""
+
+    def __init__(self, root=None, max_bytes=2 << 30):
+        self.root = root or default_folder()
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = collections.OrderedDict()  # local path -> bytes, oldest use first
+        self._pins = collections.Counter()
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        """Pick up files left by earlier runs, oldest first."""
+        found = []
+        for folder, _, names in os.walk(self.root):
+            for name in names:
+                path = os.path.join(folder, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                found.append((st.st_atime, path, st.st_size))
+        for _, path, size in sorted(found):
+            self._entries[path] = size
+            self.size += size
+
+    def path_for(self, remote):
+        """Local path for a remote file; one subfolder per remote folder, so names can't clash."""
+        folder = os.path.normcase(os.path.abspath(os.path.dirname(remote)))
+        key = "{:08x}".format(zlib.crc32(folder.encode("utf-8")))
+        return os.path.join(self.root, key, os.path.basename(remote))
+
+    def pin(self, path):
+        with self._lock:
+            self._pins[path] += 1
+
+    def unpin(self, path):
+        with self._lock:
+            self._pins[path] -= 1
+            if self._pins[path] <= 0:
+                del self._pins[path]
+
+    def add(self, path):
+        """Count a file now in the cache as just used, then evict to stay under the limit."""
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return
+        with self._lock:
+            self.size += size - self._entries.pop(path, 0)
+            self._entries[path] = size
+            self._evict()
+
+    def _evict(self):
+        for path in list(self._entries):
+            if self.size <= self.max_bytes:
+                return
+            if path in self._pins:
+                continue
+            size = self._entries.pop(path)
+            self.size -= size
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def fetch(self, remote):
+        """Copy a remote file into the cache (if not already there) and return the local path."""
+        local = self.path_for(remote)
+        result = copy_file(remote, local)
+        if result.status not in (COPIED, SKIPPED):
+            raise IOError(result.error or "could not stage {}".format(remote))
+        self.add(local)
+        return local
+
+
+class Stager:
+    """Prefetches queued DWGs and uploads finished .geo files on background threads."""
+
+    def __init__(self, cache, prefetch=4, workers=2, verify=True, upload_attempts=3):
+        """
+        Args:
+            prefetch: DWGs copied ahead of the one being converted
+            workers: Parallel prefetch copies
+            verify: Read each upload back and compare contents
+            upload_attempts: Tries per upload, with a growing pause between them
+        """
+        self.cache = cache
+        self.prefetch_count = prefetch
+        self.verify = verify
+        self.upload_attempts = upload_attempts
+        self._fetches = {}  # remote -> Future of its local path
+        self._fetch_pool = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, workers))
+        # One upload at a time keeps them in order and leaves the share to the prefetches
+        self._upload_pool = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self._uploads = 0
+        self._lock = threading.Lock()
+
+    def prefetch(self, remotes):
+        """Start copying DWGs that aren't on their way yet, in the order given."""
+        for remote in remotes:
+            if remote not in self._fetches:
+                self.cache.pin(self.cache.path_for(remote))
+                self._fetches[remote] = self._fetch_pool.submit(self.cache.fetch, remote)
+
+    def stage(self, remote):
+        """Local copy of a DWG, waiting for its prefetch if needed. None if it couldn't be copied.
+
+        The copy stays pinned in the cache until release(remote).
+        """
+        future = self._fetches.get(remote)
+        if future is None:
+            self.prefetch([remote])
+            future = self._fetches[remote]
+        try:
+            return future.result()
+        except (IOError, OSError) as e:
+            print("[STAGE] Could not copy {} locally: {}".format(os.path.basename(remote), e))
+            self.release(remote)
+            return None
+
+    def release(self, remote):
+        """The DWG is done with; its local copy may be evicted."""
+        if self._fetches.pop(remote, None) is not None:
+            self.cache.unpin(self.cache.path_for(remote))
+
+    @property
+    def busy(self):
+        """True while uploads are waiting or running."""
+        return self._uploads > 0
+
+    def upload(self, local, remote, on_done):
+        """Copy a finished file back to the share in the background.
+
+        Args:
+            on_done: Callable(error) from the upload thread; error is None on success
+        """
+        self.cache.pin(local)
+        with self._lock:
+            self._uploads += 1
+        self._upload_pool.submit(self._upload, local, remote, on_done)
+
+    def _upload(self, local, remote, on_done):
+        error = None
+        try:
+            for attempt in range(self.upload_attempts):
+                if attempt:
+                    time.sleep(0.5 * 2 ** (attempt - 1))
+                result = copy_file(local, remote)
+                error = result.error
+                if result.status in (COPIED, SKIPPED):
+                    if not self.verify or file_hash(local) == file_hash(remote):
+                        error = None
+                        break
+                    error = "copy on the share differs from the local file"
+            self.cache.add(local)
+        except Exception as e:
+            error = str(e)
+        finally:
+            self.cache.unpin(local)
+        try:
+            on_done(error)
+        finally:
+            # Only now, so callers polling busy never miss the result
+            with self._lock:
+                self._uploads -= 1
+
+    def close(self):
+        """Wait for uploads, drop prefetches nobody asked for."""
+        for remote in list(self._fetches):
+            self._fetches[remote].cancel()
+            self.release(remote)
+        self._fetch_pool.shutdown(wait=True)
+        self._upload_pool.shutdown(wait=True)
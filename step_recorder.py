@@ -4,8 +4,13 @@ Step Recorder - Record all actions, then label them after
 1. Perform your full workflow in TrueTops
 2. Press ESC when done
 3. Then label each action (or 'x' to skip)
+
+With --latency the screen is also sampled while you work, and each step is
+saved with how long TruTops took to settle after it; --seed adds those times
+to timing_profile.json for the runner's step timeouts.
 """
 
+import argparse
 import time
 from datetime import datetime
 from pynput import mouse, keyboard
@@ -32,6 +37,7 @@ def on_click(x, y, button, pressed):
     if pressed and button == mouse.Button.left:
         action = {
             "time": get_elapsed(),
+            "at": time.perf_counter(),
             "type": "click",
             "x": x,
             "y": y,
@@ -59,6 +65,7 @@ def on_key(key):
 
     action = {
         "time": get_elapsed(),
+        "at": time.perf_counter(),
         "type": "key",
         "key": key_name,
         "label": ""
@@ -86,6 +93,8 @@ def label_actions():
             print("  CLICK at ({}, {})".format(action["x"], action["y"]))
         else:
             print("  KEY: {}".format(action["key"]))
+        if action.get("latency") is not None:
+            print("  (screen settled {:.2f}s later)".format(action["latency"]))
 
         label = input("  What does this do? (x to skip): ").strip()
 
@@ -99,6 +108,22 @@ def label_actions():
     return labeled
 
 
+def step_name(label):
+    """click_locations / workflow step name for a label."""
+    return label.lower().replace(" ", "_").replace("'", "").replace("-", "_")
+
+
+def _latency_line(action):
+    if "latency" not in action:
+        return ""
+    if action["latency"] is None:
+        return "   -> SETTLED: no visible change\n"
+    line = "   -> SETTLED: {:.2f}s (first change {:.2f}s".format(action["latency"], action["first"])
+    if "think" in action:
+        line += ", then {:.2f}s until the next input".format(action["think"])
+    return line + ")\n"
+
+
 def save_results(labeled_actions):
     with open(LOG_FILE, 'w') as f:
         f.write("# Step Recording - {}\n".format(
@@ -112,11 +137,12 @@ def save_results(labeled_actions):
         for i, action in enumerate(labeled_actions, 1):
             if action["type"] == "click":
                 f.write("{}. {}\n".format(i, action["label"]))
-                f.write("   -> CLICK ({}, {})\n\n".format(
+                f.write("   -> CLICK ({}, {})\n".format(
                     action["x"], action["y"]))
             else:
                 f.write("{}. {}\n".format(i, action["label"]))
-                f.write("   -> KEY: {}\n\n".format(action["key"]))
+                f.write("   -> KEY: {}\n".format(action["key"]))
+            f.write(_latency_line(action) + "\n")
 
         f.write("\n" + "#" + "=" * 60 + "\n")
         f.write("# SUGGESTED CONFIG:\n")
@@ -125,7 +151,7 @@ def save_results(labeled_actions):
         f.write('"click_locations": {\n')
         for action in labeled_actions:
             if action["type"] == "click":
-                key = action["label"].lower().replace(" ", "_").replace("'", "").replace("-", "_")
+                key = step_name(action["label"])
                 f.write('    "{}": [{}, {}],\n'.format(key, action["x"], action["y"]))
         f.write('},\n')
 
@@ -135,12 +161,27 @@ def save_results(labeled_actions):
                 f.write('    # {} -> key: {}\n'.format(action["label"], action["key"]))
         f.write(']\n')
 
+        measured = [a for a in labeled_actions if a.get("latency") is not None]
+        if measured:
+            f.write("\n# MEASURED LATENCY (seconds from input until TruTops settled):\n")
+            for action in measured:
+                f.write("#   {:<30} {:>6.2f}  (first change {:.2f})\n".format(
+                    step_name(action["label"]), action["latency"], action["first"]))
+
     print("\nResults saved to: {}".format(LOG_FILE))
 
 
 def main():
     global start_time, running
 
+    parser = argparse.ArgumentParser(description="Record a TrueTops workflow, then label the steps")
+    parser.add_argument("--latency", action="store_true",
+                        help="Also sample the screen to measure how long TruTops takes after each input")
+    parser.add_argument("--rate", type=float, default=30.0, help="Screen samples per second with --latency")
+    parser.add_argument("--seed", action="store_true",
+                        help="Add the measured latencies to timing_profile.json (needs --latency)")
+    args = parser.parse_args()
+
     print("=" * 50)
     print("       STEP RECORDER")
     print("=" * 50)
@@ -158,6 +199,12 @@ def main():
     print("RECORDING - Do your workflow, press ESC when done")
     print("=" * 50)
 
+    sampler = None
+    if args.latency:
+        from capture import CaptureHub
+        from ui_latency import ScreenSampler
+        sampler = ScreenSampler(CaptureHub(), rate=args.rate).start()
+
     start_time = time.time()
 
     mouse_listener = mouse.Listener(on_click=on_click)
@@ -171,6 +218,12 @@ def main():
     running = False
     mouse_listener.stop()
 
+    if sampler is not None:
+        from ui_latency import annotate
+        sampler.stop()
+        annotate(actions, sampler.changes)
+        print("[LATENCY] {} screen changes seen at {:.0f} samples/s".format(len(sampler.changes), sampler.rate))
+
     print("\n" + "=" * 50)
     print("RECORDING STOPPED - {} actions captured".format(len(actions)))
     print("=" * 50)
@@ -185,9 +238,47 @@ def main():
     if labeled:
         save_results(labeled)
         print("\n{} steps labeled and saved.".format(len(labeled)))
+        if sampler is not None and args.seed:
+            seed(labeled)
     else:
         print("\nNo steps labeled.")
 
 
+def plan_step(label, names):
+    """Workflow step a label stands for: its step_name() if the plan has one, else ask."""
+    name = step_name(label)
+    if name in names:
+        return name
+    answer = input("  Which step is '{}'? ({}, blank to skip): ".format(label, ", ".join(names))).strip()
+    return answer or None
+
+
+def seed(labeled_actions):
+    """Add measured latencies to the timing profile under the workflow's step names."""
+    from settings import Config
+    from timing_profile import TimingProfile
+    from ui_latency import seed_profile
+    from workflow import load_plan, step_names
+
+    names = step_names(load_plan(Config()))
+    print("\nSeeding timing profile - workflow steps: {}".format(", ".join(names)))
+    steps = []
+    for action in labeled_actions:
+        if action.get("latency") is None:
+            continue
+        name = plan_step(action["label"], names)
+        if name:
+            steps.append((name, action["latency"]))
+
+    profile = TimingProfile()
+    added, rejected = seed_profile(steps, profile, names)
+    profile.save()
+    for name, samples in added.items():
+        print("  [PROFILE] {}: {}".format(name, ", ".join("{:.2f}s".format(v) for v in samples)))
+    for name in rejected:
+        print("  [PROFILE] '{}' is not a workflow step - not seeded".format(name))
+    print("Seeded {} steps in {}".format(len(added), profile.path))
+
+
 if __name__ == "__main__":
     main()
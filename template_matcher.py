@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+Template Matcher
+Matches a whole set of button templates against one captured frame. Every
+template (at several scales, to tolerate DPI differences between when the PNG
+was captured and now) is searched on a downscaled copy of the frame first,
+then the best candidate is refined at full resolution.
+"""
+
+import cv2
+
+# Template scales tried, relative to the captured PNG
+DEFAULT_SCALES = (0.8, 0.9, 1.0, 1.1, 1.25)
+
+# Frame is shrunk by this factor for the coarse search
+DEFAULT_COARSE_FACTOR = 0.5
+
+# Templates smaller than this (pixels, either side) at coarse size skip the coarse pass
+MIN_COARSE_SIZE = 8
+
+
+class Match:
+    """Best location of one template in a frame."""
+
+    def __init__(self, name, x, y, width, height, score, scale):
+        self.name = name
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.score = score
+        self.scale = scale
+
+    @property
+    def center(self):
+        return self.x + self.width // 2, self.y + self.height // 2
+
+    def __repr__(self):
+        return "<Match {} ({}, {}) score={:.3f} scale={}>".format(
+            self.name, self.x, self.y, self.score, self.scale)
+
+
+class _Variant:
+    """One template at one scale, at full and coarse resolution."""
+
+    def __init__(self, gray, scale, coarse_factor):
+        self.scale = scale
+        if scale == 1.0:
+            self.full = gray
+        else:
+            interpolation = cv2.INTER_AREA if scale < 1.0 else cv2.INTER_LINEAR
+            self.full = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=interpolation)
+        self.height, self.width = self.full.shape
+        # A single-colour template scores 1.0 everywhere, so it can never match
+        self.flat = float(self.full.std()) < 1.0
+
+        coarse_w = int(round(self.width * coarse_factor))
+        coarse_h = int(round(self.height * coarse_factor))
+        if min(coarse_w, coarse_h) >= MIN_COARSE_SIZE:
+            self.coarse = cv2.resize(self.full, (coarse_w, coarse_h), interpolation=cv2.INTER_AREA)
+        else:
+            self.coarse = None
+
+
+def to_gray(frame):
+    """Grayscale copy of an RGB (or already gray) frame."""
+    if frame.ndim == 2:
+        return frame
+    return cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)
+
+
+def _best(frame, needle):
+    """(score, (x, y)) of needle's best match in frame."""
+    if frame.shape[0] < needle.shape[0] or frame.shape[1] < needle.shape[1]:
+        return -1.0, None
+    result = cv2.matchTemplate(frame, needle, cv2.TM_CCOEFF_NORMED)
+    _, score, _, location = cv2.minMaxLoc(result)
+    return score, location
+
+
+class MultiTemplateMatcher:
+    """Finds the best location and score of every template in a frame."""
+
+    def __init__(self, templates, scales=DEFAULT_SCALES, coarse_factor=DEFAULT_COARSE_FACTOR,
+                 refine_margin=6):
+        """
+        Args:
+            templates: dict of name -> grayscale numpy template
+            scales: Template scales to try (1.0 = as captured)
+            coarse_factor: Frame downscale for the coarse pass
+            refine_margin: Extra full-resolution pixels searched around a coarse hit
+        """
+        self.coarse_factor = coarse_factor
+        self.refine_margin = refine_margin
+        self.variants = {
+            name: [_Variant(gray, scale, coarse_factor) for scale in scales]
+            for name, gray in templates.items()
+        }
+
+    def _coarse_candidate(self, coarse_frame, variants):
+        """Variant and full-res position with the best coarse score, or (None, None)."""
+        best_score, best_variant, best_location = -1.0, None, None
+        for variant in variants:
+            if variant.coarse is None or variant.flat:
+                continue
+            score, location = _best(coarse_frame, variant.coarse)
+            if location is not None and score > best_score:
+                best_score, best_variant, best_location = score, variant, location
+        if best_variant is None:
+            return None, None
+        x = int(best_location[0] / self.coarse_factor)
+        y = int(best_location[1] / self.coarse_factor)
+        return best_variant, (x, y)
+
+    def _refine(self, gray, variant, position):
+        """Full-resolution score and position near a coarse hit."""
+        margin = self.refine_margin + int(1 / self.coarse_factor)
+        frame_h, frame_w = gray.shape
+        left = max(0, position[0] - margin)
+        top = max(0, position[1] - margin)
+        right = min(frame_w, position[0] + variant.width + margin)
+        bottom = min(frame_h, position[1] + variant.height + margin)
+        score, location = _best(gray[top:bottom, left:right], variant.full)
+        if location is None:
+            return -1.0, None
+        return score, (left + location[0], top + location[1])
+
+    def match_all(self, frame, names=None):
+        """Best match of each template in one frame.
+
+        Args:
+            frame: RGB or grayscale numpy frame
+            names: Optional subset of template names
+
+        Returns:
+            dict of name -> Match (score is -1 if the template can't fit)
+        """
+        gray = to_gray(frame)
+        coarse = cv2.resize(gray, None, fx=self.coarse_factor, fy=self.coarse_factor,
+                            interpolation=cv2.INTER_AREA)
+
+        results = {}
+        for name in names or self.variants:
+            variants = self.variants[name]
+            variant, position = self._coarse_candidate(coarse, variants)
+
+            if variant is not None:
+                score, location = self._refine(gray, variant, position)
+            else:
+                # Too small to search coarsely - full resolution at every scale
+                score, location = -1.0, None
+                for candidate in variants:
+                    if candidate.flat:
+                        continue
+                    s, loc = _best(gray, candidate.full)
+                    if loc is not None and s > score:
+                        score, location, variant = s, loc, candidate
+
+            if location is None:
+                results[name] = Match(name, 0, 0, 0, 0, -1.0, None)
+            else:
+                results[name] = Match(name, location[0], location[1],
+                                      variant.width, variant.height, float(score), variant.scale)
+        return results
+
+    def present(self, frame, threshold=0.8, names=None):
+        """Names of templates found in frame with at least threshold score, best first."""
+        matches = self.match_all(frame, names)
+        found = [m for m in matches.values() if m.score >= threshold]
+        return [m.name for m in sorted(found, key=lambda m: -m.score)]
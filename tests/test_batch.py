@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""The app's batch loop, run headless against the simulated TruTops."""
+
+from batch import BatchRunner
+from incremental import ConversionManifest
+from simulator import simulate
+
+FAST = {"wait": {"settle_time": 0.05}, "dialogs": {"appear_timeout": 0.1}, "recovery": {"backoff": 0.0}}
+
+
+def test_batch_converts_every_file():
+    result = simulate(3, speed=0.05, warning_rate=0.5, seed=1, overrides=FAST)
+
+    assert result["succeeded"] == 3
+    assert len(result["file_seconds"]) == 3
+    assert result["simulator"]["ignored"] == 0
+
+
+def test_bad_geo_is_converted_again():
+    result = simulate(3, speed=0.05, seed=4, bad_output_rate=0.5, overrides=dict(FAST, geo={"retries": 3}))
+
+    assert result["geo_retried"] > 0
+    assert result["succeeded"] == 3
+
+
+def test_a_failed_delivery_is_retried_not_fatal(monkeypatch):
+    deliver, failed = BatchRunner._deliver, set()
+
+    def flaky(runner, index):
+        if index not in failed:
+            failed.add(index)
+            raise OSError("share went away")
+        deliver(runner, index)
+
+    monkeypatch.setattr(BatchRunner, "_deliver", flaky)
+    result = simulate(2, speed=0.05, seed=1, overrides=FAST)
+
+    assert result["succeeded"] == 2
+    assert result["retried"] == 2
+
+
+def test_unreadable_dwg_is_not_recorded(tmp_path):
+    manifest = ConversionManifest(str(tmp_path / "manifest.json"))
+
+    assert manifest.record(str(tmp_path / "gone.dwg"), str(tmp_path / "gone.geo")) is False
+    assert manifest.entries == {}
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""Polling a dialog: one capture and one match, near where it was last seen."""
+
+import cv2
+import numpy as np
+import pytest
+
+from button_detector import ButtonDetector
+
+
+@pytest.fixture
+def screen():
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 255, (400, 600, 3), dtype=np.uint8)
+    return frame
+
+
+@pytest.fixture
+def button(tmp_path, screen):
+    path = str(tmp_path / "ok.png")
+    cv2.imwrite(path, cv2.cvtColor(np.ascontiguousarray(screen[200:240, 300:380]), cv2.COLOR_RGB2BGR))
+    return path
+
+
+def _detector(screen, grabs):
+    def grab(region=None):
+        grabs.append(region)
+        if region is None:
+            return screen
+        left, top, right, bottom = region
+        return screen[top:bottom, left:right]
+    return ButtonDetector(grab)
+
+
+def test_poll_searches_around_the_last_sighting(screen, button):
+    grabs = []
+    detector = _detector(screen, grabs)
+
+    assert detector.visible(button)
+    assert detector.visible(button)
+
+    assert grabs[0] is None
+    left, top, right, bottom = grabs[1]
+    assert left <= 300 and top <= 200 and right >= 380 and bottom >= 240
+
+
+def test_poll_does_not_fall_back_to_other_scales(screen, button):
+    grabs = []
+    detector = _detector(np.zeros_like(screen), grabs)
+
+    assert not detector.visible(button)
+    assert grabs == [None]
+    assert list(detector._matchers) and all(key[1] == (1.0,) for key in detector._matchers)
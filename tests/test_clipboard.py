@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""Driver.set_clipboard reads the text back and sets it again if another program got in between."""
+
+import pytest
+
+from backends import CLIPBOARD_ATTEMPTS, Backend, DirectBackend, Driver
+from direct_input import ClipboardError, StandInInput
+
+PATH = r"\\server\laser\job\bracket.dwg"
+
+
+class ClipboardThief(StandInInput):
+    """Stand-in whose clipboard another program overwrites the first few times."""
+
+    def __init__(self, steals):
+        super().__init__()
+        self.steals = steals
+        self.sets = 0
+
+    def set_clipboard(self, text):
+        self.sets += 1
+        super().set_clipboard(text)
+        if self.steals:
+            self.steals -= 1
+            self.clipboard = "copied in Excel"
+
+
+def _driver(native):
+    return Driver(DirectBackend(native=native), None, None)
+
+
+def test_text_is_on_the_clipboard():
+    native = StandInInput()
+
+    _driver(native).set_clipboard(PATH)
+
+    assert native.get_clipboard() == PATH
+
+
+def test_overwritten_clipboard_is_set_again():
+    native = ClipboardThief(steals=CLIPBOARD_ATTEMPTS - 1)
+
+    _driver(native).set_clipboard(PATH)
+
+    assert native.sets == CLIPBOARD_ATTEMPTS
+    assert native.get_clipboard() == PATH
+
+
+def test_clipboard_that_never_takes_the_text_raises():
+    native = ClipboardThief(steals=CLIPBOARD_ATTEMPTS)
+
+    with pytest.raises(ClipboardError):
+        _driver(native).set_clipboard(PATH)
+    assert native.sets == CLIPBOARD_ATTEMPTS
+
+
+def test_backend_without_read_back_is_trusted():
+    class WriteOnly(Backend):
+        def set_clipboard(self, text):
+            self.text = text
+
+    backend = WriteOnly()
+    Driver(backend, None, None).set_clipboard(PATH)
+
+    assert backend.text == PATH
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""Dispatcher: a file whose worker stops renewing goes back in the queue."""
+
+import threading
+import time
+import urllib.error
+
+import pytest
+
+from dispatch import Coordinator, WorkerAgent, _crashing_process, desktop_process, serve, simulated_process
+from journal import FAILED, QUEUED, STARTED, SUCCEEDED
+from settings import Config
+from simulator import SimulatedTruTops
+
+LEASE = 0.2
+
+
+def test_expired_lease_is_handed_to_the_next_worker():
+    coordinator = Coordinator(["a.dwg", "b.dwg"], lease_time=LEASE)
+    first = coordinator.lease("dead")
+    time.sleep(LEASE * 1.5)
+
+    again = coordinator.lease("alive")
+
+    assert again["file"] == first["file"] == "a.dwg"
+    assert coordinator.jobs[first["job"]].attempts == 2
+    assert not coordinator.renew(first["job"], "dead")
+    assert not coordinator.complete(first["job"], "dead", True)  # Too late; "alive" holds it now
+    assert coordinator.complete(again["job"], "alive", True)
+    assert coordinator.jobs[first["job"]].state == SUCCEEDED
+
+
+def test_renewed_lease_does_not_expire():
+    coordinator = Coordinator(["a.dwg"], lease_time=LEASE)
+    job = coordinator.lease("slow")
+    for _ in range(3):
+        time.sleep(LEASE * 0.5)
+        assert coordinator.renew(job["job"], "slow")
+
+    assert coordinator.lease("other") is None
+    assert coordinator.jobs[job["job"]].state == STARTED
+
+
+def test_file_fails_after_too_many_expired_leases():
+    coordinator = Coordinator(["a.dwg"], lease_time=LEASE, max_attempts=2)
+    for worker in ("one", "two"):
+        assert coordinator.lease(worker)["file"] == "a.dwg"
+        time.sleep(LEASE * 1.5)
+
+    status = coordinator.status()
+
+    assert status["counts"] == {FAILED: 1}
+    assert status["finished"]
+
+
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")  # The crash itself
+def test_crashed_worker_file_is_redone_by_another():
+    names = ["part_{}.dwg".format(i) for i in range(8)]
+    coordinator = Coordinator(names, lease_time=LEASE)
+    server = serve(coordinator, "127.0.0.1", 0)
+    url = "http://127.0.0.1:{}".format(server.server_address[1])
+    try:
+        crashing = WorkerAgent(url, _crashing_process(simulated_process(0.01, seed=0), 2), "crash", idle_poll=0.02)
+        healthy = WorkerAgent(url, simulated_process(0.01, seed=1), "healthy", idle_poll=0.02)
+        threads = [threading.Thread(target=agent.run, daemon=True) for agent in (crashing, healthy)]
+        for thread in threads:
+            thread.start()
+        threads[1].join(timeout=30)
+    finally:
+        server.shutdown()
+
+    status = coordinator.status()
+    assert status["finished"]
+    assert status["counts"] == {SUCCEEDED: len(names)}
+    assert status["workers"]["crash"]["done"] == 2
+
+
+def test_requests_without_the_token_are_refused():
+    server = serve(Coordinator(["a.dwg"]), "127.0.0.1", 0, token="s3cret")
+    url = "http://127.0.0.1:{}".format(server.server_address[1])
+    try:
+        with pytest.raises(urllib.error.HTTPError) as refused:
+            WorkerAgent(url, None, "intruder")._post("/add", {"files": ["evil.dwg"]})
+        assert refused.value.code == 403
+        assert WorkerAgent(url, None, "station", token="s3cret")._status()["counts"] == {QUEUED: 1}
+    finally:
+        server.shutdown()
+
+
+def test_station_converts_through_the_batch_loop(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # The runner's profile and manifest files
+    names = []
+    for i in range(3):
+        names.append(str(tmp_path / "part_{}.dwg".format(i)))
+        with open(names[-1], 'wb') as f:
+            f.write(b"AC1032" + bytes(1024))
+    sim = SimulatedTruTops(str(tmp_path), speed=0.05, warning_rate=0.5, seed=4, bad_output_rate=0.5)
+    config = Config(None)
+    config.update(sim.config_overrides(str(tmp_path)))
+    config.update({"wait": {"settle_time": 0.05}, "dialogs": {"appear_timeout": 0.1},
+                   "recovery": {"backoff": 0.0}, "geo": {"retries": 3}})
+
+    coordinator = Coordinator(names, lease_time=5.0)
+    server = serve(coordinator, "127.0.0.1", 0, token="s3cret")
+    url = "http://127.0.0.1:{}".format(server.server_address[1])
+    try:
+        process = desktop_process(config, sim, str(tmp_path / "worker_journal.jsonl"))
+        WorkerAgent(url, process, "station", idle_poll=0.02, token="s3cret").run()
+    finally:
+        server.shutdown()
+
+    assert coordinator.status()["counts"] == {SUCCEEDED: 3}
+    assert sim.stats["bad_output"] > 0
+    assert sim.stats["saved"] == 3 + sim.stats["bad_output"]  # Each bad .geo was caught and converted again
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""Hang watchdog: tripping on a frozen screen or process, and restarting a stand-in TruTops."""
+
+import sys
+import time
+
+import pytest
+
+from hang_watchdog import ProcessTarget, Watchdog, restart
+
+STAND_IN = [sys.executable, "-c", "import time; time.sleep(60)"]
+
+
+class StillScreen:
+    """CaptureHub stand-in whose picture never changes."""
+
+    def fingerprint(self, region=None):
+        return 0
+
+    def difference(self, a, b):
+        return abs(a - b)
+
+
+class Frozen(ProcessTarget):
+    """Running, but its window has stopped answering."""
+
+    def responding(self):
+        return False
+
+
+@pytest.fixture
+def target():
+    target = ProcessTarget(STAND_IN)
+    target.launch()
+    yield target
+    target.kill()
+
+
+def _watch(target, **settings):
+    settings = dict({"timeout": 60.0, "unresponsive_timeout": 60.0, "poll": 0.02}, **settings)
+    watchdog = Watchdog(StillScreen(), target, **settings).start()
+    watchdog.arm()
+    return watchdog
+
+
+def _wait_for_trip(watchdog, seconds=3.0):
+    deadline = time.perf_counter() + seconds
+    while watchdog.tripped is None and time.perf_counter() < deadline:
+        time.sleep(0.02)
+    watchdog.stop()
+    return watchdog.tripped
+
+
+def test_still_screen_trips(target):
+    assert _wait_for_trip(_watch(target, timeout=0.2)).startswith("screen unchanged")
+
+
+def test_exited_process_trips(target):
+    watchdog = _watch(target)
+    target.kill()
+
+    assert _wait_for_trip(watchdog) == "TruTops is not running"
+
+
+def test_unresponsive_window_trips():
+    target = Frozen(STAND_IN)
+    target.launch()
+    try:
+        assert _wait_for_trip(_watch(target, unresponsive_timeout=0.2)).startswith("not responding")
+    finally:
+        target.kill()
+
+
+def test_disarmed_watchdog_does_not_trip(target):
+    watchdog = _watch(target, timeout=0.1)
+    watchdog.disarm()
+
+    assert _wait_for_trip(watchdog, seconds=0.4) is None
+
+
+def test_restart_starts_a_new_process(target):
+    first = target.process.pid
+
+    assert restart(target, ready_timeout=5.0, settle=0)
+    assert target.alive()
+    assert target.process.pid != first
+
+
+def test_restart_without_a_command_gives_up():
+    assert not restart(ProcessTarget(), ready_timeout=1.0, settle=0)
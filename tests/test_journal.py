@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""Job journal: replay after a crash, including one that tore the last line."""
+
+import pytest
+
+from journal import FAILED, QUEUED, STARTED, SUCCEEDED, JobJournal, replay
+
+FILES = ["a.dwg", "b.dwg", "c.dwg"]
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "job_journal.jsonl")
+
+
+def _crashed_batch(path):
+    """A batch that finished a.dwg, was converting b.dwg and died mid-write."""
+    journal = JobJournal(path, sync_interval=0)
+    journal.begin(FILES)
+    journal.mark("a.dwg", STARTED)
+    journal.mark("a.dwg", SUCCEEDED)
+    journal.mark("b.dwg", STARTED)
+    journal.close()
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"file": "b.dwg", "event": "succ')
+
+
+def test_torn_last_line_is_ignored(path):
+    _crashed_batch(path)
+
+    state = replay(path)
+
+    assert state.files == FILES
+    assert state.states == {"a.dwg": SUCCEEDED, "b.dwg": STARTED, "c.dwg": QUEUED}
+    assert state.pending() == ["b.dwg", "c.dwg"]
+
+
+def test_resume_appends_after_the_torn_line(path):
+    _crashed_batch(path)
+
+    journal = JobJournal(path, sync_interval=0)
+    journal.resume()
+    journal.mark("b.dwg", SUCCEEDED)
+    journal.mark("c.dwg", FAILED, "workflow step failed")
+    journal.close()
+
+    state = replay(path)
+    assert state.states == {"a.dwg": SUCCEEDED, "b.dwg": SUCCEEDED, "c.dwg": FAILED}
+    assert state.details == {"c.dwg": "workflow step failed"}
+    assert state.unfinished() == ["c.dwg"]
+
+
+def test_begin_replaces_the_previous_batch(path):
+    _crashed_batch(path)
+
+    journal = JobJournal(path)
+    journal.begin(["d.dwg"])
+    journal.close()
+
+    assert replay(path).pending() == ["d.dwg"]
+
+
+def test_no_journal_means_nothing_to_resume(path):
+    assert replay(path).files == []
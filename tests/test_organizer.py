@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""Material organizer: copies must not come back as new exports on the next scan."""
+
+import os
+
+import pytest
+
+from bom import Bom
+from organizer import COPIED, ORGANIZED_FOLDER, organize, plan_copies, scan_exclude, target_root
+from scanner import FolderWatcher, scan
+
+
+@pytest.fixture
+def laser(tmp_path):
+    folder = tmp_path / "laser"
+    (folder / "job").mkdir(parents=True)
+    for name in ("bracket.dwg", "job/panel.dwg"):
+        (folder / name).write_bytes(b"AC1032" + b"0" * 100)
+    return str(folder)
+
+
+@pytest.fixture
+def bom():
+    bom = Bom()
+    bom.add("bracket", "SS 14GA", 2)
+    bom.add("panel", "UHMW", 1)
+    return bom
+
+
+def _copy(bom, laser, target=None):
+    exclude = scan_exclude(laser, target)
+    copies = plan_copies(bom, scan(laser, exclude=[exclude] if exclude else ()), target_root(laser, target))
+    results = organize(copies)
+    assert [r.status for r in results] == [COPIED] * len(copies)
+    return exclude
+
+
+def test_rescan_after_copying_finds_only_the_exports(bom, laser):
+    before = scan(laser)
+    exclude = _copy(bom, laser)
+
+    assert os.path.isfile(os.path.join(laser, ORGANIZED_FOLDER, "SS_14GA", "bracket.dwg"))
+    assert scan(laser, exclude=[exclude]) == before
+
+
+def test_folder_watcher_ignores_the_copies(bom, laser):
+    exclude = _copy(bom, laser, os.path.join(laser, "sorted", "out"))
+    assert exclude == "sorted/out"
+
+    known = scan(laser, exclude=[exclude])
+    watcher = FolderWatcher(laser, None, exclude=[exclude], stable_time=0, known=known)
+    assert watcher.poll() == [] and watcher.poll() == []
+
+    unfiltered = FolderWatcher(laser, None, stable_time=0, known=known)
+    unfiltered.poll()
+    assert len(unfiltered.poll()) == 2  # What the copies would have done without the exclude
+
+
+def test_target_outside_the_laser_folder_needs_no_exclude(laser, tmp_path):
+    assert scan_exclude(laser, str(tmp_path / "sorted")) is None
+
+
+def test_laser_folder_itself_is_refused(laser):
+    with pytest.raises(ValueError):
+        target_root(laser, laser)
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""Pre-flight duplicate checks: only files whose .geo would collide."""
+
+import pytest
+
+from preflight import preflight
+from save_watcher import expected_output
+
+DWG = b"AC1032" + b"0" * 1000
+
+
+@pytest.fixture
+def same_names(tmp_path):
+    paths = []
+    for job in ("job1", "job2"):
+        (tmp_path / job).mkdir()
+        path = tmp_path / job / "bracket.dwg"
+        path.write_bytes(DWG)
+        paths.append(str(path))
+    return paths
+
+
+def test_same_name_next_to_each_source_is_fine(same_names):
+    assert preflight(same_names, output_path=expected_output) == {}
+
+
+def test_same_name_into_one_output_folder_is_a_duplicate(same_names, tmp_path):
+    problems = preflight(same_names, output_path=lambda path: expected_output(path, str(tmp_path / "geo")))
+
+    assert list(problems) == [same_names[1]]
+    assert same_names[0] in problems[same_names[1]]
+
+
+def _dwg(tmp_path, name, header=b"AC1032"):
+    path = tmp_path / name
+    path.write_bytes(header + b"0" * 1000)
+    return str(path)
+
+
+def test_newer_unknown_version_is_accepted(tmp_path):
+    assert preflight([_dwg(tmp_path, "future.dwg", b"AC1040")]) == {}
+
+
+def test_version_older_than_the_minimum_is_refused(tmp_path):
+    old, older = _dwg(tmp_path, "r10.dwg", b"AC1006"), _dwg(tmp_path, "r9.dwg", b"AC1005")
+
+    problems = preflight([old, older])
+
+    assert problems == {old: "DWG version R10 is too old", older: "DWG version AC1005 is too old"}
+
+
+def test_bad_file_does_not_claim_its_geo(tmp_path):
+    (tmp_path / "a").mkdir()
+    (tmp_path / "b").mkdir()
+    broken = _dwg(tmp_path / "a", "bracket.dwg", b"garbag")
+    good = _dwg(tmp_path / "b", "bracket.dwg")
+    seen = {}
+
+    assert list(preflight([broken, good], seen=seen)) == [broken]
+    assert seen == {"bracket.dwg": good}
+    assert "same .geo" in preflight([broken], seen=seen)[broken]
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""Save watcher: a .geo counts as saved once it exists and its size holds still."""
+
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+import save_watcher
+from save_watcher import SaveWatcher, _PollingNotifier
+
+
+@pytest.fixture(params=["native", "polling"])
+def watcher(request, monkeypatch):
+    if request.param == "polling":
+        monkeypatch.setattr(save_watcher, "open_notifier", _PollingNotifier)
+    return SaveWatcher(stable_time=0.2)
+
+
+def _slow_writer(path, chunks, pause):
+    with open(path, "wb") as f:
+        for _ in range(chunks):
+            f.write(b"0" * 4096)
+            f.flush()
+            time.sleep(pause)
+
+
+def test_stand_in_writer_is_confirmed(watcher, tmp_path):
+    path = tmp_path / "PART-000.geo"
+    writer = subprocess.Popen([sys.executable, save_watcher.__file__, "--stand-in",
+                               str(tmp_path), "0.2", path.name])
+    try:
+        saved, elapsed = watcher.wait_for_file(str(path), timeout=10.0)
+    finally:
+        writer.wait()
+
+    assert saved
+    assert elapsed < 10.0
+    assert path.stat().st_size > 0
+
+
+def test_file_still_growing_is_not_confirmed_early(watcher, tmp_path):
+    path = str(tmp_path / "panel.geo")
+    writer = threading.Thread(target=_slow_writer, args=(path, 6, 0.1))
+    writer.start()
+    try:
+        saved, elapsed = watcher.wait_for_file(path, timeout=5.0)
+    finally:
+        writer.join()
+
+    assert saved
+    assert elapsed >= 0.5 + watcher.stable_time * 0.9
+    assert os.path.getsize(path) == 6 * 4096
+
+
+def test_missing_file_times_out(watcher, tmp_path):
+    saved, elapsed = watcher.wait_for_file(str(tmp_path / "never.geo"), timeout=0.4)
+
+    assert not saved
+    assert 0.4 <= elapsed < 2.0
+
+
+def test_older_file_is_not_taken_for_the_new_save(watcher, tmp_path):
+    path = tmp_path / "bracket.geo"
+    path.write_bytes(b"0" * 100)
+    old = time.time() - 60
+    os.utime(path, (old, old))
+
+    saved, _ = watcher.wait_for_file(str(path), timeout=0.4, since=time.time())
+
+    assert not saved
+
+
+def test_stop_ends_the_wait(watcher, tmp_path):
+    saved, elapsed = watcher.wait_for_file(str(tmp_path / "never.geo"), timeout=10.0,
+                                           is_running=lambda: False)
+
+    assert not saved
+    assert elapsed < 1.0
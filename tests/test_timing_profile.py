@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""Timing profile: learned timeouts and seeding from measured UI latency."""
+
+import pytest
+
+from timing_profile import TimingProfile
+from ui_latency import SETTLE_TIME, seed_profile
+from workflow import DEFAULT_WORKFLOW, step_names
+
+DEFAULT = 15.0
+
+
+@pytest.fixture
+def profile(tmp_path):
+    return TimingProfile(str(tmp_path / "timing_profile.json"), machine="test", margin=0.5, min_samples=5)
+
+
+@pytest.fixture
+def dwg(tmp_path):
+    path = tmp_path / "bracket.dwg"
+    path.write_bytes(b"0" * 1000)
+    return str(path)
+
+
+def test_seeded_latency_sets_a_plan_steps_timeout(profile, dwg):
+    names = step_names(DEFAULT_WORKFLOW)
+    assert "open_drawing" in names
+    assert profile.timeout("open_drawing", DEFAULT, dwg) == DEFAULT
+
+    added, rejected = seed_profile([("open_drawing", 1.75)], profile, names)
+
+    assert added == {"open_drawing": [round(1.75 + SETTLE_TIME, 3)]}
+    assert rejected == []
+    assert profile.timeout("open_drawing", DEFAULT, dwg) == pytest.approx((1.75 + SETTLE_TIME) * 1.5)
+
+
+def test_seeding_survives_a_reload(profile, dwg):
+    seed_profile([("import", 2.0)], profile, step_names(DEFAULT_WORKFLOW))
+    profile.save()
+
+    reloaded = TimingProfile(profile.path, machine="test", margin=0.5, min_samples=5)
+    assert reloaded.timeout("import", DEFAULT, dwg) == pytest.approx((2.0 + SETTLE_TIME) * 1.5)
+
+
+def test_labels_that_are_not_plan_steps_are_rejected(profile, dwg):
+    added, rejected = seed_profile([("confirm_import_settings", 1.0), ("save", None)], profile,
+                                   step_names(DEFAULT_WORKFLOW))
+
+    assert added == {}
+    assert rejected == ["confirm_import_settings"]
+    assert profile.timeout("confirm_import_settings", DEFAULT, dwg) == DEFAULT
+
+
+def test_recorded_history_replaces_seeded_times(profile, dwg):
+    profile.seed("save", 5.0)
+    for _ in range(5):
+        profile.record("save", 0.4, dwg)
+
+    assert profile.timeout("save", DEFAULT, dwg) == pytest.approx(1.0)  # min_timeout over 0.4 * 1.5
+
+
+def test_other_size_classes_do_not_stand_in(profile, dwg, tmp_path):
+    panel = tmp_path / "panel.dwg"
+    panel.write_bytes(b"0" * (5 << 20))
+    for _ in range(10):
+        profile.record("save", 0.4, dwg)
+
+    assert profile.timeout("save", DEFAULT, str(panel)) == DEFAULT
+
+
+def test_per_file_times_keep_only_the_latest_files(tmp_path):
+    profile = TimingProfile(str(tmp_path / "timing_profile.json"), machine="test", max_files=3)
+    for name in ("a", "b", "c", "a", "d"):
+        profile.record("save", 0.4, str(tmp_path / (name + ".dwg")))
+
+    assert list(profile.data["machines"]["test"]["files"]) == ["c.dwg", "a.dwg", "d.dwg"]
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+Timing Profile
+Remembers how long each named automation step actually took, per machine and
+per file, and derives step timeouts from that history instead of global
+hand-tuned delays.
+"""
+
+import json
+import os
+import socket
+
+PROFILE_FILE = "timing_profile.json"
+
+# DWG size classes (upper bound in bytes, name). Small brackets and big frame
+# panels take very different times to import and save, so they get separate
+# histories.
+SIZE_CLASSES = [
+    (64 * 1024, "xs"),
+    (256 * 1024, "s"),
+    (1024 * 1024, "m"),
+    (4 * 1024 * 1024, "l"),
+]
+LARGEST_CLASS = "xl"
+# Steps recorded without a file (e.g. seeded from ui_latency) - not tied to a size
+UNSIZED = "any"
+
+
+def size_class(file_path):
+    """Size class name for a DWG (None if the file can't be read)."""
+    try:
+        size = os.path.getsize(file_path)
+    except (OSError, TypeError):
+        return None
+    for limit, name in SIZE_CLASSES:
+        if size < limit:
+            return name
+    return LARGEST_CLASS
+
+
+def percentile(samples, pct):
+    """Linear-interpolated percentile of a list of numbers."""
+    ordered = sorted(samples)
+    if not ordered:
+        return None
+    rank = (len(ordered) - 1) * pct / 100.0
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+class TimingProfile:
+    """Per-machine step duration history with percentile-based timeouts.
+
+    Layout of the JSON file:
+        {"machines": {host: {"steps": {step: {size_class: [seconds, ...]}},
+                             "files": {file_name: {step: seconds}},
+                             "seeded": {step: [seconds, ...]}}}}
+    """
+
+    def __init__(self, path=PROFILE_FILE, machine=None, percentile=99, margin=0.5,
+                 min_samples=5, max_samples=200, min_timeout=1.0, max_files=2000):
+        """
+        Args:
+            max_samples: History kept per step and size class
+            max_files: DWGs whose own last times are kept; the least recently converted are dropped
+        """
+        self.path = path
+        self.machine = machine or socket.gethostname()
+        self.percentile = percentile
+        self.margin = margin
+        self.min_samples = min_samples
+        self.max_samples = max_samples
+        self.min_timeout = min_timeout
+        self.max_files = max_files
+        self.data = {"machines": {}}
+        self.dirty = False
+        self.load()
+
+    @property
+    def _machine(self):
+        return self.data["machines"].setdefault(self.machine, {"steps": {}, "files": {}})
+
+    def load(self):
+        """Load the profile from disk."""
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r') as f:
+                    saved = json.load(f)
+                if isinstance(saved.get("machines"), dict):
+                    self.data = saved
+            except (json.JSONDecodeError, IOError):
+                pass
+
+    def save(self):
+        """Write the profile to disk if anything changed."""
+        if not self.dirty:
+            return
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.data, f)
+        os.replace(tmp_path, self.path)
+        self.dirty = False
+
+    def record(self, step, seconds, file_path=None):
+        """Record how long a step took."""
+        bucket = size_class(file_path) or UNSIZED
+        samples = self._machine["steps"].setdefault(step, {}).setdefault(bucket, [])
+        samples.append(round(seconds, 3))
+        del samples[:-self.max_samples]
+
+        if file_path:
+            # Re-inserted so the map stays in order of last use and the oldest go first
+            files = self._machine["files"]
+            times = files.pop(os.path.basename(file_path), {})
+            times[step] = round(seconds, 3)
+            files[os.path.basename(file_path)] = times
+            for name in list(files)[:-self.max_files]:
+                del files[name]
+        self.dirty = True
+
+    def seed(self, step, seconds):
+        """Record a step time measured outside the runner (e.g. by step_recorder --latency).
+
+        Seeded times stand in for a step's timeout until it has min_samples
+        of its own history.
+        """
+        samples = self._machine.setdefault("seeded", {}).setdefault(step, [])
+        samples.append(round(seconds, 3))
+        del samples[:-self.max_samples]
+        self.dirty = True
+
+    def samples(self, step, file_path=None):
+        """History for a step that applies to a file.
+
+        That is the file's own size class, or the samples recorded without a
+        file if the class has too few; other size classes never stand in, so
+        a big panel isn't timed from small brackets. Without a file, all of
+        the step's history.
+        """
+        buckets = self._machine["steps"].get(step, {})
+        bucket = size_class(file_path)
+        if bucket is None:
+            return [s for values in buckets.values() for s in values]
+        for name in (bucket, UNSIZED):
+            if len(buckets.get(name, [])) >= self.min_samples:
+                return buckets[name]
+        return []
+
+    def timeout(self, step, default, file_path=None):
+        """Timeout for a step: p<percentile> of its history plus margin.
+
+        Until min_samples have been recorded, seeded times are used if there
+        are any, otherwise default. A file seen before is never given less
+        than its own last time plus margin.
+        """
+        samples = self.samples(step, file_path)
+        if len(samples) < self.min_samples:
+            samples = self._machine.get("seeded", {}).get(step)
+            if not samples:
+                return default
+
+        value = percentile(samples, self.percentile)
+        if file_path:
+            last = self._machine["files"].get(os.path.basename(file_path), {}).get(step)
+            if last is not None:
+                value = max(value, last)
+        return max(self.min_timeout, value * (1 + self.margin))
+
+    def is_calibrated(self, step):
+        """True once a step has enough history to derive its own timeout."""
+        return len(self.samples(step)) >= self.min_samples
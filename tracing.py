@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+Step Tracing
+Timing spans for every file and for the detect, act and wait phase of every
+step, tagged with file, step and outcome. Recording a span is one tuple
+appended to a list; nothing is formatted or written until the batch is
+exported as JSONL, CSV and a Chrome trace (open in chrome://tracing or
+https://ui.perfetto.dev).
+"""
+
+import collections
+import csv
+import json
+import os
+import time
+
+from timing_profile import percentile
+
+TRACE_FOLDER = "traces"
+
+FIELDS = ("file", "step", "phase", "start", "duration", "outcome")
+
+
+class Tracer:
+    """Collects spans for one batch and derives throughput from them."""
+
+    def __init__(self, window=10):
+        """
+        Args:
+            window: Recent files the rolling throughput and ETA are based on
+        """
+        self.origin = time.perf_counter()
+        self.started = time.time()
+        self.spans = []
+        self._finished = collections.deque(maxlen=window)
+
+    def add(self, file_name, step, phase, start, end, outcome="ok"):
+        """Record a span from perf_counter() start and end times."""
+        self.spans.append((file_name, step, phase, start - self.origin, end - start, outcome))
+        if phase == "file":
+            self._finished.append((end, end - start))
+
+    # Live numbers
+
+    def rolling_rate(self):
+        """Files per hour over the recent window, or None before the first file."""
+        if not self._finished:
+            return None
+        if len(self._finished) == 1:
+            return 3600.0 / max(self._finished[0][1], 1e-6)
+        span = self._finished[-1][0] - self._finished[0][0]
+        # Time from the first window file's end to the last one's covers n - 1 files
+        return (len(self._finished) - 1) / max(span, 1e-6) * 3600.0
+
+    def eta(self, remaining):
+        """Seconds left for remaining files at the rolling rate, or None."""
+        rate = self.rolling_rate()
+        if not rate:
+            return None
+        return remaining / rate * 3600.0
+
+    # Analysis
+
+    def summary(self):
+        """Per step and phase: count, total, mean and p95 seconds, largest total first."""
+        groups = collections.defaultdict(list)
+        for _, step, phase, _, duration, _ in self.spans:
+            if phase != "file":
+                groups[(step, phase)].append(duration)
+        rows = []
+        for (step, phase), durations in groups.items():
+            rows.append({
+                "step": step,
+                "phase": phase,
+                "count": len(durations),
+                "total": round(sum(durations), 3),
+                "mean": round(sum(durations) / len(durations), 4),
+                "p95": round(percentile(durations, 95), 4),
+            })
+        rows.sort(key=lambda row: row["total"], reverse=True)
+        return rows
+
+    # Export
+
+    def write_jsonl(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for span in self.spans:
+                f.write(json.dumps(dict(zip(FIELDS, _rounded(span)))) + "\n")
+
+    def write_csv(self, path):
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(FIELDS)
+            writer.writerows(_rounded(span) for span in self.spans)
+
+    def write_chrome(self, path):
+        """Chrome trace event format: steps nest inside their file."""
+        events = [{"name": "process_name", "ph": "M", "pid": 1, "args": {"name": "TruTops batch"}}]
+        for file_name, step, phase, start, duration, outcome in self.spans:
+            events.append({
+                "name": file_name if phase == "file" else "{} {}".format(step, phase),
+                "cat": phase,
+                "ph": "X",
+                "ts": round(start * 1e6),
+                "dur": round(duration * 1e6),
+                "pid": 1,
+                "tid": 1,
+                "args": {"file": file_name, "step": step, "outcome": outcome},
+            })
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+    def export(self, folder=TRACE_FOLDER):
+        """Write all three formats; returns the common path without extension."""
+        os.makedirs(folder, exist_ok=True)
+        base = os.path.join(folder, "trace_{}".format(time.strftime("%Y%m%d-%H%M%S", time.localtime(self.started))))
+        self.write_jsonl(base + ".jsonl")
+        self.write_csv(base + ".csv")
+        self.write_chrome(base + ".trace.json")
+        return base
+
+
+def _rounded(span):
+    file_name, step, phase, start, duration, outcome = span
+    return file_name, step, phase, round(start, 6), round(duration, 6), outcome
+
+
+def format_eta(seconds):
+    """Short h:mm:ss for the GUI."""
+    if seconds is None:
+        return "--:--"
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return "{}:{:02d}:{:02d}".format(hours, minutes, seconds)
+    return "{}:{:02d}".format(minutes, seconds)
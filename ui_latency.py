@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+UI Latency
+Measures how long TruTops takes to react to each recorded input. While a
+recorder runs, a background thread fingerprints the screen (or a region of
+it) many times a second through the capture hub and notes every moment it
+changed. Afterwards each input is paired with the first change after it and
+with the moment the screen went still again, which separates TruTops' own
+latency from the operator's think time between inputs.
+
+The results can seed timing_profile.json, so the runner's step timeouts
+start from measured values instead of guesses.
+"""
+
+import bisect
+import threading
+import time
+
+SETTLE_TIME = 0.25  # Screen must be still this long to count as settled (as in the runner)
+
+
+class ScreenSampler:
+    """Background thread recording when a screen region changes."""
+
+    def __init__(self, hub, region=None, rate=30.0, threshold=1.5):
+        """
+        Args:
+            hub: CaptureHub to take fingerprints through
+            region: (left, top, right, bottom), None for the whole screen
+            rate: Fingerprints per second
+            threshold: Mean pixel difference (0-255) that counts as a change
+        """
+        self.hub = hub
+        self.region = tuple(region) if region else None
+        self.interval = 1.0 / rate
+        self.threshold = threshold
+        self.changes = []   # perf_counter() times, in order
+        self.samples = 0
+        self.started = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    @property
+    def rate(self):
+        """Fingerprints per second actually achieved."""
+        elapsed = time.perf_counter() - self.started if self.started else 0
+        return self.samples / elapsed if elapsed else 0.0
+
+    def _loop(self):
+        previous = None
+        next_tick = time.perf_counter()
+        while not self._stop.is_set():
+            current = self.hub.fingerprint(self.region)
+            now = time.perf_counter()
+            self.samples += 1
+            if previous is not None and self.hub.difference(previous, current) > self.threshold:
+                self.changes.append(now)
+            previous = current
+            next_tick += self.interval
+            self._stop.wait(max(0.0, next_tick - time.perf_counter()))
+
+
+def response(changes, at, until=None, settle_time=SETTLE_TIME):
+    """How the screen answered an input made at `at`.
+
+    Args:
+        changes: Sorted change times from a ScreenSampler
+        until: Time of the next input; later changes belong to that one
+
+    Returns:
+        (first, settled) - seconds from the input to the first change and to
+        the last change before the screen stayed still for settle_time, or
+        (None, None) if nothing changed
+    """
+    start = bisect.bisect_right(changes, at)
+    end = len(changes) if until is None else bisect.bisect_right(changes, until)
+    if start >= end:
+        return None, None
+    last = changes[start]
+    for change in changes[start + 1:end]:
+        if change - last >= settle_time:
+            break
+        last = change
+    return changes[start] - at, last - at
+
+
+def annotate(actions, changes, settle_time=SETTLE_TIME):
+    """Add "first", "latency" and "think" (seconds) to recorded actions with an "at" time.
+
+    think is the rest of the gap to the next action: time the operator took,
+    not TruTops.
+    """
+    for action, following in zip(actions, actions[1:] + [None]):
+        until = following["at"] if following else None
+        first, settled = response(changes, action["at"], until, settle_time)
+        action["first"] = None if first is None else round(first, 3)
+        action["latency"] = None if settled is None else round(settled, 3)
+        if until is not None:
+            action["think"] = round(until - action["at"] - (settled or 0.0), 3)
+    return actions
+
+
+def seed_profile(steps, profile, plan_steps, settle_time=SETTLE_TIME):
+    """Record measured latencies as seeded step times.
+
+    Args:
+        steps: (step name, latency) pairs; None latencies are left out
+        profile: TimingProfile to seed (saved by the caller)
+        plan_steps: Step names of the runner's workflow; other names are rejected,
+            since the runner would never look their times up
+
+    The runner's settle wait includes the still period, so that is added
+    on top to keep the samples comparable with the ones it records itself.
+
+    Returns:
+        (added, rejected) - dict of step name -> samples added, and the names
+        that are not plan steps
+    """
+    added = {}
+    rejected = []
+    for name, latency in steps:
+        if latency is None:
+            continue
+        if name not in plan_steps:
+            rejected.append(name)
+            continue
+        profile.seed(name, latency + settle_time)
+        added.setdefault(name, []).append(round(latency + settle_time, 3))
+    return added, rejected
@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+"""
+Wait Engine
+Polls screen conditions at high frequency so each automation step moves on
+as soon as TruTops has finished, instead of sleeping a fixed amount of time.
+"""
+
+import os
+import time
+
+
+class WaitCondition:
+    """Base class for a step completion condition.
+
+    prepare() is called right before the action runs so the condition can
+    take its baseline, then check() is polled until it returns True.
+    """
+
+    description = "condition"
+
+    def prepare(self, engine):
+        """Take any baseline needed before the action runs."""
+
+    def check(self, engine):
+        """Return True once the condition is met."""
+        raise NotImplementedError
+
+
+class Delay(WaitCondition):
+    """Fixed delay - met once the given number of seconds has passed."""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.description = "delay {}s".format(seconds)
+        self._start = None
+
+    def prepare(self, engine):
+        self._start = time.perf_counter()
+
+    def check(self, engine):
+        if self._start is None:
+            self._start = time.perf_counter()
+        return time.perf_counter() - self._start >= self.seconds
+
+
+class RegionChanged(WaitCondition):
+    """Met when a screen region differs from how it looked before the action."""
+
+    def __init__(self, region=None, threshold=1.5):
+        self.region = region
+        self.threshold = threshold
+        self.description = "region {} changed".format(region or "screen")
+        self._baseline = None
+
+    def prepare(self, engine):
+        self._baseline = engine.fingerprint(self.region)
+
+    def check(self, engine):
+        current = engine.fingerprint(self.region)
+        if self._baseline is None:
+            self._baseline = current
+            return False
+        return engine.difference(self._baseline, current) > self.threshold
+
+
+class ScreenSettled(WaitCondition):
+    """Met when a region has changed and then stayed still for settle_time.
+
+    If nothing changes within change_timeout the action is assumed to have
+    had no visible effect and the condition is met as well - unless
+    require_change is set, for actions that always open or close something;
+    those keep waiting for the change until the step times out.
+    """
+
+    def __init__(self, region=None, settle_time=0.25, change_timeout=1.0, threshold=1.5, require_change=False):
+        self.region = region
+        self.settle_time = settle_time
+        self.change_timeout = change_timeout
+        self.threshold = threshold
+        self.require_change = require_change
+        self.description = "region {} settled".format(region or "screen")
+        self._baseline = None
+        self._last = None
+        self._start = None
+        self._changed = False
+        self._still_since = None
+
+    def prepare(self, engine):
+        self._baseline = engine.fingerprint(self.region)
+        self._last = self._baseline
+        self._start = time.perf_counter()
+        self._changed = False
+        self._still_since = None
+
+    def check(self, engine):
+        now = time.perf_counter()
+        current = engine.fingerprint(self.region)
+        if self._start is None:
+            self.prepare(engine)
+            return False
+
+        if not self._changed:
+            if engine.difference(self._baseline, current) > self.threshold:
+                self._changed = True
+                self._last = current
+                self._still_since = now
+                return False
+            return not self.require_change and now - self._start >= self.change_timeout
+
+        if engine.difference(self._last, current) > self.threshold:
+            self._last = current
+            self._still_since = now
+            return False
+        return now - self._still_since >= self.settle_time
+
+
+class PixelColor(WaitCondition):
+    """Met when the pixel at (x, y) is within tolerance of an RGB colour."""
+
+    def __init__(self, x, y, rgb, tolerance=10):
+        self.x = x
+        self.y = y
+        self.rgb = tuple(rgb)
+        self.tolerance = tolerance
+        self.description = "pixel ({}, {}) == {}".format(x, y, self.rgb)
+
+    def check(self, engine):
+        pixel = engine.grab((self.x, self.y, self.x + 1, self.y + 1))[0, 0]
+        return all(abs(int(a) - b) <= self.tolerance for a, b in zip(pixel, self.rgb))
+
+
+class TemplateVisible(WaitCondition):
+    """Met when a template image is found on screen (or inside region)."""
+
+    def __init__(self, image_path, region=None, confidence=0.8):
+        self.image_path = image_path
+        self.region = region
+        self.confidence = confidence
+        self.description = "'{}' visible".format(image_path)
+
+    def _visible(self, engine):
+        if not self.image_path or not os.path.exists(self.image_path):
+            return False
+        return engine.detector.visible(self.image_path, self.region, self.confidence)
+
+    def check(self, engine):
+        return self._visible(engine)
+
+
+class TemplateGone(TemplateVisible):
+    """Met when a template image is no longer on screen (or inside region)."""
+
+    def __init__(self, image_path, region=None, confidence=0.8):
+        super().__init__(image_path, region, confidence)
+        self.description = "'{}' gone".format(image_path)
+
+    def check(self, engine):
+        return not self._visible(engine)
+
+
+class AnyOf(WaitCondition):
+    """Met as soon as any of the given conditions is met."""
+
+    def __init__(self, *conditions):
+        self.conditions = conditions
+        self.description = " or ".join(c.description for c in conditions)
+
+    def prepare(self, engine):
+        for condition in self.conditions:
+            condition.prepare(engine)
+
+    def check(self, engine):
+        return any(condition.check(engine) for condition in self.conditions)
+
+
+class WaitEngine:
+    """Polls wait conditions until they are met, time out, or get aborted."""
+
+    def __init__(self, poll_interval=0.02, hub=None, detector=None):
+        self.poll_interval = poll_interval
+        self._hub = hub
+        self._detector = detector
+
+    @property
+    def hub(self):
+        """CaptureHub all conditions grab through (created on first use)."""
+        if self._hub is None:
+            from capture import CaptureHub
+            self._hub = CaptureHub()
+        return self._hub
+
+    @property
+    def detector(self):
+        """ButtonDetector used by template conditions (created on first use)."""
+        if self._detector is None:
+            from button_detector import ButtonDetector
+            self._detector = ButtonDetector(grab=self.hub.grab)
+        return self._detector
+
+    def grab(self, region=None):
+        """Grab a screen region as an RGB numpy array."""
+        return self.hub.grab(region)
+
+    def fingerprint(self, region=None):
+        """Small grayscale thumbnail of a region used for change detection."""
+        return self.hub.fingerprint(region)
+
+    def difference(self, a, b):
+        """Mean absolute pixel difference between two fingerprints (0-255)."""
+        return self.hub.difference(a, b)
+
+    def wait(self, condition, timeout, is_running=None):
+        """Poll condition until met.
+
+        Args:
+            condition: WaitCondition to poll (prepare() must already be called)
+            timeout: Seconds to wait before giving up
+            is_running: Optional callable; waiting stops when it returns False
+
+        Returns:
+            (met, elapsed) - whether the condition was met and seconds waited
+        """
+        start = time.perf_counter()
+        deadline = start + timeout
+
+        while True:
+            if is_running is not None and not is_running():
+                return False, time.perf_counter() - start
+            if condition.check(self):
+                return True, time.perf_counter() - start
+            if time.perf_counter() >= deadline:
+                return False, time.perf_counter() - start
+            time.sleep(self.poll_interval)
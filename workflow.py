@@ -0,0 +1,522 @@
+# -*- coding: utf-8 -*-
+"""
+Workflow
+Declarative description of the TruTops steps run for each DWG, plus the small
+executor that runs a compiled plan file by file.
+
+A plan is a list of steps, either under "workflow" in config.json or in the
+JSON file named by "workflow_file":
+
+    {"name": "open_drawing",            # Used for timing history and logs
+     "action": "click",                 # click | key | hotkey | paste
+     "target": "open_drawing",          # click_locations or buttons key
+     "wait": {"type": "settle"},        # Completion condition (see below)
+     "retry": {"attempts": 2, "backoff": 0.5},
+     "on_timeout": "continue",          # continue | fail
+     "when": {"button": "ok"}}          # Only run if this button/dialog is on screen
+
+Wait types: settle, changed, pixel, template_visible, template_gone, delay,
+none and file_saved. Numeric wait settings may name a top-level config key
+instead, e.g. "change_timeout": "save_delay". A settle wait normally counts
+a step that changes nothing within change_timeout as done; "require_change":
+true makes it wait for a change until the step timeout, for steps that always
+open or close a dialog.
+
+A "when" guard waits up to "timeout" seconds (default dialogs.appear_timeout)
+for its button image to show up, optionally only inside "region", and skips
+the step - action and wait - if it doesn't. If the image hasn't been captured
+the step always runs, as it would without the guard.
+
+Run directly to turn a step_recorder.py recording into a starting plan:
+    python workflow.py labeled_steps.txt workflow.json
+"""
+
+import json
+import os
+import re
+import sys
+import time
+
+from wait_engine import Delay, PixelColor, RegionChanged, ScreenSettled, TemplateGone, TemplateVisible
+from save_watcher import expected_output
+
+ACTIONS = ("click", "key", "hotkey", "paste")
+WAIT_TYPES = ("settle", "changed", "pixel", "template_visible", "template_gone",
+              "delay", "none", "file_saved")
+
+# The original hard-coded ten-step sequence
+DEFAULT_WORKFLOW = [
+    {"name": "open_drawing", "action": "click", "target": "open_drawing",
+     "description": "Open Drawing",
+     "wait": {"type": "settle", "require_change": True}},
+    {"name": "no_save", "action": "click", "target": "no_save",
+     "description": "No (don't save)",
+     "wait": {"type": "settle", "require_change": True},
+     "when": {"button": "modifications_prompt"}},
+    {"name": "paste", "action": "paste", "text": "{file_path}",
+     "description": "Paste filename"},
+    {"name": "open", "action": "key", "key": "enter",
+     "description": "Open drawing",
+     "wait": {"type": "settle", "require_change": True}},
+    {"name": "import", "action": "key", "key": "enter",
+     "description": "Confirm import settings",
+     "wait": {"type": "settle", "require_change": True, "settle_time": 0.5}},
+    {"name": "save_selected", "action": "click", "target": "save_selected",
+     "description": "Save Selected to GEO"},
+    {"name": "select_top_left", "action": "click", "target": "select_top_left",
+     "description": "Selection top-left"},
+    {"name": "select_bottom_right", "action": "click", "target": "select_bottom_right",
+     "description": "Selection bottom-right",
+     "wait": {"type": "settle", "require_change": True}},
+    {"name": "warning", "action": "key", "key": "enter",
+     "description": "Warning dialog (if any)",
+     "wait": {"type": "settle", "require_change": True},
+     "when": {"button": "geometry_warning"}},
+    {"name": "save", "action": "key", "key": "enter",
+     "description": "Save file",
+     "wait": {"type": "file_saved", "change_timeout": "save_delay", "settle_time": 0.5},
+     "on_timeout": "fail"},
+]
+
+
+class WorkflowError(ValueError):
+    """Raised when a workflow plan is invalid."""
+
+
+class CompiledStep:
+    """A plan step with its target and settings resolved against the config."""
+
+    def __init__(self, name, action, description, coords=None, button=None, keys=(),
+                 text=None, wait=None, attempts=1, backoff=0.5, on_timeout="continue", when=None):
+        self.name = name
+        self.action = action
+        self.description = description
+        self.coords = coords
+        self.button = button
+        self.keys = tuple(keys)
+        self.text = text
+        self.wait = wait or {"type": "settle"}
+        self.attempts = attempts
+        self.backoff = backoff
+        self.on_timeout = on_timeout
+        self.when = when
+
+    def __repr__(self):
+        return "<Step {} {}>".format(self.name, self.action)
+
+
+def load_plan(config):
+    """Raw step list from config: "workflow", then "workflow_file", then the default."""
+    steps = config.get("workflow")
+    if steps:
+        return steps
+
+    path = config.get("workflow_file")
+    if path:
+        with open(path, 'r') as f:
+            data = json.load(f)
+        return data.get("workflow", []) if isinstance(data, dict) else data
+
+    return DEFAULT_WORKFLOW
+
+
+def compile_plan(steps, config):
+    """Validate a raw plan and resolve its targets. Returns a list of CompiledStep."""
+    compiled = []
+    names = set()
+
+    for i, raw in enumerate(steps, 1):
+        name = raw.get("name") or "step_{}".format(i)
+        if name in names:
+            raise WorkflowError("Duplicate step name '{}'".format(name))
+        names.add(name)
+
+        action = raw.get("action")
+        if action not in ACTIONS:
+            raise WorkflowError("Step '{}': unknown action '{}'".format(name, action))
+
+        wait = dict(raw.get("wait") or {"type": "settle"})
+        if wait.get("type", "settle") not in WAIT_TYPES:
+            raise WorkflowError("Step '{}': unknown wait type '{}'".format(name, wait.get("type")))
+
+        when = raw.get("when")
+        if when is not None and not (isinstance(when, dict) and when.get("button")):
+            raise WorkflowError("Step '{}': when needs a button".format(name))
+
+        retry = raw.get("retry") or {}
+        step = CompiledStep(
+            name=name,
+            action=action,
+            description=raw.get("description") or name,
+            text=raw.get("text"),
+            wait=wait,
+            attempts=max(1, int(retry.get("attempts", 1))),
+            backoff=float(retry.get("backoff", 0.5)),
+            on_timeout=raw.get("on_timeout", "continue"),
+            when=dict(when) if when else None,
+        )
+
+        if action == "click":
+            target = raw.get("target")
+            if not target:
+                raise WorkflowError("Step '{}': click needs a target".format(name))
+            step.coords = config.get("click_locations", target)
+            if not step.coords and config.get("buttons", target):
+                step.button = target
+        elif action == "key":
+            if not raw.get("key"):
+                raise WorkflowError("Step '{}': key needs a key".format(name))
+            step.keys = (raw["key"],)
+        elif action == "hotkey":
+            if not raw.get("keys"):
+                raise WorkflowError("Step '{}': hotkey needs keys".format(name))
+            step.keys = tuple(raw["keys"])
+        elif action == "paste" and step.text is None:
+            raise WorkflowError("Step '{}': paste needs text".format(name))
+
+        compiled.append(step)
+
+    return compiled
+
+
+def missing_targets(steps, config):
+    """Click targets in a raw plan that have no location or button configured."""
+    missing = []
+    for raw in steps:
+        target = raw.get("target")
+        if raw.get("action") == "click" and target and not config.get("click_locations", target) \
+                and not config.get("buttons", target):
+            missing.append(target)
+    return missing
+
+
+def step_names(steps):
+    """Names of a raw plan's steps, as compile_plan assigns them."""
+    return [raw.get("name") or "step_{}".format(i) for i, raw in enumerate(steps, 1)]
+
+
+def describe_plan(steps):
+    """One-line summary of a plan for the main window."""
+    return " > ".join(raw.get("description") or raw.get("name", "?") for raw in steps)
+
+
+class WorkflowExecutor:
+    """Runs a compiled plan for one file at a time.
+
+    The driver does the actual input and must provide click(x, y), press(key),
+    hotkey(*keys), set_clipboard(text) and find_button(key).
+    """
+
+    def __init__(self, steps, config, driver, waits, save_watcher=None, profile=None):
+        self.steps = steps
+        self.config = config
+        self.driver = driver
+        self.waits = waits
+        self.save_watcher = save_watcher
+        self.profile = profile
+        self.dry_run = False
+        self.calibrating = False
+        self.confirm = None  # Optional callable(description) -> bool, for step-by-step mode
+        self.tracer = None   # Optional tracing.Tracer for detect/act/wait spans
+
+    def run_file(self, file_path, is_running=None):
+        """Run every step for one DWG. Returns True if the file completed."""
+        is_running = is_running or (lambda: True)
+        context = {
+            "file_path": file_path,
+            "file_name": os.path.basename(file_path),
+            "stem": os.path.splitext(os.path.basename(file_path))[0],
+        }
+
+        start = time.perf_counter()
+        completed = self._run_steps(context, is_running)
+        self._span(context, "", "file", start,
+                   "done" if completed else ("failed" if is_running() else "stopped"))
+        return completed
+
+    def _run_steps(self, context, is_running):
+        for step in self.steps:
+            if not is_running():
+                return False
+            if self.confirm and not self.confirm(step.description):
+                return False
+
+            ok = self._run_step(step, context, is_running)
+            if not ok and is_running() and step.on_timeout == "fail":
+                print("[STEP] '{}' failed for {}".format(step.name, context["file_name"]))
+                return False
+
+        return is_running()
+
+    def _span(self, context, step_name, phase, start, outcome="ok"):
+        """Record a timing span if tracing is on."""
+        if self.tracer is not None:
+            self.tracer.add(context["file_name"], step_name, phase, start, time.perf_counter(), outcome)
+
+    def _setting(self, value, default):
+        """Resolve a wait setting that may name a top-level config key."""
+        if isinstance(value, str):
+            return self.config.get(value) or default
+        return default if value is None else value
+
+    def _timeout(self, step, file_path, default=None):
+        """Step timeout: explicit, then learned from history, then the global default."""
+        if "timeout" in step.wait:
+            return self._setting(step.wait["timeout"], 15.0)
+        default = default or self.config.get("wait", "step_timeout") or 15.0
+        if self.profile is None or self.calibrating:
+            return default
+        return self.profile.timeout(step.name, default, file_path)
+
+    def _condition(self, step, context):
+        """Build a fresh WaitCondition for a step."""
+        wait = step.wait
+        kind = wait.get("type", "settle")
+        threshold = self._setting(wait.get("threshold"), self.config.get("wait", "change_threshold") or 1.5)
+
+        if kind in ("settle", "file_saved"):
+            change_timeout = self._setting(wait.get("change_timeout"),
+                                           self.config.get("wait", "change_timeout") or 1.0)
+            if "change_timeout" in wait:
+                change_timeout = self._timeout(step, context["file_path"], change_timeout)
+            return ScreenSettled(
+                region=wait.get("region"),
+                settle_time=self._setting(wait.get("settle_time"), self.config.get("wait", "settle_time") or 0.25),
+                change_timeout=change_timeout,
+                threshold=threshold,
+                require_change=bool(wait.get("require_change")),
+            )
+        if kind == "changed":
+            return RegionChanged(wait.get("region"), threshold)
+        if kind == "pixel":
+            return PixelColor(wait["x"], wait["y"], wait["rgb"], wait.get("tolerance", 10))
+        if kind in ("template_visible", "template_gone"):
+            image = self.config.get("buttons", wait.get("button"), "image") or wait.get("image")
+            cls = TemplateVisible if kind == "template_visible" else TemplateGone
+            return cls(image, wait.get("region"), wait.get("confidence", 0.8))
+        if kind == "delay":
+            return Delay(self._setting(wait.get("seconds"), 0.5))
+        return Delay(0)
+
+    def _dialog_shown(self, step, is_running):
+        """Whether a step's "when" button is on screen (True if it can't be checked)."""
+        image = self.config.get("buttons", step.when["button"], "image")
+        if not image or not os.path.exists(image):
+            return True
+
+        timeout = self._setting(step.when.get("timeout"), self.config.get("dialogs", "appear_timeout") or 0.5)
+        condition = TemplateVisible(image, step.when.get("region"),
+                                    step.when.get("confidence", self.config.get("dialogs", "confidence") or 0.8))
+        shown, elapsed = self.waits.wait(condition, timeout, is_running=is_running)
+        if shown:
+            print("  [DIALOG] '{}' shown after {:.2f}s".format(step.when["button"], elapsed))
+        return shown
+
+    def _resolve_click(self, step):
+        """Screen position for a click step, or None if it can't be found."""
+        if step.coords:
+            return tuple(step.coords)
+        if step.button:
+            return self.driver.find_button(step.button)
+        return None
+
+    def _log(self, step, target, context):
+        if step.action == "click":
+            print("[CLICK] ({}, {}) - {}".format(target[0], target[1], step.description))
+        elif step.action == "key":
+            print("[KEY] {} - {}".format(step.keys[0], step.description))
+        elif step.action == "hotkey":
+            print("[HOTKEY] {} - {}".format("+".join(step.keys), step.description))
+        else:
+            print("[PASTE] {} - {}".format(step.text.format(**context), step.description))
+
+    def _act(self, step, target, context):
+        start = time.perf_counter()
+        self._send(step, target, context)
+        self._span(context, step.name, "act", start)
+
+    def _send(self, step, target, context):
+        if step.action == "click":
+            self.driver.click(target[0], target[1])
+        elif step.action == "key":
+            self.driver.press(step.keys[0])
+        elif step.action == "hotkey":
+            self.driver.hotkey(*step.keys)
+        else:
+            self.driver.set_clipboard(step.text.format(**context))
+            self.driver.hotkey("ctrl", "v")
+
+    def _run_step(self, step, context, is_running):
+        """Run one step with its retry policy. Returns True if its wait was met."""
+        for attempt in range(1, step.attempts + 1):
+            if attempt > 1:
+                delay = step.backoff * 2 ** (attempt - 2)
+                print("  [RETRY] {} attempt {}/{} in {:.1f}s".format(
+                    step.name, attempt, step.attempts, delay))
+                time.sleep(delay)
+
+            if step.when and not self.dry_run:
+                start = time.perf_counter()
+                shown = self._dialog_shown(step, is_running)
+                self._span(context, step.name, "detect", start, "shown" if shown else "absent")
+                if not shown:
+                    if is_running():
+                        print("[SKIP] {} - '{}' not on screen".format(step.description, step.when["button"]))
+                    return is_running()
+
+            target = None
+            if step.action == "click":
+                start = time.perf_counter()
+                target = self._resolve_click(step)
+                if step.button:
+                    self._span(context, step.name, "detect", start, "found" if target else "missing")
+                if target is None:
+                    print("[SKIP] {} - no location or button found".format(step.description))
+                    return True
+
+            self._log(step, target, context)
+            if self.dry_run:
+                print("  (dry run)")
+                return True
+
+            if step.wait.get("type") == "file_saved" and self.config.get("save_watch", "enabled"):
+                met = self._act_and_confirm_save(step, target, context, is_running)
+            else:
+                condition = self._condition(step, context)
+                condition.prepare(self.waits)
+                self._act(step, target, context)
+                met = self._wait(step, condition, context, is_running)
+
+            if met or not is_running():
+                return met
+
+        return False
+
+    def _wait(self, step, condition, context, is_running):
+        """Wait for a prepared condition, log and record how long it took."""
+        timeout = self._timeout(step, context["file_path"])
+        start = time.perf_counter()
+        met, elapsed = self.waits.wait(condition, timeout, is_running=is_running)
+        self._span(context, step.name, "wait", start, _outcome(met, is_running))
+        if met:
+            print("  [WAIT] {} after {:.2f}s".format(condition.description, elapsed))
+            if self.profile is not None:
+                self.profile.record(step.name, elapsed, context["file_path"])
+        elif is_running():
+            print("  [WAIT] Timed out after {:.2f}s waiting for {} ({})".format(
+                elapsed, condition.description, step.description))
+        return met
+
+    def _act_and_confirm_save(self, step, target, context, is_running):
+        """Run the save action and wait until the .geo is on disk."""
+        output = expected_output(
+            context["file_path"],
+            self.config.get("save_watch", "output_folder"),
+            self.config.get("save_watch", "extension") or ".geo",
+        )
+        print("  [SAVE] Expecting {}".format(output))
+
+        since = time.time()
+        self._act(step, target, context)
+        start = time.perf_counter()
+        saved, elapsed = self.save_watcher.wait_for_file(
+            output,
+            self._timeout(step, context["file_path"], self.config.get("save_watch", "timeout") or 30.0),
+            since=since,
+            is_running=is_running,
+        )
+        self._span(context, step.name, "wait", start, _outcome(saved, is_running))
+        if saved:
+            print("  [SAVE] {} written after {:.2f}s".format(os.path.basename(output), elapsed))
+            if self.profile is not None:
+                self.profile.record(step.name, elapsed, context["file_path"])
+        elif is_running():
+            print("  [SAVE] {} not written after {:.2f}s!".format(output, elapsed))
+        return saved
+
+
+def _outcome(met, is_running):
+    """Span outcome for a wait."""
+    if met:
+        return "met"
+    return "timeout" if is_running() else "stopped"
+
+
+def _slug(label):
+    """click_locations key for a recorded label (same rule step_recorder uses)."""
+    return label.lower().replace(" ", "_").replace("'", "").replace("-", "_") or "step"
+
+
+def import_labeled_steps(path):
+    """Build a starting plan from a step_recorder.py labeled_steps.txt file.
+
+    Returns:
+        (steps, click_locations) - the plan and the click positions it refers to
+    """
+    step_re = re.compile(r"^\s*(\d+)\.\s+(.*\S)\s*$")
+    click_re = re.compile(r"^\s*->\s*CLICK\s*\((-?\d+),\s*(-?\d+)\)")
+    key_re = re.compile(r"^\s*->\s*KEY:\s*(.*?)\s*$")
+
+    steps = []
+    click_locations = {}
+    label = None
+
+    with open(path, 'r') as f:
+        for line in f:
+            if line.startswith("#"):
+                # Everything after the first separator is the suggested config
+                if steps:
+                    break
+                continue
+
+            match = step_re.match(line)
+            if match:
+                label = match.group(2)
+                continue
+            if label is None:
+                continue
+
+            name = _slug(label)
+            while name in click_locations or any(s["name"] == name for s in steps):
+                name += "_"
+
+            match = click_re.match(line)
+            if match:
+                click_locations[name] = [int(match.group(1)), int(match.group(2))]
+                steps.append({"name": name, "action": "click", "target": name, "description": label})
+                label = None
+                continue
+
+            match = key_re.match(line)
+            if match:
+                key = match.group(1)
+                if len(key) == 1 and ord(key) < 32:
+                    # pynput records Ctrl+letter as a control character
+                    steps.append({"name": name, "action": "hotkey", "keys": ["ctrl", chr(ord(key) + 96)],
+                                  "description": label})
+                elif key:
+                    steps.append({"name": name, "action": "key", "key": key, "description": label})
+                else:
+                    print("[IMPORT] Skipping '{}' - no key was recorded".format(label))
+                label = None
+
+    return steps, click_locations
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        return
+
+    steps, click_locations = import_labeled_steps(sys.argv[1])
+    out_path = sys.argv[2] if len(sys.argv) > 2 else "workflow.json"
+    with open(out_path, 'w') as f:
+        json.dump({"click_locations": click_locations, "workflow": steps}, f, indent=2)
+
+    print("Imported {} steps: {}".format(len(steps), describe_plan(steps)))
+    print("Saved to: {}".format(out_path))
+    print("Copy click_locations into config.json and set \"workflow_file\": \"{}\"".format(out_path))
+
+
+if __name__ == "__main__":
+    main()